@@ -0,0 +1,134 @@
+"""
+Compares a range query ("EUR on one node over the last week") on the former schema, with string prices, DateTime timestamps and
+no index, and on the current schema, with numeric columns, interned ids and the (currency, node, timestamp) index.
+
+Run from the repository root: python -m benchmarks.query_benchmark [--rows 10000000] [--nodes 5] [--markets 40] [--repeat 5]
+"""
+import argparse
+import calendar
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from src.library.database import Database
+
+POLL_INTERVAL = 120
+WEEK = 7 * 86400
+CHUNK_SIZE = 100000
+
+# The tables as created by the former models
+VERSION_1_SCHEMA = (
+    "CREATE TABLE price_node (address VARCHAR NOT NULL, operator VARCHAR, PRIMARY KEY (address))",
+    "CREATE TABLE exchange_rate (id INTEGER NOT NULL, price_node_address VARCHAR NOT NULL, currency VARCHAR NOT NULL, "
+    "price VARCHAR NOT NULL, timestamp DATETIME NOT NULL, provider VARCHAR NOT NULL, PRIMARY KEY (id), "
+    "FOREIGN KEY(price_node_address) REFERENCES price_node (address))",
+)
+
+VERSION_1_QUERY = "SELECT timestamp, price FROM exchange_rate WHERE currency = ? AND price_node_address = ? AND timestamp >= ?"
+VERSION_2_QUERY = "SELECT exchange_rate.timestamp, exchange_rate.price FROM exchange_rate " \
+                  "WHERE currency_id = (SELECT id FROM currency WHERE code = ?) " \
+                  "AND price_node_id = (SELECT id FROM price_node WHERE address = ?) AND timestamp >= ?"
+
+
+def generate_polls(args, start):
+    """Yields the (poll time, node, currency, price) of each row, in poll order."""
+    nodes = ["node{}.onion".format(x) for x in range(args.nodes)]
+    currencies = ["EUR"] + ["C{:02d}".format(x) for x in range(args.markets - 1)]
+    polls = args.rows // (args.nodes * args.markets)
+    for poll in range(polls):
+        for node in nodes:
+            for currency in currencies:
+                yield start + poll * POLL_INTERVAL, node, currency, random.uniform(1000, 100000)
+
+
+def insert_chunks(connection, statement, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            connection.executemany(statement, chunk)
+            chunk = []
+    connection.executemany(statement, chunk)
+    connection.commit()
+
+
+def create_version_1(file_path, args, start):
+    connection = sqlite3.connect(file_path)
+    for statement in VERSION_1_SCHEMA:
+        connection.execute(statement)
+    connection.executemany("INSERT INTO price_node VALUES (?, '')", [("node{}.onion".format(x),) for x in range(args.nodes)])
+    insert_chunks(connection, "INSERT INTO exchange_rate (price_node_address, currency, price, timestamp, provider) VALUES (?, ?, ?, ?, ?)",
+                  ((node, currency, str(price), str(datetime.utcfromtimestamp(poll_time)), "BTCAVERAGE")
+                   for poll_time, node, currency, price in generate_polls(args, start)))
+    connection.close()
+
+
+def create_version_2(file_path, args, start):
+    Database(file_path).engine.dispose()
+    connection = sqlite3.connect(file_path)
+    connection.executemany("INSERT INTO price_node (address, operator) VALUES (?, '')", [("node{}.onion".format(x),) for x in range(args.nodes)])
+    connection.executemany("INSERT INTO currency (code) VALUES (?)",
+                           [("EUR",)] + [("C{:02d}".format(x),) for x in range(args.markets - 1)])
+    node_ids = dict((address, id_) for id_, address in connection.execute("SELECT id, address FROM price_node"))
+    currency_ids = dict((code, id_) for id_, code in connection.execute("SELECT id, code FROM currency"))
+    insert_chunks(connection, "INSERT INTO exchange_rate (price_node_id, currency_id, price, timestamp, provider_timestamp, provider) "
+                              "VALUES (?, ?, ?, ?, ?, ?)",
+                  ((node_ids[node], currency_ids[currency], price, poll_time, poll_time, "BTCAVERAGE")
+                   for poll_time, node, currency, price in generate_polls(args, start)))
+    connection.close()
+
+
+def time_query(file_path, query, parameters, convert, repeat):
+    """Returns the median duration of the query, including the conversion of its rows into (epoch, float) tuples, and the rows."""
+    connection = sqlite3.connect(file_path)
+    durations = []
+    rows = None
+    for _ in range(repeat):
+        query_start = time.perf_counter()
+        rows = [convert(*x) for x in connection.execute(query, parameters)]
+        durations.append(time.perf_counter() - query_start)
+    connection.close()
+    return statistics.median(durations), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure a range query on the former and the current database schema")
+    parser.add_argument("--rows", type=int, default=10000000)
+    parser.add_argument("--nodes", type=int, default=5)
+    parser.add_argument("--markets", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    start = 1600000000
+    end = start + (args.rows // (args.nodes * args.markets)) * POLL_INTERVAL
+    since = end - WEEK
+    directory = tempfile.mkdtemp(prefix="query_benchmark")
+    try:
+        results = []
+        for name, create, query, parameters, convert in (
+                ("string columns", create_version_1, VERSION_1_QUERY, ("EUR", "node0.onion", str(datetime.utcfromtimestamp(since))),
+                 lambda timestamp, price: (calendar.timegm(time.strptime(timestamp, "%Y-%m-%d %H:%M:%S")), float(price))),
+                ("numeric, indexed", create_version_2, VERSION_2_QUERY, ("EUR", "node0.onion", since),
+                 lambda timestamp, price: (timestamp, price))):
+            file_path = os.path.join(directory, name.replace(" ", "_").replace(",", "") + ".sqlite")
+            build_start = time.perf_counter()
+            create(file_path, args, start)
+            build_seconds = time.perf_counter() - build_start
+            duration, rows = time_query(file_path, query, parameters, convert, args.repeat)
+            results.append((name, duration, len(rows), os.path.getsize(file_path), build_seconds))
+        print("Last week of EUR on one node, from {} rows ({} nodes, {} markets, polled every {}s)".format(
+            args.rows, args.nodes, args.markets, POLL_INTERVAL))
+        for name, duration, count, size, build_seconds in results:
+            print("{:<18} {:>9.2f} ms {:>7} rows {:>8.1f} MiB (built in {:.0f}s) {:>8.1f}x".format(
+                name, duration * 1000, count, size / 2 ** 20, build_seconds, results[0][1] / duration))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares the memory used by a history of exchange rates kept as objects with a __dict__ (the former representation),
+as slotted ExchangeRate objects and as an ExchangeRateBatch.
+
+Run from the repository root: python -m benchmarks.rate_memory [--days 7] [--nodes 5] [--markets 10] [--poll_interval 120]
+"""
+import argparse
+import gc
+import random
+import tracemalloc
+
+from src.library.bisq.exchange_rate import ExchangeRate
+from src.library.bisq.rate_batch import ExchangeRateBatch
+
+
+class DictExchangeRate(object):
+    """The former ExchangeRate, storing its attributes in a per-instance __dict__."""
+
+    def __init__(self, currency, price, timestamp, provider):
+        self.__currency = currency
+        self.__price = price
+        self.__timestamp = timestamp
+        self.__provider = provider
+
+
+def measure(create):
+    gc.collect()
+    tracemalloc.start()
+    result = create()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory of an exchange rate history")
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--nodes", type=int, default=5)
+    parser.add_argument("--markets", type=int, default=10)
+    parser.add_argument("--poll_interval", type=int, default=120)
+    args = parser.parse_args()
+
+    currencies = ["C{:02d}".format(x) for x in range(args.markets)]
+    polls = int(args.days * 86400 / args.poll_interval)
+    count = polls * args.nodes * args.markets
+    # Builds the values before measuring, so only the per-rate overhead is compared; as the price and timestamp floats are shared,
+    # the object representations are understated by 2 floats (48 bytes) per rate that a real history would hold
+    rows = [(currency, random.uniform(1000, 100000), 1600000000.0 + poll * args.poll_interval, "BTCAVERAGE")
+            for poll in range(polls) for _ in range(args.nodes) for currency in currencies]
+    print("History of {} exchange rates ({} days, {} nodes, {} markets, polled every {}s)".format(
+        count, args.days, args.nodes, args.markets, args.poll_interval))
+
+    results = []
+    for name, create in (("dict objects", lambda: [DictExchangeRate(*x) for x in rows]),
+                         ("slotted objects", lambda: [ExchangeRate(*x) for x in rows]),
+                         ("array batch", lambda: ExchangeRateBatch(*zip(*rows)))):
+        history, size = measure(create)
+        results.append((name, size))
+        del history
+    baseline = results[0][1]
+    for name, size in results:
+        print("{:<16} {:>10.1f} MiB {:>7.1f} bytes/rate {:>6.1f}%".format(name, size / 2 ** 20, float(size) / count, 100.0 * size / baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Measures the compression ratio and the encode and decode throughput of the compressed series codec on the CSV history of the
+exchange and fee rates (the active and the rotated files of resources), against the CSV text, the CSV compressed with gzip
+and the raw (int64 timestamp, float64 value) points. Without a CSV history, a history of random rates is generated instead.
+
+Run from the repository root: python -m benchmarks.series_codec [--path resources] [--block_size 1024] [--repeat 3]
+"""
+import argparse
+import calendar
+import csv
+import glob
+import gzip
+import io
+import os
+import random
+import re
+import statistics
+import time
+
+import numpy
+
+from src.library.series_codec import CompressedSeries
+
+HISTORY_PATTERN = re.compile(r"^(?P<stem>\w+_historical_(exchange|fee)_rates)(\.\d{4}-\d{2}-\d{2}(\.\d+)?)?\.csv(\.gz)?$")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S UTC"
+
+
+def read_history(path):
+    """Returns the (timestamps, values) of each (file, node) series of the CSV history, and the CSV text of each file."""
+    points = {}
+    texts = {}
+    for file_path in sorted(glob.glob(os.path.join(path, "*.csv*"))):
+        match = HISTORY_PATTERN.match(os.path.basename(file_path))
+        if not match:
+            continue
+        with (gzip.open(file_path, "rt", newline="") if file_path.endswith(".gz") else open(file_path, "r", newline="")) as csv_file:
+            text = csv_file.read()
+        texts[file_path] = text
+        reader = csv.reader(io.StringIO(text))
+        header = next(reader, None)
+        for row in reader:
+            timestamp = calendar.timegm(time.strptime(row[0], TIMESTAMP_FORMAT))
+            for node, value in zip(header[1:], row[1:]):
+                try:
+                    value = float(value)
+                except ValueError:
+                    value = float("nan")
+                points.setdefault((match.group("stem"), node), []).append((timestamp, value))
+    # The rotated files are read in the order of their names, not of their time
+    return dict((key, sorted(x, key=lambda y: y[0])) for key, x in points.items()), texts
+
+
+def generate_history(days, nodes, markets, poll_interval):
+    """Returns series of random rates moving by small steps, with the CSV text they would have been written as."""
+    polls = days * 86400 // poll_interval
+    start = 1600000000
+    points = {}
+    rows = []
+    for market in range(markets):
+        prices = [random.uniform(1000, 100000)] * nodes
+        for poll in range(polls):
+            row = [time.strftime(TIMESTAMP_FORMAT, time.gmtime(start + poll * poll_interval))]
+            for node in range(nodes):
+                if random.random() < 0.3:
+                    prices[node] = round(prices[node] * (1 + random.gauss(0, 0.0005)), 2)
+                value = float("nan") if random.random() < 0.01 else prices[node]
+                points.setdefault(("m{}".format(market), "node{}.onion".format(node)), []).append((start + poll * poll_interval, value))
+                row.append("timeout" if value != value else str(value))
+            rows.append(",".join(row))
+    return points, {"generated": "\n".join(rows)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the compressed series codec on the CSV history")
+    parser.add_argument("--path", default="resources")
+    parser.add_argument("--block_size", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--days", type=int, default=30, help="Days of generated history, without a CSV history")
+    parser.add_argument("--nodes", type=int, default=5)
+    parser.add_argument("--markets", type=int, default=10)
+    args = parser.parse_args()
+
+    history, texts = read_history(args.path)
+    if history:
+        print("CSV history of {}: {} files, {} series".format(args.path, len(texts), len(history)))
+    else:
+        print("No CSV history in {}, generating {} days of {} markets on {} nodes".format(args.path, args.days, args.markets, args.nodes))
+        history, texts = generate_history(args.days, args.nodes, args.markets, 120)
+    point_count = sum(len(x) for x in history.values())
+    csv_bytes = sum(len(x.encode()) for x in texts.values())
+    gzip_bytes = sum(len(gzip.compress(x.encode())) for x in texts.values())
+
+    encode_durations = []
+    decode_durations = []
+    series = {}
+    for _ in range(args.repeat):
+        encode_start = time.perf_counter()
+        for key, points in history.items():
+            series[key] = CompressedSeries(args.block_size)
+            series[key].extend([x[0] for x in points], [x[1] for x in points])
+            series[key].flush()
+        encode_durations.append(time.perf_counter() - encode_start)
+        decode_start = time.perf_counter()
+        for key in history:
+            series[key].get()
+        decode_durations.append(time.perf_counter() - decode_start)
+    for key, points in history.items():
+        timestamps, values = series[key].get()
+        assert numpy.array_equal(values, numpy.array([x[1] for x in points]), equal_nan=True), "Series {} not restored".format(key)
+        assert numpy.array_equal(timestamps, numpy.array([x[0] for x in points])), "Timestamps of {} not restored".format(key)
+    codec_bytes = sum(len(x.to_bytes()) for x in series.values())
+
+    print("{} points, {} per block".format(point_count, args.block_size))
+    for name, size in (("CSV", csv_bytes), ("CSV (gzip)", gzip_bytes), ("int64 + float64", 16 * point_count), ("compressed series", codec_bytes)):
+        print("{:<18} {:>10.1f} KiB {:>7.2f} bytes/point {:>7.1f}x".format(name, size / 1024, float(size) / point_count, float(csv_bytes) / size))
+    print("Encode: {:.0f} points/s, decode: {:.0f} points/s".format(point_count / statistics.median(encode_durations),
+                                                                     point_count / statistics.median(decode_durations)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import logging
+
+import numpy
+from flask_restful import reqparse
+
+from src.api.api_endpoint import ApiEndpoint
+from src.api.exceptions import UnknownParameterError
+
+log = logging.getLogger(__name__)
+
+
+class History(ApiEndpoint):
+
+    def __init__(self, history, row_name="nodes"):
+        """
+        @param (SnapshotBuffer) history: The recent poll cycles of the price node monitor.
+        @param (str) row_name: Key of the names of the snapshot rows in the response, e.g. nodes or statistics.
+        """
+        super(History, self).__init__()
+        self.__history = history
+        self.__row_name = row_name
+
+    def get_command(self):
+        """
+        Implements the GET request.
+        @raise (UnknownParameterError): When an unexpected parameter is encountered.
+        @return (dict): Dictionary containing the prices of each row (e.g. node) in the most recent poll cycles, null where missing.
+        """
+        parser = reqparse.RequestParser()
+        parser.add_argument('column', type=str, required=False, location='args',
+                            help="Define the price, e.g. usdMarketPrice. Parameter must be a string. {error_msg}")
+        parser.add_argument('points', type=int, required=False, location='args',
+                            help="Define the number of poll cycles. Parameter must be an integer. {error_msg}")
+        parser.add_argument('since', type=float, required=False, location='args',
+                            help="Define the start time in seconds since the epoch. Parameter must be a number. {error_msg}")
+        args = parser.parse_args()
+
+        columns = self.__history.columns if args.column is None else [args.column]
+        if any(x not in self.__history.columns for x in columns):
+            raise UnknownParameterError({'error': "Unknown column {}".format(args.column)})
+        timestamps, prices = self.__history.get_window(args.points, args.since)
+        column_indexes = [self.__history.columns.index(x) for x in columns]
+        return {'timestamps': timestamps.tolist(),
+                self.__row_name: self.__history.rows,
+                'prices': dict((column, self.__to_list(prices[:, :, index])) for column, index in zip(columns, column_indexes))}
+
+    @staticmethod
+    def __to_list(prices):
+        """Converts the snapshots × rows prices to nested lists, with None instead of NaN as JSON has no NaN."""
+        return numpy.where(numpy.isnan(prices), None, prices).tolist()
@@ -0,0 +1,44 @@
+import logging
+import time
+
+from flask_restful import reqparse
+
+from src.api.api_endpoint import ApiEndpoint
+from src.api.exceptions import UnknownParameterError
+
+log = logging.getLogger(__name__)
+
+
+class Rollup(ApiEndpoint):
+
+    def __init__(self, rollups):
+        """
+        @param (Rollups) rollups: The rollups of the stored prices.
+        """
+        super(Rollup, self).__init__()
+        self.__rollups = rollups
+
+    def get_command(self):
+        """
+        Implements the GET request.
+        @raise (UnknownParameterError): When an unexpected parameter is encountered.
+        @return (dict): Dictionary containing the resolution and the open, high, low, close, mean, count and availability of
+                        each bucket of the requested range.
+        """
+        parser = reqparse.RequestParser()
+        parser.add_argument('node', type=str, required=True, location='args',
+                            help="Define the node address. Parameter must be a string. {error_msg}")
+        parser.add_argument('currency', type=str, required=True, location='args',
+                            help="Define the currency, e.g. USD, or btc for the transaction fee. Parameter must be a string. {error_msg}")
+        parser.add_argument('start', type=int, required=True, location='args',
+                            help="Define the start time in seconds since the epoch. Parameter must be an integer. {error_msg}")
+        parser.add_argument('end', type=int, required=False, location='args',
+                            help="Define the end time in seconds since the epoch. Parameter must be an integer. {error_msg}")
+        parser.add_argument('points', type=int, required=False, default=500, location='args',
+                            help="Define the maximum number of points. Parameter must be an integer. {error_msg}")
+        args = parser.parse_args()
+
+        end = int(time.time()) if args.end is None else args.end
+        if end <= args.start or args.points < 1:
+            raise UnknownParameterError({'error': "The range must end after it starts and have at least one point"})
+        return self.__rollups.query(args.node, args.currency, args.start, end, args.points)
@@ -0,0 +1,23 @@
+import logging
+
+from src.api.api_endpoint import ApiEndpoint
+
+log = logging.getLogger(__name__)
+
+
+class Staleness(ApiEndpoint):
+
+    def __init__(self, change_filter):
+        """
+        @param (ChangeFilter) change_filter: The filter of the unchanged samples of the stored prices.
+        """
+        super(Staleness, self).__init__()
+        self.__change_filter = change_filter
+
+    def get_command(self):
+        """
+        Implements the GET request.
+        @return (dict): Dictionary containing, for each node, the seconds since any of its samples changed, and for each of its
+                        currencies the seconds since its sample changed and since it was provided.
+        """
+        return {'heartbeat_interval': self.__change_filter.heartbeat_interval, 'nodes': self.__change_filter.get_staleness()}
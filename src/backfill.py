@@ -0,0 +1,38 @@
+import argparse
+import logging
+import os
+
+from src.library.backfill_importer import BackfillImporter
+from src.library.configuration import Configuration, load_config_from_file
+from src.library.storage_writer import StorageWriter
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import the CSV history of the price node monitor into the database")
+    parser.add_argument("--config_file", default="config.yml", help="the configuration file to load parameters from (default=config.yml)")
+    parser.add_argument("--path", default=None, help="the directory of the CSV history (default=the resources of the monitor)")
+    parser.add_argument("--state_file", default=None,
+                        help="the file of the offsets reached in each CSV file, to resume from (default=backfill_state.json in the path)")
+    parser.add_argument("--chunk_size", type=int, default=10000, help="the number of CSV lines imported per transaction (default=10000)")
+    parser.add_argument("--debug", action='store_true', default=False, help="log debug output")
+    args = parser.parse_args()
+
+    logging_level = logging.INFO
+    if args.debug:
+        logging_level = logging.DEBUG
+    logging.basicConfig(level=logging_level, format='%(asctime)s | %(name)s | %(filename)s:%(lineno)d | %(levelname)s | %(message)s')
+
+    if args.config_file and os.path.isfile(args.config_file):
+        load_config_from_file(args.config_file)
+
+    path = args.path
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir, "resources")
+    state_file = os.path.join(path, "backfill_state.json") if args.state_file is None else args.state_file
+
+    importer = BackfillImporter(StorageWriter(Configuration.database.engine), Configuration.database.engine, state_file, args.chunk_size)
+    importer.import_directory(path)
+
+
+if __name__ == "__main__":
+    main()
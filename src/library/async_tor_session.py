@@ -0,0 +1,244 @@
+import asyncio
+import json
+import logging
+import secrets
+import struct
+import time
+from urllib.parse import urlsplit
+
+from requests import HTTPError
+
+from src.library.latency_tracker import LatencyTracker
+from src.library.response_cache import ResponseCache
+from src.library.tor_session import parse_json, parse_text
+
+log = logging.getLogger(__name__)
+
+
+class AsyncTorSession(object):
+    """Represents an asyncio session for communicating on the TOR network."""
+
+    SOCKS_VERSION = 5
+    SOCKS_AUTH_NONE = 0
+    SOCKS_AUTH_USERNAME_PASSWORD = 2
+    SOCKS_CMD_CONNECT = 1
+    SOCKS_ATYP_IPV4 = 1
+    SOCKS_ATYP_DOMAIN = 3
+    SOCKS_ATYP_IPV6 = 4
+
+    def __init__(self, socks5_host='127.0.0.1', socks5_port=9050, connect_timeout=None, read_timeout=None, response_cache=None,
+                 socks5_username=None, socks5_password=None):
+        self.__response_cache = response_cache if response_cache is not None else ResponseCache()
+        self.__latency = LatencyTracker()
+        self.__socks5_username = socks5_username
+        self.__socks5_password = socks5_password
+        self.__in_flight_requests = {}
+        self.__socks5_host = socks5_host
+        self.__socks5_port = socks5_port
+        self.__connect_timeout = connect_timeout
+        self.__read_timeout = read_timeout
+
+    @property
+    def socks5_host(self):
+        return self.__socks5_host
+
+    @socks5_host.setter
+    def socks5_host(self, value):
+        self.__socks5_host = value
+
+    @property
+    def socks5_port(self):
+        return self.__socks5_port
+
+    @socks5_port.setter
+    def socks5_port(self, value):
+        if value < 0 or value > 65535:
+            raise ValueError("Port out of range")
+        self.__socks5_port = value
+
+    @property
+    def connect_timeout(self):
+        return self.__connect_timeout
+
+    @connect_timeout.setter
+    def connect_timeout(self, value):
+        self.__connect_timeout = value
+
+    @property
+    def read_timeout(self):
+        return self.__read_timeout
+
+    @read_timeout.setter
+    def read_timeout(self, value):
+        self.__read_timeout = value
+
+    @property
+    def socks5_username(self):
+        return self.__socks5_username
+
+    @property
+    def socks5_password(self):
+        return self.__socks5_password
+
+    @property
+    def response_cache(self):
+        return self.__response_cache
+
+    @property
+    def latency(self):
+        """Latencies of the recent successful requests, i.e. of the circuit(s) this session uses."""
+        return self.__latency
+
+    def set_socks5_credentials(self, username, password):
+        """Sets the SOCKS5 credentials; TOR puts requests with different credentials on different circuits (IsolateSOCKSAuth)."""
+        self.__socks5_username = username
+        self.__socks5_password = password
+
+    def renew_circuit(self):
+        """Switches to new random SOCKS5 credentials, so that TOR builds a new circuit for the following requests."""
+        self.set_socks5_credentials(secrets.token_hex(8), secrets.token_hex(8))
+        self.__latency.clear()
+
+    async def get_response(self, url, headers=None):
+        parsed_url = urlsplit(url)
+        if parsed_url.scheme != "http":
+            raise ValueError("Unsupported URL scheme: {}".format(url))
+        # The connect timeout covers the SOCKS5 handshake, as that is when TOR builds the circuit to the onion service
+        request_start = time.monotonic()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(self.__socks5_host, self.__socks5_port), self.__connect_timeout)
+        except (OSError, asyncio.TimeoutError) as ex:
+            raise ConnectionError(ex)
+        try:
+            await asyncio.wait_for(self.__connect_through_proxy(reader, writer, parsed_url.hostname, parsed_url.port or 80), self.__connect_timeout)
+            response = await asyncio.wait_for(self.__request(reader, writer, parsed_url, headers), self.__read_timeout)
+        except (OSError, EOFError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as ex:
+            raise ConnectionError(ex)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                # The connection was already reset, which is closed all the same
+                pass
+        self.__latency.record(time.monotonic() - request_start)
+        if response.status_code != 200 and not (headers and response.status_code == 304):
+            raise HTTPError("{0} returned HTTP error {1}".format(url, response.status_code))
+        return response
+
+    async def get_text_data(self, url):
+        return await self.get_parsed_data(url, parse_text)
+
+    async def get_json_data(self, url):
+        return await self.get_parsed_data(url, parse_json)
+
+    async def get_parsed_data(self, url, parse):
+        """Same as TorSession.get_parsed_data, coalescing concurrent requests of the same URL on the event loop."""
+        cached_response = self.__response_cache.get_fresh(url)
+        if cached_response is None:
+            cached_response = await self.__get_response_coalesced(url)
+        return cached_response.get_parsed_data(parse)
+
+    async def __get_response_coalesced(self, url):
+        in_flight_request = self.__in_flight_requests.get(url, None)
+        if in_flight_request is not None:
+            return await asyncio.shield(in_flight_request)
+        in_flight_request = self.__in_flight_requests[url] = asyncio.get_running_loop().create_future()
+        try:
+            response = await self.get_response(url, self.__response_cache.get_request_headers(url))
+            cached_response = self.__response_cache.store(url, response.status_code, response.headers, response.content)
+            in_flight_request.set_result(cached_response)
+            return cached_response
+        except BaseException as ex:
+            in_flight_request.set_exception(ex if isinstance(ex, Exception) else ConnectionError("Request was cancelled"))
+            in_flight_request.exception()   # marks the exception as retrieved, as there may be no coalesced request waiting for it
+            raise
+        finally:
+            del self.__in_flight_requests[url]
+
+    async def __connect_through_proxy(self, reader, writer, host, port):
+        """Performs the SOCKS5 handshake, letting the proxy resolve the host name (as socks5h does)."""
+        method = self.SOCKS_AUTH_NONE if self.__socks5_username is None else self.SOCKS_AUTH_USERNAME_PASSWORD
+        writer.write(struct.pack("BBB", self.SOCKS_VERSION, 1, method))
+        await writer.drain()
+        version, selected_method = struct.unpack("BB", await reader.readexactly(2))
+        if version != self.SOCKS_VERSION or selected_method != method:
+            raise ConnectionError("SOCKS5 proxy rejected authentication method {}".format(method))
+        if method == self.SOCKS_AUTH_USERNAME_PASSWORD:
+            username = self.__socks5_username.encode("utf-8")
+            password = (self.__socks5_password or "").encode("utf-8")
+            writer.write(struct.pack("BB", 1, len(username)) + username + struct.pack("B", len(password)) + password)
+            await writer.drain()
+            _, status = struct.unpack("BB", await reader.readexactly(2))
+            if status != 0:
+                raise ConnectionError("SOCKS5 proxy rejected the credentials")
+        encoded_host = host.encode("idna")
+        writer.write(struct.pack("BBBBB", self.SOCKS_VERSION, self.SOCKS_CMD_CONNECT, 0, self.SOCKS_ATYP_DOMAIN, len(encoded_host))
+                     + encoded_host + struct.pack(">H", port))
+        await writer.drain()
+        version, reply, _, address_type = struct.unpack("BBBB", await reader.readexactly(4))
+        if version != self.SOCKS_VERSION or reply != 0:
+            raise ConnectionError("SOCKS5 proxy failed to connect to {}:{} (reply {})".format(host, port, reply))
+        if address_type == self.SOCKS_ATYP_IPV4:
+            await reader.readexactly(4 + 2)
+        elif address_type == self.SOCKS_ATYP_IPV6:
+            await reader.readexactly(16 + 2)
+        elif address_type == self.SOCKS_ATYP_DOMAIN:
+            address_length = (await reader.readexactly(1))[0]
+            await reader.readexactly(address_length + 2)
+        else:
+            raise ConnectionError("SOCKS5 proxy returned unknown address type {}".format(address_type))
+
+    @staticmethod
+    async def __request(reader, writer, parsed_url, headers=None):
+        path = parsed_url.path or "/"
+        if parsed_url.query:
+            path += "?" + parsed_url.query
+        extra_headers = "".join("{0}: {1}\r\n".format(key, value) for key, value in (headers or {}).items())
+        writer.write("GET {0} HTTP/1.1\r\nHost: {1}\r\nAccept-Encoding: identity\r\nConnection: close\r\n{2}\r\n"
+                     .format(path, parsed_url.netloc, extra_headers).encode("ascii"))
+        await writer.drain()
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("iso-8859-1").split("\r\n")
+        status_line = head[0].split(" ", 2)
+        if len(status_line) < 2 or not status_line[0].startswith("HTTP/"):
+            raise ValueError("Malformed HTTP status line: {}".format(head[0]))
+        headers = {}
+        for line in head[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        status_code = int(status_line[1])
+        if status_code in (204, 304):
+            content = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            content = b""
+            while True:
+                chunk_size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if chunk_size == 0:
+                    break
+                content += await reader.readexactly(chunk_size)
+                await reader.readexactly(2)
+        elif "content-length" in headers:
+            content = await reader.readexactly(int(headers["content-length"]))
+        else:
+            content = await reader.read()
+        return AsyncResponse(status_code, headers, content)
+
+
+class AsyncResponse(object):
+    """Represents an HTTP response received by the AsyncTorSession."""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content.decode("utf-8"))
+
+    def __repr__(self):
+        return "<AsyncResponse [{}]>".format(self.status_code)
@@ -0,0 +1,149 @@
+import calendar
+import csv
+import gzip
+import json
+import logging
+import os
+import re
+import time
+
+log = logging.getLogger(__name__)
+
+
+class BackfillImporter(object):
+    """
+    Imports the CSV history of the exchange and fee rates written by the price node monitor (the active files and their rotated
+    segments) into the database. Each file is read in chunks of lines, whose wide rows (a column per node address) are turned
+    into a row per node and inserted through the bulk insert of the storage writer, so that years of history are imported in
+    bounded memory. The offset of the last line imported from each file is saved in a state file after the transaction of its
+    chunk, along with the identity of the file (its inode and its first row), so an interrupted import resumes where it
+    stopped while a file that was replaced, e.g. by the rotation of the active file, is imported from its start; as rows
+    already stored are skipped, importing a chunk twice, or importing files again, does not change the database.
+    The imported rows are only added to the rollups where these do not cover them yet, since the live writer adds every polled
+    price to the rollups, including the ones that its change filter left out of the stored rows.
+    """
+
+    FILE_PATTERN = re.compile(r"^(?P<currency>\w+)_historical_(?P<kind>exchange|fee)_rates(\.\d{4}-\d{2}-\d{2}(\.\d+)?)?\.csv(\.gz)?$")
+    TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S UTC"
+    # Values written for the prices that a node did not report, by the former and by the current versions of the monitor
+    MISSING_VALUES = ("", "-1", "timeout")
+    # The provider of the imported exchange rates, which the CSV history does not record
+    PROVIDER = "csv"
+
+    def __init__(self, storage_writer, engine, state_path, chunk_size=10000):
+        """
+        @param (StorageWriter) storage_writer: The storage writer whose bulk insert writes the rows; it needs not be started.
+        @param (sqlalchemy.engine.Engine) engine: The engine of the database.
+        @param (str) state_path: The path of the file of the offsets reached in each CSV file.
+        @param (int) chunk_size: Number of CSV lines per transaction.
+        """
+        self.__storage_writer = storage_writer
+        self.__engine = engine
+        self.__state_path = state_path
+        self.__chunk_size = max(1, chunk_size)
+        self.__state = {}
+        if os.path.isfile(state_path):
+            with open(state_path, "r") as file_stream:
+                self.__state = json.load(file_stream)
+        self.__statistics = {"files": 0, "lines": 0, "rows": 0, "inserted_rows": 0, "skipped_values": 0, "seconds": 0}
+
+    @property
+    def statistics(self):
+        """Number of files and lines read, of rows read and inserted, of missing or invalid values skipped, and the duration."""
+        return dict(self.__statistics)
+
+    def import_directory(self, directory):
+        """
+        Imports the CSV history files of a directory, the rotated segments of a file before the file itself.
+        @param (str) directory: The directory of the CSV history, e.g. the resources of the monitor.
+        @return (dict): The statistics of the import.
+        """
+        filenames = [x for x in os.listdir(directory) if self.FILE_PATTERN.match(x)]
+        # The active file (without a day in its name) holds the latest rows of its series
+        for filename in sorted(filenames, key=lambda x: (x.split(".")[0], x.count(".") == 1, x)):
+            self.import_file(os.path.join(directory, filename))
+        log.info("Imported {inserted_rows} new rows of {rows} from {lines} lines of {files} files in {seconds:.1f}s".format(**self.__statistics))
+        return self.statistics
+
+    def import_file(self, file_path):
+        """
+        Imports a CSV history file, from the offset reached by the previous import. The last line is left for a later import
+        if it is incomplete, e.g. while the monitor is writing it.
+        @param (str) file_path: The path of the file.
+        """
+        filename = os.path.basename(file_path)
+        match = self.FILE_PATTERN.match(filename)
+        if match is None:
+            raise ValueError("{} is not a CSV history file".format(filename))
+        currency = match.group("currency") if match.group("kind") == "fee" else match.group("currency").upper()
+        import_start = time.monotonic()
+        with (gzip.open(file_path, "rb") if filename.endswith(".gz") else open(file_path, "rb")) as file_stream:
+            header_line = file_stream.readline()
+            if not header_line.endswith(b"\n"):
+                return
+            header = next(csv.reader([header_line.decode()]))
+            first_line = file_stream.readline()
+            identity = {"header": header_line.decode(), "inode": os.fstat(file_stream.fileno()).st_ino,
+                        "first_line": first_line.decode() if first_line.endswith(b"\n") else None}
+            offset = self.__get_offset(filename, identity, len(header_line))
+            file_stream.seek(offset)
+            file_rows = 0
+            while True:
+                lines = []
+                while len(lines) < self.__chunk_size:
+                    line = file_stream.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    lines.append(line)
+                if not lines:
+                    break
+                offset += sum(len(x) for x in lines)
+                file_rows += self.__import_chunk(match.group("kind"), currency, header, lines)
+                self.__state[filename] = dict(identity, offset=offset)
+                self.__save_state()
+                self.__statistics["lines"] += len(lines)
+        duration = time.monotonic() - import_start
+        self.__statistics["files"] += 1
+        self.__statistics["seconds"] += duration
+        log.info("Imported {} rows of {} in {:.1f}s ({:.0f} rows/s)".format(file_rows, filename, duration, file_rows / duration if duration else 0))
+
+    def __get_offset(self, filename, identity, start):
+        """Returns the offset to resume a file from; from its start if it is not the file of the previous import."""
+        state = self.__state.get(filename, None)
+        if state is None or any(state.get(key, None) != value for key, value in identity.items()):
+            return start
+        return state["offset"]
+
+    def __import_chunk(self, kind, currency, header, lines):
+        """Converts the wide lines of a chunk into a row per node and inserts them in one transaction; returns the number of rows."""
+        rows = []
+        for row in csv.reader(x.decode() for x in lines):
+            timestamp = calendar.timegm(time.strptime(row[0], self.TIMESTAMP_FORMAT))
+            for address, value in zip(header[1:], row[1:]):
+                try:
+                    price = None if value in self.MISSING_VALUES else float(value)
+                except ValueError:
+                    price = None
+                if price is None:
+                    self.__statistics["skipped_values"] += 1
+                    continue
+                if kind == "exchange":
+                    rows.append({"price_node_id": address, "currency_id": currency, "price": price, "timestamp": timestamp,
+                                 "provider_timestamp": None, "provider": self.PROVIDER})
+                else:
+                    rows.append({"price_node_id": address, "currency_id": currency, "price": price, "timestamp": timestamp,
+                                 "provider_timestamp": None})
+        with self.__engine.begin() as connection:
+            if kind == "exchange":
+                inserted = self.__storage_writer.insert_rows(connection, rows, [])
+            else:
+                inserted = self.__storage_writer.insert_rows(connection, [], rows)
+        self.__statistics["rows"] += len(rows)
+        self.__statistics["inserted_rows"] += inserted
+        return len(rows)
+
+    def __save_state(self):
+        temporary_file_path = self.__state_path + ".tmp"
+        with open(temporary_file_path, "w") as file_stream:
+            json.dump(self.__state, file_stream)
+        os.replace(temporary_file_path, self.__state_path)
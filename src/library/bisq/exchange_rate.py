@@ -1,9 +1,14 @@
 from datetime import datetime
+from functools import total_ordering
 
 
+@total_ordering
 class ExchangeRate(object):
     """Represents the spot price in Bitcoin for a given currency at a given time as reported by a given provider."""
 
+    # Slots instead of a per-instance __dict__, as exchange rates are kept by the million in the history
+    __slots__ = ("__currency", "__price", "__timestamp", "__provider")
+
     def __init__(self, currency, price, timestamp, provider):
         self.__currency = currency
         self.__price = price
@@ -26,6 +31,9 @@ class ExchangeRate(object):
     def provider(self):
         return self.__provider
 
+    def __key(self):
+        return self.__timestamp, self.__currency, self.__price, self.__provider
+
     def __eq__(self, other):
         if isinstance(other, ExchangeRate) \
                 and other.currency == self.currency \
@@ -35,6 +43,18 @@ class ExchangeRate(object):
             return True
         return False
 
+    def __lt__(self, other):
+        """Orders exchange rates by timestamp, then by currency, price and provider."""
+        if not isinstance(other, ExchangeRate):
+            return NotImplemented
+        return self.__key() < other.__key()
+
+    def __hash__(self):
+        return hash(self.__key())
+
+    def __reduce__(self):
+        return ExchangeRate, (self.__currency, self.__price, self.__timestamp, self.__provider)
+
     def __repr__(self):
         return "<ExchangeRate {0}={1} @ {2} UTC from {3}>".format(
             self.currency, self.price,
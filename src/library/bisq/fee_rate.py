@@ -1,9 +1,13 @@
 from datetime import datetime
+from functools import total_ordering
 
 
+@total_ordering
 class FeeRate(object):
     """Represents the mining fee rate for a given base currency."""
 
+    __slots__ = ("__currency", "__price", "__timestamp")
+
     def __init__(self, currency, price, timestamp):
         self.__currency = currency
         self.__price = price
@@ -21,6 +25,9 @@ class FeeRate(object):
     def timestamp(self):
         return self.__timestamp
 
+    def __key(self):
+        return self.__timestamp, self.__currency, self.__price
+
     def __eq__(self, other):
         if isinstance(other, FeeRate) \
                 and other.currency == self.currency \
@@ -29,6 +36,18 @@ class FeeRate(object):
             return True
         return False
 
+    def __lt__(self, other):
+        """Orders fee rates by timestamp, then by currency and price."""
+        if not isinstance(other, FeeRate):
+            return NotImplemented
+        return self.__key() < other.__key()
+
+    def __hash__(self):
+        return hash(self.__key())
+
+    def __reduce__(self):
+        return FeeRate, (self.__currency, self.__price, self.__timestamp)
+
     def __repr__(self):
         return "<FeeRate {0}={1} @ {2} UTC>".format(
             self.currency, self.price, datetime.utcfromtimestamp(self.timestamp).strftime('%Y-%m-%d %H:%M:%S'))
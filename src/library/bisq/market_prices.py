@@ -0,0 +1,73 @@
+import json
+import re
+from collections.abc import Mapping
+
+from src.library.bisq.exchange_rate import ExchangeRate
+from src.library.tor_session import IncorrectResponseData
+
+
+class MarketPrices(Mapping):
+    """
+    Represents the exchange rates of a getAllMarketPrices response, by currency code.
+    The response is only scanned for the position of each currency; an exchange rate is decoded the first time it is accessed.
+    """
+
+    DATA_PATTERN = re.compile(rb'"data"\s*:\s*\[')
+    CURRENCY_CODE_PATTERN = re.compile(rb'"currencyCode"\s*:\s*"([^"]*)"')
+    REQUIRED_KEYS = ("currencyCode", "price", "timestampSec", "provider")
+
+    def __init__(self, content):
+        """
+        @param (bytes) content: The body of the getAllMarketPrices response.
+        @raise (IncorrectResponseData) if the response contains no 'data' array.
+        """
+        self.__content = content
+        data = self.DATA_PATTERN.search(content)
+        if data is None:
+            raise IncorrectResponseData("JSON content does not contain 'data'")
+        self.__offsets = {}
+        for match in self.CURRENCY_CODE_PATTERN.finditer(content, data.end()):
+            self.__offsets[match.group(1).decode("utf-8")] = content.rfind(b"{", data.end(), match.start())
+        self.__exchange_rates = {}
+        self.__decoder = json.JSONDecoder()
+
+    def select(self, currencies):
+        """
+        Decodes the exchange rates of the given currencies, so that invalid entries are reported right away.
+        @param (list) currencies: The currency codes; codes missing from the response are ignored.
+        @raise (IncorrectResponseData) if an entry of the given currencies is invalid.
+        @return (MarketPrices): This instance.
+        """
+        for currency in currencies:
+            if currency in self.__offsets:
+                self[currency]
+        return self
+
+    def __getitem__(self, currency):
+        exchange_rate = self.__exchange_rates.get(currency, None)
+        if exchange_rate is None:
+            if currency not in self.__offsets:
+                raise KeyError(currency)
+            exchange_rate = self.__exchange_rates[currency] = self.__decode_entry(self.__offsets[currency])
+        return exchange_rate
+
+    def __iter__(self):
+        return iter(self.__offsets)
+
+    def __len__(self):
+        return len(self.__offsets)
+
+    def __contains__(self, currency):
+        return currency in self.__offsets
+
+    def __decode_entry(self, offset):
+        try:
+            entry, _ = self.__decoder.raw_decode(self.__content[offset:self.__content.index(b"}", offset) + 1].decode("utf-8"))
+        except ValueError as e:
+            raise IncorrectResponseData("Invalid content in JSON 'data' at offset {}: {}".format(offset, e))
+        if not isinstance(entry, dict) or any(x not in entry for x in self.REQUIRED_KEYS):
+            raise IncorrectResponseData("Invalid content in JSON 'data': {}".format(entry))
+        return ExchangeRate(entry['currencyCode'], entry['price'], entry['timestampSec']/1000, entry['provider'])
+
+    def __repr__(self):
+        return "<MarketPrices of {} currencies, {} decoded>".format(len(self.__offsets), len(self.__exchange_rates))
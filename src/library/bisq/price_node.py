@@ -2,9 +2,9 @@ import logging
 
 from requests import HTTPError
 
-from src.library.bisq.exchange_rate import ExchangeRate
 from src.library.bisq.fee_rate import FeeRate
-from src.library.tor_session import IncorrectResponseData
+from src.library.bisq.market_prices import MarketPrices
+from src.library.tor_session import IncorrectResponseData, parse_json
 
 log = logging.getLogger(__name__)
 
@@ -12,6 +12,8 @@ log = logging.getLogger(__name__)
 class PriceNode(object):
     """Represents a Bisq network price node."""
 
+    __slots__ = ("__address", "__operator")
+
     def __init__(self, address, operator=""):
         self.__address = address
         self.__operator = operator
@@ -42,8 +44,48 @@ class PriceNode(object):
         return tor_session.get_text_data("http://{}/getParams".format(self.address))
 
     def get_current_fees(self, tor_session):
+        return tor_session.get_parsed_data("http://{}/getFees".format(self.address), self.__parse_fees_response)
+
+    def get_current_market_prices(self, tor_session, currencies=None):
+        """
+        Returns the exchange rates reported by the node, by currency code.
+        @param (TorSession) tor_session: The session to request the node with.
+        @param (list) currencies: Currency codes whose exchange rates are decoded (and validated) right away; others are decoded on access.
+        @return (MarketPrices): The exchange rates.
+        """
+        market_prices = tor_session.get_parsed_data("http://{}/getAllMarketPrices".format(self.address), self.__parse_market_prices_response)
+        return market_prices.select(currencies or ())
+
+    async def is_online_async(self, async_tor_session):
+        try:
+            await self.get_version_async(async_tor_session)
+            return True
+        except ConnectionError as e:
+            log.debug(e)
+        return False
+
+    async def get_version_async(self, async_tor_session):
+        return await async_tor_session.get_text_data("http://{}/getVersion".format(self.address))
+
+    async def get_current_fees_async(self, async_tor_session):
+        return await async_tor_session.get_parsed_data("http://{}/getFees".format(self.address), self.__parse_fees_response)
+
+    async def get_current_market_prices_async(self, async_tor_session, currencies=None):
+        market_prices = await async_tor_session.get_parsed_data("http://{}/getAllMarketPrices".format(self.address),
+                                                                self.__parse_market_prices_response)
+        return market_prices.select(currencies or ())
+
+    @staticmethod
+    def __parse_fees_response(content):
+        return PriceNode.__parse_fees(parse_json(content))
+
+    @staticmethod
+    def __parse_market_prices_response(content):
+        return MarketPrices(content)
+
+    @staticmethod
+    def __parse_fees(json_data):
         fees = {}
-        json_data = tor_session.get_json_data("http://{}/getFees".format(self.address))
         if 'dataMap' not in json_data:
             raise IncorrectResponseData("JSON content does not contain 'dataMap'")
         for key, value in json_data['dataMap'].items():
@@ -54,23 +96,14 @@ class PriceNode(object):
             fees[currency] = fee_rate
         return fees
 
-    def get_current_market_prices(self, tor_session):
-        prices = {}
-        json_data = tor_session.get_json_data("http://{}/getAllMarketPrices".format(self.address))
-        if 'data' not in json_data:
-            raise IncorrectResponseData("JSON content does not contain 'data'")
-        for currency in json_data['data']:
-            if any(x not in currency for x in ['currencyCode', 'price', 'timestampSec', 'provider']):
-                raise IncorrectResponseData("Invalid content in JSON 'data': {}".format(json_data['data']))
-            exchange_rate = ExchangeRate(currency['currencyCode'], currency['price'], currency['timestampSec']/1000, currency['provider'])
-            prices[currency['currencyCode']] = exchange_rate
-        return prices
-
     def __eq__(self, other):
         if isinstance(other, PriceNode) and other.address == self.address:
             return True
         return False
 
+    def __hash__(self):
+        return hash(self.__address)
+
     def __repr__(self):
         return "<PriceNode {}>".format(self.address)
 
@@ -0,0 +1,166 @@
+import numpy
+
+from src.library.bisq.exchange_rate import ExchangeRate
+from src.library.bisq.fee_rate import FeeRate
+from src.library.tor_session import IncorrectResponseData
+
+
+def encode_strings(values):
+    """
+    Interns a column of strings as indexes into the array of its distinct values.
+    @return (tuple): The distinct values, and the index of each value into them.
+    """
+    names, codes = numpy.unique(numpy.asarray(values, dtype=str), return_inverse=True)
+    return names, codes.astype(numpy.uint16 if len(names) <= numpy.iinfo(numpy.uint16).max else numpy.uint32)
+
+
+class ExchangeRateBatch(object):
+    """
+    Represents many exchange rates as columns of NumPy arrays instead of one object each,
+    e.g. all exchange rates of a getAllMarketPrices response or a long history of them.
+    """
+
+    REQUIRED_KEYS = ("currencyCode", "price", "timestampSec", "provider")
+
+    def __init__(self, currencies, prices, timestamps, providers):
+        """
+        @param (list) currencies: The currency codes.
+        @param (list) prices: The prices, as floats.
+        @param (list) timestamps: The timestamps, in seconds since the epoch.
+        @param (list) providers: The providers.
+        """
+        self.__currency_names, self.__currency_codes = encode_strings(currencies)
+        self.__prices = numpy.asarray(prices, dtype=numpy.float64)
+        self.__timestamps = numpy.asarray(timestamps, dtype=numpy.float64)
+        self.__provider_names, self.__provider_codes = encode_strings(providers)
+        if not len(self.__currency_codes) == len(self.__prices) == len(self.__timestamps) == len(self.__provider_codes):
+            raise ValueError("Columns of an exchange rate batch must have the same length")
+        for column in (self.__currency_codes, self.__prices, self.__timestamps, self.__provider_codes):
+            column.setflags(write=False)
+
+    @classmethod
+    def from_json(cls, json_data):
+        """
+        Creates a batch from a parsed getAllMarketPrices response.
+        @raise (IncorrectResponseData) if the response is invalid.
+        @param (dict) json_data: The parsed response.
+        @return (ExchangeRateBatch): The batch.
+        """
+        if 'data' not in json_data:
+            raise IncorrectResponseData("JSON content does not contain 'data'")
+        data = json_data['data']
+        if any(any(x not in currency for x in cls.REQUIRED_KEYS) for currency in data):
+            raise IncorrectResponseData("Invalid content in JSON 'data': {}".format(data))
+        return cls([x['currencyCode'] for x in data],
+                   [x['price'] for x in data],
+                   numpy.fromiter((x['timestampSec'] for x in data), dtype=numpy.float64, count=len(data)) / 1000,
+                   [x['provider'] for x in data])
+
+    @classmethod
+    def from_exchange_rates(cls, exchange_rates):
+        exchange_rates = list(exchange_rates)
+        return cls([x.currency for x in exchange_rates], [x.price for x in exchange_rates],
+                   [x.timestamp for x in exchange_rates], [x.provider for x in exchange_rates])
+
+    @property
+    def currencies(self):
+        return self.__currency_names[self.__currency_codes]
+
+    @property
+    def prices(self):
+        return self.__prices
+
+    @property
+    def timestamps(self):
+        return self.__timestamps
+
+    @property
+    def providers(self):
+        return self.__provider_names[self.__provider_codes]
+
+    @property
+    def nbytes(self):
+        return sum(x.nbytes for x in (self.__currency_names, self.__currency_codes, self.__prices, self.__timestamps,
+                                      self.__provider_names, self.__provider_codes))
+
+    def select(self, currency):
+        """Returns the exchange rates of the given currency as a new batch."""
+        mask = numpy.isin(self.__currency_codes, numpy.flatnonzero(self.__currency_names == currency))
+        return ExchangeRateBatch(self.currencies[mask], self.__prices[mask], self.__timestamps[mask], self.providers[mask])
+
+    def __len__(self):
+        return len(self.__prices)
+
+    def __getitem__(self, index):
+        return ExchangeRate(str(self.__currency_names[self.__currency_codes[index]]), float(self.__prices[index]),
+                            float(self.__timestamps[index]), str(self.__provider_names[self.__provider_codes[index]]))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return "<ExchangeRateBatch of {} exchange rates>".format(len(self))
+
+
+class FeeRateBatch(object):
+    """Represents many fee rates as columns of NumPy arrays instead of one object each."""
+
+    def __init__(self, currencies, prices, timestamps):
+        self.__currency_names, self.__currency_codes = encode_strings(currencies)
+        self.__prices = numpy.asarray(prices, dtype=numpy.float64)
+        self.__timestamps = numpy.asarray(timestamps, dtype=numpy.float64)
+        if not len(self.__currency_codes) == len(self.__prices) == len(self.__timestamps):
+            raise ValueError("Columns of a fee rate batch must have the same length")
+        for column in (self.__currency_codes, self.__prices, self.__timestamps):
+            column.setflags(write=False)
+
+    @classmethod
+    def from_json(cls, json_data):
+        """
+        Creates a batch from a parsed getFees response.
+        @raise (IncorrectResponseData) if the response is invalid.
+        @param (dict) json_data: The parsed response.
+        @return (FeeRateBatch): The batch.
+        """
+        if 'dataMap' not in json_data:
+            raise IncorrectResponseData("JSON content does not contain 'dataMap'")
+        if any(not x.endswith("TxFee") for x in json_data['dataMap']):
+            raise IncorrectResponseData("Invalid content in JSON 'dataMap': {}".format(json_data['dataMap']))
+        return cls([x[:-5] for x in json_data['dataMap']],     # strip "TxFee" to get the currency name
+                   list(json_data['dataMap'].values()),
+                   numpy.full(len(json_data['dataMap']), json_data['bitcoinFeesTs'], dtype=numpy.float64))
+
+    @classmethod
+    def from_fee_rates(cls, fee_rates):
+        fee_rates = list(fee_rates)
+        return cls([x.currency for x in fee_rates], [x.price for x in fee_rates], [x.timestamp for x in fee_rates])
+
+    @property
+    def currencies(self):
+        return self.__currency_names[self.__currency_codes]
+
+    @property
+    def prices(self):
+        return self.__prices
+
+    @property
+    def timestamps(self):
+        return self.__timestamps
+
+    @property
+    def nbytes(self):
+        return sum(x.nbytes for x in (self.__currency_names, self.__currency_codes, self.__prices, self.__timestamps))
+
+    def __len__(self):
+        return len(self.__prices)
+
+    def __getitem__(self, index):
+        return FeeRate(str(self.__currency_names[self.__currency_codes[index]]), float(self.__prices[index]), float(self.__timestamps[index]))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return "<FeeRateBatch of {} fee rates>".format(len(self))
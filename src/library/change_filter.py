@@ -0,0 +1,90 @@
+import threading
+import time
+
+
+class LastSample(object):
+    """The last provider sample served by a node for a currency, with the poll times it was first seen and last written at."""
+
+    __slots__ = ("provider_timestamp", "price", "changed", "written")
+
+    def __init__(self, provider_timestamp, price, changed, written):
+        self.provider_timestamp = provider_timestamp
+        self.price = price
+        self.changed = changed
+        self.written = written
+
+
+class ChangeFilter(object):
+    """
+    Keeps the last provider sample (provider timestamp and price) of each node and currency, so that only the samples that
+    changed since the previous poll are stored, along with a heartbeat of the unchanged ones every given interval. A stored
+    series is then read as holding its value until its next row, and the heartbeats bound the gap between two rows.
+    The time since the sample of a node last changed tells how long the node has been serving a stale sample.
+    The samples that are accepted into a batch are kept as pending until the batch is committed, so that the samples of a
+    batch that fails to be written are accepted again by the next poll.
+    """
+
+    def __init__(self, heartbeat_interval=3600):
+        """
+        @param (float) heartbeat_interval: Maximum time (in seconds) between two stored rows of an unchanged sample.
+        """
+        self.__heartbeat_interval = heartbeat_interval
+        self.__last_samples = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def heartbeat_interval(self):
+        return self.__heartbeat_interval
+
+    def accept(self, address, currency, poll_time, provider_timestamp, price, pending=None):
+        """
+        Tells whether the sample served by a node for a currency at a poll is to be stored.
+        @param (str) address: The address of the node.
+        @param (str) currency: The currency code.
+        @param (int) poll_time: Time of the poll, in seconds since the epoch.
+        @param (int) provider_timestamp: Time of the sample according to its provider, in seconds since the epoch.
+        @param (float) price: The price of the sample.
+        @param (dict) pending: The samples accepted into the batch that is not committed yet, which the sample is added to if
+                               accepted, until passed to commit; the sample is recorded as stored right away if None.
+        @return (bool): Whether the sample is to be stored, i.e. it changed or a heartbeat is due.
+        """
+        key = (address, currency)
+        with self.__lock:
+            last_sample = pending[key] if pending is not None and key in pending else self.__last_samples.get(key, None)
+            if last_sample is None or last_sample.provider_timestamp != provider_timestamp or last_sample.price != price:
+                sample = LastSample(provider_timestamp, price, poll_time, poll_time)
+            elif poll_time - last_sample.written >= self.__heartbeat_interval:
+                sample = LastSample(last_sample.provider_timestamp, last_sample.price, last_sample.changed, poll_time)
+            else:
+                return False
+            if pending is None:
+                self.__last_samples[key] = sample
+            else:
+                pending[key] = sample
+            return True
+
+    def commit(self, pending):
+        """
+        Records the samples accepted into a batch as stored, once the batch is committed.
+        @param (dict) pending: The samples accepted into the batch, as filled by accept.
+        """
+        with self.__lock:
+            self.__last_samples.update(pending)
+
+    def get_staleness(self, now=None):
+        """
+        Returns how long each node has been serving unchanged samples, overall and for each currency, along with the age of
+        the samples according to their provider.
+        @param (float) now: The current time, in seconds since the epoch.
+        @return (dict): The seconds since any sample of each node changed, and the seconds since the sample of each of its
+                        currencies changed and since it was provided, by node address.
+        """
+        now = time.time() if now is None else now
+        staleness = {}
+        with self.__lock:
+            for (address, currency), last_sample in self.__last_samples.items():
+                node = staleness.setdefault(address, {"stale_seconds": None, "currencies": {}})
+                node["currencies"][currency] = {"stale_seconds": now - last_sample.changed, "age_seconds": now - last_sample.provider_timestamp}
+                if node["stale_seconds"] is None or now - last_sample.changed < node["stale_seconds"]:
+                    node["stale_seconds"] = now - last_sample.changed
+        return staleness
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from enum import IntEnum
+
+log = logging.getLogger(__name__)
+
+
+class CircuitState(IntEnum):
+    closed = 1,  # requests are allowed
+    open = 2,  # requests are skipped until the cooldown has elapsed
+    half_open = 3  # a single probe request is allowed to decide whether to close or re-open
+
+
+class CircuitBreaker(object):
+    """Stops requests to a node after consecutive failures, and probes it again after an exponentially growing cooldown."""
+
+    MAX_TRANSITIONS = 50
+
+    def __init__(self, name, failure_threshold=3, cooldown=240, max_cooldown=7680, clock=time.monotonic):
+        self.__name = name
+        self.__failure_threshold = max(1, failure_threshold)
+        self.__base_cooldown = cooldown
+        self.__max_cooldown = max(cooldown, max_cooldown)
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__state = CircuitState.closed
+        self.__consecutive_failures = 0
+        self.__cooldown = cooldown
+        self.__opened_at = None
+        self.__transitions = deque(maxlen=self.MAX_TRANSITIONS)
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def state(self):
+        return self.__state
+
+    @property
+    def consecutive_failures(self):
+        return self.__consecutive_failures
+
+    @property
+    def cooldown(self):
+        return self.__cooldown
+
+    @property
+    def retry_in(self):
+        """Seconds until the next probe is allowed, or 0 if the circuit is not open."""
+        if self.__state != CircuitState.open:
+            return 0
+        return max(0, self.__opened_at + self.__cooldown - self.__clock())
+
+    @property
+    def transitions(self):
+        return list(self.__transitions)
+
+    def allow_request(self):
+        """
+        Returns the state to poll the node in; an open circuit whose cooldown has elapsed becomes half-open.
+        @return (CircuitState): closed to poll normally, half_open to send a single probe, open to skip the node.
+        """
+        with self.__lock:
+            if self.__state == CircuitState.open and self.__clock() >= self.__opened_at + self.__cooldown:
+                self.__transition(CircuitState.half_open, "cooldown of {:.0f}s elapsed".format(self.__cooldown))
+            return self.__state
+
+    def record_success(self):
+        with self.__lock:
+            self.__consecutive_failures = 0
+            self.__cooldown = self.__base_cooldown
+            if self.__state != CircuitState.closed:
+                self.__transition(CircuitState.closed, "probe succeeded")
+
+    def record_failure(self, reason=""):
+        with self.__lock:
+            self.__consecutive_failures += 1
+            if self.__state == CircuitState.half_open:
+                self.__cooldown = min(self.__cooldown * 2, self.__max_cooldown)
+                self.__open("probe failed: {}".format(reason))
+            elif self.__state == CircuitState.closed and self.__consecutive_failures >= self.__failure_threshold:
+                self.__open("{} consecutive failures: {}".format(self.__consecutive_failures, reason))
+
+    def __open(self, reason):
+        self.__opened_at = self.__clock()
+        self.__transition(CircuitState.open, reason)
+
+    def __transition(self, state, reason):
+        log.info("Circuit breaker of {} changed from {} to {} ({})".format(self.__name, self.__state.name, state.name, reason))
+        self.__transitions.append({"timestamp": datetime.utcnow(),
+                                   "from_state": self.__state.name,
+                                   "to_state": state.name,
+                                   "reason": reason})
+        self.__state = state
+
+    def to_dict(self):
+        return {"name": self.name,
+                "state": self.state.name,
+                "consecutive_failures": self.consecutive_failures,
+                "cooldown": self.cooldown,
+                "retry_in": self.retry_in,
+                "transitions": self.transitions}
+
+    def __repr__(self):
+        return "<CircuitBreaker {} {}>".format(self.__name, self.__state.name)
+
+    def __str__(self):
+        return "<CircuitBreaker {} {}>".format(self.__name, self.__state.name)
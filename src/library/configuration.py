@@ -17,6 +17,44 @@ class Configuration(with_metaclass(SingletonMetaClass, object)):
     web_host = "127.0.0.1"
     web_port = 5000
     poll_interval = 120
+    poll_jitter = 0
+    poll_max_backoff = 1
+    poll_concurrency = 1
+    poll_engine = "threads"
+    poll_deadline = None
+    connect_timeout = None
+    read_timeout = None
+    response_cache_window = 0
+    circuit_breaker_threshold = 3
+    circuit_breaker_cooldown = 240
+    circuit_breaker_max_cooldown = 7680
+    tor_circuits = 1
+    tor_circuit_strategy = "per_node"
+    tor_circuit_rotation_factor = 3
+    request_hedging = False
+    request_hedging_percentile = 90
+    request_hedging_max_rate = 0.1
+    history_capacity = 720
+    drift_alpha = 0.1
+    drift_threshold = 4.0
+    drift_warmup = 10
+    database_batch_size = 1000
+    database_flush_interval = 5
+    database_change_only = False
+    database_heartbeat_interval = 3600
+    retention_raw_days = None
+    retention_1m_days = None
+    retention_1h_days = None
+    retention_1d_days = None
+    retention_interval = 3600
+    retention_dry_run = False
+    csv_flush_interval = 60
+    csv_fsync = False
+    csv_rotation_size = 64
+    csv_rotation_daily = True
+    csv_compression = False
+    segment_store = False
+    segment_capacity = 1048576
     price_nodes = []
     monitored_markets = []
     database = None
@@ -59,6 +97,56 @@ class ConfigurationBuilder(object):
         Configuration.web_host = cls._get_settings("web_host", Configuration.web_host, StringFormat.ip_address)
         Configuration.web_port = cls._get_settings("web_port", Configuration.web_port, StringFormat.int)
         Configuration.poll_interval = cls._get_settings("poll_interval", Configuration.poll_interval, StringFormat.int)
+        Configuration.poll_jitter = cls._get_settings("poll_jitter", Configuration.poll_jitter, StringFormat.float)
+        Configuration.poll_max_backoff = cls._get_settings("poll_max_backoff", Configuration.poll_max_backoff, StringFormat.int)
+        Configuration.poll_concurrency = cls._get_settings("poll_concurrency", Configuration.poll_concurrency, StringFormat.int)
+        Configuration.poll_engine = cls._get_settings("poll_engine", Configuration.poll_engine, StringFormat.alphabetic)
+        if Configuration.poll_engine not in ("threads", "asyncio"):
+            raise ConfigurationError("Unsupported poll engine: {}".format(Configuration.poll_engine))
+        Configuration.poll_deadline = cls._get_settings("poll_deadline", Configuration.poll_deadline, StringFormat.float)
+        Configuration.connect_timeout = cls._get_settings("connect_timeout", Configuration.connect_timeout, StringFormat.float)
+        Configuration.read_timeout = cls._get_settings("read_timeout", Configuration.read_timeout, StringFormat.float)
+        Configuration.response_cache_window = cls._get_settings("response_cache_window", Configuration.response_cache_window, StringFormat.float)
+        Configuration.circuit_breaker_threshold = cls._get_settings("circuit_breaker_threshold", Configuration.circuit_breaker_threshold,
+                                                                    StringFormat.int)
+        Configuration.circuit_breaker_cooldown = cls._get_settings("circuit_breaker_cooldown", Configuration.circuit_breaker_cooldown,
+                                                                   StringFormat.float)
+        Configuration.circuit_breaker_max_cooldown = cls._get_settings("circuit_breaker_max_cooldown", Configuration.circuit_breaker_max_cooldown,
+                                                                       StringFormat.float)
+        Configuration.tor_circuits = cls._get_settings("tor_circuits", Configuration.tor_circuits, StringFormat.int)
+        Configuration.tor_circuit_strategy = cls._get_settings("tor_circuit_strategy", Configuration.tor_circuit_strategy)
+        if Configuration.tor_circuit_strategy not in ("per_node", "round_robin", "least_latency"):
+            raise ConfigurationError("Unsupported TOR circuit strategy: {}".format(Configuration.tor_circuit_strategy))
+        Configuration.tor_circuit_rotation_factor = cls._get_settings("tor_circuit_rotation_factor", Configuration.tor_circuit_rotation_factor,
+                                                                      StringFormat.float)
+        Configuration.request_hedging = cls._get_settings("request_hedging", Configuration.request_hedging, StringFormat.boolean)
+        Configuration.request_hedging_percentile = cls._get_settings("request_hedging_percentile", Configuration.request_hedging_percentile,
+                                                                     StringFormat.float)
+        Configuration.request_hedging_max_rate = cls._get_settings("request_hedging_max_rate", Configuration.request_hedging_max_rate,
+                                                                   StringFormat.float)
+        Configuration.history_capacity = cls._get_settings("history_capacity", Configuration.history_capacity, StringFormat.int)
+        Configuration.drift_alpha = cls._get_settings("drift_alpha", Configuration.drift_alpha, StringFormat.float)
+        Configuration.drift_threshold = cls._get_settings("drift_threshold", Configuration.drift_threshold, StringFormat.float)
+        Configuration.drift_warmup = cls._get_settings("drift_warmup", Configuration.drift_warmup, StringFormat.int)
+        Configuration.database_batch_size = cls._get_settings("database_batch_size", Configuration.database_batch_size, StringFormat.int)
+        Configuration.database_flush_interval = cls._get_settings("database_flush_interval", Configuration.database_flush_interval,
+                                                                  StringFormat.float)
+        Configuration.database_change_only = cls._get_settings("database_change_only", Configuration.database_change_only, StringFormat.boolean)
+        Configuration.database_heartbeat_interval = cls._get_settings("database_heartbeat_interval", Configuration.database_heartbeat_interval,
+                                                                      StringFormat.float)
+        Configuration.retention_raw_days = cls._get_settings("retention_raw_days", Configuration.retention_raw_days, StringFormat.float)
+        Configuration.retention_1m_days = cls._get_settings("retention_1m_days", Configuration.retention_1m_days, StringFormat.float)
+        Configuration.retention_1h_days = cls._get_settings("retention_1h_days", Configuration.retention_1h_days, StringFormat.float)
+        Configuration.retention_1d_days = cls._get_settings("retention_1d_days", Configuration.retention_1d_days, StringFormat.float)
+        Configuration.retention_interval = cls._get_settings("retention_interval", Configuration.retention_interval, StringFormat.int)
+        Configuration.retention_dry_run = cls._get_settings("retention_dry_run", Configuration.retention_dry_run, StringFormat.boolean)
+        Configuration.csv_flush_interval = cls._get_settings("csv_flush_interval", Configuration.csv_flush_interval, StringFormat.float)
+        Configuration.csv_fsync = cls._get_settings("csv_fsync", Configuration.csv_fsync, StringFormat.boolean)
+        Configuration.csv_rotation_size = cls._get_settings("csv_rotation_size", Configuration.csv_rotation_size, StringFormat.float)
+        Configuration.csv_rotation_daily = cls._get_settings("csv_rotation_daily", Configuration.csv_rotation_daily, StringFormat.boolean)
+        Configuration.csv_compression = cls._get_settings("csv_compression", Configuration.csv_compression, StringFormat.boolean)
+        Configuration.segment_store = cls._get_settings("segment_store", Configuration.segment_store, StringFormat.boolean)
+        Configuration.segment_capacity = cls._get_settings("segment_capacity", Configuration.segment_capacity, StringFormat.int)
         Configuration.price_nodes = cls._get_settings("price_nodes", Configuration.price_nodes)
         Configuration.monitored_markets = cls._get_settings("monitored_markets", Configuration.monitored_markets)
         Configuration.database = Database("db.sqlite")
@@ -85,7 +173,8 @@ class ConfigurationBuilder(object):
 
         value = cls._config[key.lower()]
 
-        if not value:
+        # Only a missing value falls back on the default; false and 0 are values of their own
+        if value is None or value == "":
             return default
 
         if not expected_format:
@@ -1,13 +1,109 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from contextlib import contextmanager
 
-from src.model.base_model import Base
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.library.schema_migration import migrate_schema
+# The models must be imported for their tables to be created
+from src.model.currency_model import CurrencyModel  # noqa: F401
+from src.model.exchange_rate_model import ExchangeRateModel  # noqa: F401
+from src.model.fee_rate_model import FeeRateModel  # noqa: F401
+from src.model.price_node_model import PriceNodeModel  # noqa: F401
+from src.model.rollup_model import DayRollupModel, HourRollupModel, MinuteRollupModel  # noqa: F401
 
 
 class Database(object):
+    """
+    The SQLite database, with an engine for writing and one for reading. SQLite allows a single writer at a time, so the writer
+    engine pools a single connection that the writing threads take turns on, rather than waiting on the lock of the database.
+    The reader engine pools read-only connections that map the database into memory; with WAL they read a consistent snapshot
+    while the writer writes, so the web API never contends with the ingest of the poll cycles.
+    Sessions are scoped to the thread that uses them.
+    """
+
+    # Applied to every connection; WAL lets the web API read while the storage writer writes, and with WAL a synchronous
+    # level of NORMAL only syncs at checkpoints while still never corrupting the database. Incremental vacuum can only be
+    # enabled before the database is switched to WAL and its tables are created, so it only applies to new databases
+    PRAGMAS = ("PRAGMA auto_vacuum=INCREMENTAL",
+               "PRAGMA journal_mode=WAL",
+               "PRAGMA synchronous=NORMAL",
+               "PRAGMA temp_store=MEMORY",
+               "PRAGMA cache_size=-16000",
+               "PRAGMA busy_timeout=5000")
+    READER_PRAGMAS = ("PRAGMA mmap_size=268435456",
+                      "PRAGMA query_only=ON")
 
-    def __init__(self, db_name):
+    def __init__(self, db_name, reader_pool_size=8, pool_timeout=30):
+        """
+        @param (str) db_name: The path of the database file, or :memory: for a database in memory.
+        @param (int) reader_pool_size: Maximum number of read-only connections.
+        @param (float) pool_timeout: Maximum time (in seconds) to wait for a connection of a pool.
+        """
         engine_url = 'sqlite:///{DB}'.format(DB=db_name)
-        self.engine = create_engine(engine_url)
-        Base.metadata.create_all(self.engine)
-        self.session = sessionmaker(bind=self.engine)()
+        if db_name == ":memory:":
+            # A single connection shared by all threads, as each connection to :memory: would be a database of its own
+            self.engine = create_engine(engine_url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+            self.reader_engine = self.engine
+        else:
+            self.engine = create_engine(engine_url, pool_size=1, max_overflow=0, pool_timeout=pool_timeout)
+            self.reader_engine = create_engine(engine_url, pool_size=reader_pool_size, max_overflow=0, pool_timeout=pool_timeout)
+            event.listen(self.reader_engine, "connect", self.__set_reader_pragmas)
+            event.listen(self.reader_engine, "begin", self.__begin)
+        event.listen(self.engine, "connect", self.__set_pragmas)
+        event.listen(self.engine, "begin", self.__begin)
+        migrate_schema(self.engine)
+        self.__sessions = scoped_session(sessionmaker(bind=self.engine))
+        self.__read_sessions = scoped_session(sessionmaker(bind=self.reader_engine))
+
+    @property
+    def session(self):
+        """The session of the calling thread, on the writer engine."""
+        return self.__sessions()
+
+    @property
+    def read_session(self):
+        """The read-only session of the calling thread, on the reader engine."""
+        return self.__read_sessions()
+
+    @contextmanager
+    def session_scope(self):
+        """
+        Provides the session of the calling thread for a unit of work, committing it on success and rolling it back on error;
+        the session is closed afterwards, returning its connection to the pool.
+        """
+        session = self.__sessions()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def remove_sessions(self):
+        """Closes and discards the sessions of the calling thread, e.g. when a thread or a web request ends."""
+        self.__sessions.remove()
+        self.__read_sessions.remove()
+
+    @classmethod
+    def __set_pragmas(cls, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in cls.PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+        # The driver would only begin transactions before DML statements, leaving the DDL of migrations outside of them
+        dbapi_connection.isolation_level = None
+
+    @classmethod
+    def __set_reader_pragmas(cls, dbapi_connection, connection_record):
+        cls.__set_pragmas(dbapi_connection, connection_record)
+        cursor = dbapi_connection.cursor()
+        for pragma in cls.READER_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @staticmethod
+    def __begin(connection):
+        connection.exec_driver_sql("BEGIN")
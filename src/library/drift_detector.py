@@ -0,0 +1,160 @@
+import logging
+import os
+import warnings
+
+import numpy
+
+log = logging.getLogger(__name__)
+
+
+class DriftDetector(object):
+    """
+    Detects nodes whose prices drift, using rolling statistics per (node, column) that are updated in O(1) per poll cycle:
+    an exponentially weighted mean and variance, a streaming median estimate, and the weighted average deviation from the
+    cross-node consensus (the median of the nodes). The consensus itself is tracked as an extra row, so that a jump of
+    the whole market is not mistaken for the drift of every node.
+    """
+
+    def __init__(self, addresses, columns, alpha=0.1, threshold=4.0, warmup=10, min_relative_std=0.001):
+        """
+        @param (list) addresses: The node address of each row of a snapshot.
+        @param (list) columns: The name of each column of a snapshot, e.g. btcTxFee or usdMarketPrice.
+        @param (float) alpha: Weight of the newest sample in the rolling statistics, between 0 and 1.
+        @param (float) threshold: Number of standard deviations from its rolling mean for a price to drift from its own history.
+        @param (int) warmup: Number of samples of a (node, column) before it may be flagged.
+        @param (float) min_relative_std: Lower bound of the standard deviation relative to the mean, so that a price that has
+                                         been constant is not flagged for the smallest change.
+        """
+        self.__addresses = list(addresses)
+        self.__columns = list(columns)
+        self.__alpha = alpha
+        self.__threshold = threshold
+        self.__warmup = warmup
+        self.__min_relative_std = min_relative_std
+        shape = (len(self.__addresses) + 1, len(self.__columns))
+        self.__count = numpy.zeros(shape, dtype=numpy.int64)
+        self.__mean = numpy.full(shape, numpy.nan)
+        self.__variance = numpy.zeros(shape)
+        self.__median = numpy.full(shape, numpy.nan)
+        self.__consensus_deviation = numpy.zeros(shape)
+
+    @property
+    def addresses(self):
+        return self.__addresses
+
+    @property
+    def columns(self):
+        return self.__columns
+
+    @property
+    def mean(self):
+        """Rolling mean of each node (and of the consensus, as the last row) and column."""
+        return self.__mean
+
+    @property
+    def std(self):
+        return numpy.sqrt(self.__variance)
+
+    @property
+    def median(self):
+        """Streaming estimate of the median of each node (and of the consensus, as the last row) and column."""
+        return self.__median
+
+    @property
+    def consensus_deviation(self):
+        """Rolling deviation of each node from the consensus, in percent."""
+        return self.__consensus_deviation[:-1]
+
+    def update(self, prices, max_consensus_deviations):
+        """
+        Adds the prices of a poll cycle to the statistics and returns the nodes that drift.
+        @param (numpy.ndarray) prices: The nodes × columns matrix of prices, NaN where missing.
+        @param (list) max_consensus_deviations: The maximum rolling deviation from the consensus of each column, in percent.
+        @return (list): A (address, column, reason) tuple for each drifting node and column.
+        """
+        prices = numpy.asarray(prices, dtype=numpy.float64).reshape(len(self.__addresses), len(self.__columns))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            consensus = numpy.nanmedian(prices, axis=0) if prices.size else numpy.full(len(self.__columns), numpy.nan)
+        samples = numpy.vstack([prices, consensus])
+        available = ~numpy.isnan(samples)
+        warmed_up = available & (self.__count >= self.__warmup)
+        # The deviation from a consensus of zero (e.g. a fee of 0 reported by most nodes) is undefined, so it is left out
+        deviation_available = available[:-1] & numpy.isfinite(consensus) & (consensus != 0)
+
+        # The z-score is taken before the sample is added, so a jump is compared with the history that preceded it
+        previous_mean = self.__mean.copy()
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            std = numpy.maximum(numpy.sqrt(self.__variance), numpy.abs(self.__mean) * self.__min_relative_std)
+            z_scores = numpy.where(warmed_up, (samples - self.__mean) / std, 0)
+            deviations = numpy.where(deviation_available, (prices - consensus) / consensus * 100, 0)
+        history_drift = warmed_up[:-1] & (numpy.abs(z_scores[:-1]) > self.__threshold) & (numpy.abs(z_scores[-1]) <= self.__threshold)
+
+        self.__update_statistics(samples, available)
+        self.__consensus_deviation[:-1] = numpy.where(deviation_available, self.__consensus_deviation[:-1] + self.__alpha *
+                                                      (deviations - self.__consensus_deviation[:-1]),
+                                                      self.__consensus_deviation[:-1])
+        consensus_drift = warmed_up[:-1] & (numpy.abs(self.__consensus_deviation[:-1]) >
+                                            numpy.asarray(max_consensus_deviations, dtype=numpy.float64))
+
+        drifts = []
+        for row, column in zip(*numpy.nonzero(history_drift)):
+            drifts.append((self.__addresses[row], self.__columns[column],
+                           "{:.4f} is {:.1f} standard deviations from its rolling mean {:.4f}".format(
+                               prices[row, column], z_scores[row, column], previous_mean[row, column])))
+        for row, column in zip(*numpy.nonzero(consensus_drift)):
+            drifts.append((self.__addresses[row], self.__columns[column],
+                           "deviates from the consensus by {:.2f}% on average".format(self.__consensus_deviation[row, column])))
+        return drifts
+
+    def __update_statistics(self, samples, available):
+        first = available & (self.__count == 0)
+        self.__mean[first] = samples[first]
+        self.__median[first] = samples[first]
+        following = available & ~first
+        difference = numpy.where(following, samples - self.__mean, 0)
+        increment = self.__alpha * difference
+        self.__mean = numpy.where(following, self.__mean + increment, self.__mean)
+        self.__variance = numpy.where(following, (1 - self.__alpha) * (self.__variance + difference * increment), self.__variance)
+        # The median estimate moves towards each sample by a step proportional to the spread, so it converges without keeping samples
+        step = self.__alpha * numpy.maximum(numpy.sqrt(self.__variance), numpy.abs(self.__median) * self.__min_relative_std)
+        self.__median = numpy.where(following, self.__median + step * numpy.sign(numpy.nan_to_num(samples - self.__median)), self.__median)
+        self.__count += available
+
+    def save(self, file_path):
+        """Saves the statistics to a file, atomically replacing it."""
+        temporary_file_path = file_path + ".tmp"
+        with open(temporary_file_path, "wb") as file_stream:
+            numpy.savez(file_stream, addresses=numpy.asarray(self.__addresses + [""], dtype=str),
+                        columns=numpy.asarray(self.__columns, dtype=str), count=self.__count, mean=self.__mean, variance=self.__variance,
+                        median=self.__median, consensus_deviation=self.__consensus_deviation)
+        os.replace(temporary_file_path, file_path)
+
+    def load(self, file_path):
+        """
+        Restores the statistics saved to a file; statistics of nodes or columns that are no longer monitored are dropped,
+        and new ones start empty.
+        @return (bool): Whether the file existed and was loaded.
+        """
+        if not os.path.isfile(file_path):
+            return False
+        try:
+            with numpy.load(file_path) as state:
+                saved_rows = dict((str(x), index) for index, x in enumerate(state['addresses']))
+                saved_columns = dict((str(x), index) for index, x in enumerate(state['columns']))
+                rows = [(row, saved_rows[x]) for row, x in enumerate(self.__addresses + [""]) if x in saved_rows]
+                columns = [(column, saved_columns[x]) for column, x in enumerate(self.__columns) if x in saved_columns]
+                if not rows or not columns:
+                    return True
+                target = numpy.ix_([x for x, _ in rows], [x for x, _ in columns])
+                source = numpy.ix_([x for _, x in rows], [x for _, x in columns])
+                for key, array in (("count", self.__count), ("mean", self.__mean), ("variance", self.__variance),
+                                   ("median", self.__median), ("consensus_deviation", self.__consensus_deviation)):
+                    array[target] = state[key][source]
+        except (OSError, ValueError, KeyError) as e:
+            log.error("Failed to load drift statistics from {}: {}".format(file_path, e))
+            return False
+        return True
+
+    def __repr__(self):
+        return "<DriftDetector of {} nodes × {} columns>".format(len(self.__addresses), len(self.__columns))
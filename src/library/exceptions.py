@@ -6,3 +6,13 @@ class ConfigurationError(Exception):
 class ParseException(Exception):
     """Raised when an error is encountered while parsing data."""
     pass
+
+
+class PollDeadlineExceeded(Exception):
+    """Raised when a request did not complete within the time budget of a poll cycle."""
+    pass
+
+
+class CircuitBreakerOpen(Exception):
+    """Raised when a request is skipped because the circuit breaker of the node is not closed."""
+    pass
@@ -0,0 +1,172 @@
+import csv
+import gzip
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+
+class HistorySegment(object):
+    """The active segment of a history file: its open file, the header it was written with and the day of its first row."""
+
+    __slots__ = ("file", "writer", "header", "day", "size")
+
+    def __init__(self, file, header, day, size):
+        self.file = file
+        self.writer = csv.writer(file)
+        self.header = header
+        self.day = day
+        self.size = size
+
+
+class HistorySink(object):
+    """
+    Appends the rows of the poll cycles to CSV history files that are kept open, buffering them and flushing (and optionally
+    syncing) them to disk periodically rather than on every row. Each file is rotated when its day ends, when it exceeds a size,
+    or when its header changes (e.g. when the set of nodes changes), so every segment starts with the header of its rows.
+    Rotated segments are renamed after their day, and optionally compressed; the active segment keeps the name of the file.
+    """
+
+    BUFFER_SIZE = 64 * 1024
+    # Format of the timestamp in the first column of the rows
+    TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S UTC"
+
+    def __init__(self, directory, flush_interval=60, fsync=False, max_bytes=64 * 2 ** 20, rotate_daily=True, compress=False):
+        """
+        @param (str) directory: The directory of the history files.
+        @param (float) flush_interval: Maximum time (in seconds) that rows stay buffered before being flushed to the files.
+        @param (bool) fsync: Whether to sync the files to disk when flushing them, so that no flushed row is lost on power failure.
+        @param (int) max_bytes: Size (in bytes) above which a file is rotated; not rotated by size if None.
+        @param (bool) rotate_daily: Whether to rotate a file when the (UTC) day of its rows changes.
+        @param (bool) compress: Whether to compress the rotated segments with gzip.
+        """
+        self.__directory = directory
+        self.__flush_interval = flush_interval
+        self.__fsync = fsync
+        self.__max_bytes = max_bytes
+        self.__rotate_daily = rotate_daily
+        self.__compress = compress
+        self.__segments = {}
+        self.__lock = threading.Lock()
+        self.__last_flush = time.monotonic()
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    def write(self, filename, timestamp, header, row):
+        """
+        Appends a row to a history file, rotating it first if needed.
+        @param (str) filename: The name of the file, in the directory of the sink.
+        @param (float) timestamp: Time of the row, in seconds since the epoch; it decides the day of the row.
+        @param (list) header: The header of the file, i.e. the name of each value of the row.
+        @param (list) row: The values of the row.
+        """
+        day = datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d')
+        with self.__lock:
+            segment = self.__segments.get(filename, None)
+            if segment is None:
+                segment = self.__segments[filename] = self.__open(filename, header, day)
+            elif segment.header != header or (self.__rotate_daily and segment.day != day) or \
+                    (self.__max_bytes is not None and segment.size >= self.__max_bytes):
+                self.__rotate(filename, segment)
+                segment = self.__segments[filename] = self.__open(filename, header, day)
+            # The size of the file is tracked from the length of the row, as the buffered file cannot tell it before flushing
+            segment.size += segment.writer.writerow(row)
+        if time.monotonic() - self.__last_flush >= self.__flush_interval:
+            self.flush()
+
+    def replace(self, filename, header, rows):
+        """
+        Replaces a file with the given rows atomically, so that readers see either the former or the new content, never a part.
+        @param (str) filename: The name of the file, in the directory of the sink.
+        @param (list) header: The header of the file.
+        @param (list) rows: The rows of the file.
+        """
+        file_path = os.path.join(self.__directory, filename)
+        temporary_file_path = file_path + ".tmp"
+        with open(temporary_file_path, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(header)
+            writer.writerows(rows)
+            csv_file.flush()
+            if self.__fsync:
+                os.fsync(csv_file.fileno())
+        os.replace(temporary_file_path, file_path)
+
+    def flush(self):
+        """Flushes the buffered rows to the files, syncing them to disk if so configured."""
+        with self.__lock:
+            for segment in self.__segments.values():
+                self.__flush_segment(segment)
+            self.__last_flush = time.monotonic()
+
+    def close(self):
+        """Flushes and closes the files; they are reopened by the next write."""
+        with self.__lock:
+            for segment in self.__segments.values():
+                self.__flush_segment(segment)
+                segment.file.close()
+            self.__segments.clear()
+
+    def __flush_segment(self, segment):
+        segment.file.flush()
+        if self.__fsync:
+            os.fsync(segment.file.fileno())
+
+    def __open(self, filename, header, day):
+        """Opens the active segment of a file, rotating the existing one first if its header or its day differs."""
+        file_path = os.path.join(self.__directory, filename)
+        if os.path.isfile(file_path):
+            with open(file_path, "r", newline="") as csv_file:
+                reader = csv.reader(csv_file)
+                existing_header = next(reader, None)
+                first_row = next(reader, None)
+            existing_day = self.__get_day(file_path, first_row)
+            size = os.path.getsize(file_path)
+            if existing_header == [str(x) for x in header] and not (self.__rotate_daily and existing_day != day) and \
+                    (self.__max_bytes is None or size < self.__max_bytes):
+                return HistorySegment(open(file_path, "a", newline="", buffering=self.BUFFER_SIZE), header, day, size)
+            self.__archive(filename, existing_day)
+        segment = HistorySegment(open(file_path, "w", newline="", buffering=self.BUFFER_SIZE), header, day, 0)
+        segment.size += segment.writer.writerow(header)
+        return segment
+
+    def __get_day(self, file_path, first_row):
+        """
+        Returns the day of the rows of an existing file, from the timestamp of its first row; from the time it was last
+        modified if it has no row or its first column is not a timestamp.
+        """
+        if first_row:
+            try:
+                return datetime.strptime(first_row[0], self.TIMESTAMP_FORMAT).strftime('%Y-%m-%d')
+            except ValueError:
+                pass
+        return datetime.utcfromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d')
+
+    def __rotate(self, filename, segment):
+        self.__flush_segment(segment)
+        segment.file.close()
+        self.__archive(filename, segment.day)
+
+    def __archive(self, filename, day):
+        """Renames the active segment of a file after its day, with a sequence number if the day has several segments."""
+        file_path = os.path.join(self.__directory, filename)
+        stem, extension = os.path.splitext(file_path)
+        sequence = 0
+        while True:
+            archive_path = "{}.{}{}{}".format(stem, day, "" if sequence == 0 else ".{}".format(sequence), extension)
+            if not os.path.exists(archive_path) and not os.path.exists(archive_path + ".gz"):
+                break
+            sequence += 1
+        os.replace(file_path, archive_path)
+        if self.__compress:
+            with open(archive_path, "rb") as source, gzip.open(archive_path + ".gz", "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.remove(archive_path)
+            archive_path += ".gz"
+        log.debug("Rotated {} to {}".format(filename, os.path.basename(archive_path)))
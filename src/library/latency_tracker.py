@@ -0,0 +1,40 @@
+import math
+import threading
+from collections import deque
+
+
+class LatencyTracker(object):
+    """Keeps the most recent request latencies and provides percentiles over them."""
+
+    def __init__(self, window=20):
+        self.__lock = threading.Lock()
+        self.__samples = deque(maxlen=window)
+
+    @property
+    def sample_count(self):
+        return len(self.__samples)
+
+    @property
+    def median(self):
+        return self.percentile(50)
+
+    def record(self, seconds):
+        with self.__lock:
+            self.__samples.append(seconds)
+
+    def percentile(self, percent):
+        """
+        Returns the given percentile of the recorded latencies, using the nearest-rank method.
+        @param (float) percent: The percentile, between 0 and 100.
+        @return (float): The latency in seconds, or None if nothing was recorded yet.
+        """
+        with self.__lock:
+            samples = sorted(self.__samples)
+        if not samples:
+            return None
+        rank = max(1, math.ceil(percent / 100.0 * len(samples)))
+        return samples[min(rank, len(samples)) - 1]
+
+    def clear(self):
+        with self.__lock:
+            self.__samples.clear()
@@ -0,0 +1,121 @@
+import warnings
+
+import numpy
+
+
+class PriceAnalysis(object):
+    """
+    Analyzes the prices reported by the nodes in a poll cycle as a single nodes × columns matrix (e.g. the BTC transaction fee
+    and each monitored market), where prices that are missing, because a node was offline or timed out, are NaN.
+    """
+
+    CONSENSUS_STATISTICS = ("median", "trimmedMean", "spread", "nodes")
+    TRIM_PROPORTION = 0.2
+
+    def __init__(self, addresses, columns, prices):
+        """
+        @param (list) addresses: The node address of each row.
+        @param (list) columns: The name of each column, e.g. btcTxFee or usdMarketPrice.
+        @param (numpy.ndarray) prices: The nodes × columns matrix of prices, NaN where missing.
+        """
+        self.__addresses = list(addresses)
+        self.__columns = list(columns)
+        self.__prices = numpy.asarray(prices, dtype=numpy.float64).reshape(len(self.__addresses), len(self.__columns))
+        if self.__prices.size:
+            with warnings.catch_warnings():
+                # Columns without any price yield NaN statistics, which is what they are meant to be
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                self.__minimum = numpy.nanmin(self.__prices, axis=0)
+                self.__maximum = numpy.nanmax(self.__prices, axis=0)
+                self.__median = numpy.nanmedian(self.__prices, axis=0)
+        else:
+            self.__minimum = self.__maximum = self.__median = numpy.full(len(self.__columns), numpy.nan)
+        self.__available = numpy.count_nonzero(~numpy.isnan(self.__prices), axis=0)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            self.__deviation = numpy.where(self.__minimum > 0, (self.__maximum - self.__minimum) / self.__minimum * 100, numpy.nan)
+            self.__trimmed_mean = self.__get_trimmed_mean()
+
+    def __get_trimmed_mean(self):
+        """Returns the mean of each column without its lowest and highest TRIM_PROPORTION of the available prices."""
+        # NaN are sorted last, so the available prices of a column are its first rows
+        sorted_prices = numpy.sort(self.__prices, axis=0)
+        trimmed = numpy.floor(self.__available * self.TRIM_PROPORTION).astype(numpy.int64)
+        ranks = numpy.arange(self.__prices.shape[0])[:, numpy.newaxis]
+        kept = (ranks >= trimmed) & (ranks < self.__available - trimmed)
+        return numpy.where(kept, sorted_prices, 0).sum(axis=0) / kept.sum(axis=0)
+
+    @classmethod
+    def from_price_data(cls, price_data, columns):
+        """
+        Creates the analysis of the price data of a poll cycle.
+        @param (list) price_data: The price data entry of each node, as created by the PriceNodeMonitor.
+        @param (list) columns: The keys of the entries to analyze, whose values are FeeRate or ExchangeRate objects.
+        @return (PriceAnalysis): The analysis.
+        """
+        prices = numpy.fromiter((x[column].price if x.get(column, None) and column not in x['timedOut'] else numpy.nan
+                                 for x in price_data for column in columns),
+                                dtype=numpy.float64, count=len(price_data) * len(columns))
+        return cls([x['nodeAddress'] for x in price_data], columns, prices)
+
+    @property
+    def addresses(self):
+        return self.__addresses
+
+    @property
+    def columns(self):
+        return self.__columns
+
+    @property
+    def prices(self):
+        return self.__prices
+
+    @property
+    def minimum(self):
+        return self.__minimum
+
+    @property
+    def maximum(self):
+        return self.__maximum
+
+    @property
+    def median(self):
+        return self.__median
+
+    @property
+    def available(self):
+        """Number of nodes that reported a price, per column."""
+        return self.__available
+
+    @property
+    def deviation(self):
+        """Percentage by which the highest price exceeds the lowest, per column; NaN if no price is available."""
+        return self.__deviation
+
+    @property
+    def trimmed_mean(self):
+        return self.__trimmed_mean
+
+    @property
+    def spread(self):
+        """Difference between the highest and the lowest price, per column."""
+        return self.__maximum - self.__minimum
+
+    @property
+    def consensus(self):
+        """The CONSENSUS_STATISTICS × columns matrix of the median, trimmed mean, spread and number of reporting nodes."""
+        return numpy.vstack([self.__median, self.__trimmed_mean, self.spread, self.__available])
+
+    def get_column(self, column):
+        return self.__prices[:, self.__columns.index(column)]
+
+    def get_deviating_columns(self, max_deviation_percentages):
+        """
+        Returns the columns whose prices deviate between the nodes by more than allowed.
+        @param (list) max_deviation_percentages: The maximum deviation of each column, in percent.
+        @return (list): The indexes of the deviating columns.
+        """
+        with numpy.errstate(invalid="ignore"):
+            return numpy.flatnonzero(self.__deviation > numpy.asarray(max_deviation_percentages, dtype=numpy.float64)).tolist()
+
+    def __repr__(self):
+        return "<PriceAnalysis of {} nodes × {} columns>".format(len(self.__addresses), len(self.__columns))
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from src.library.latency_tracker import LatencyTracker
+from src.library.tor_session import parse_json, parse_text
+
+log = logging.getLogger(__name__)
+
+
+class RequestHedger(object):
+    """
+    Decides when a request to a node is hedged, i.e. duplicated over another circuit once it is slower than the node's
+    usual latency, and keeps the statistics of the hedged requests.
+    """
+
+    def __init__(self, percentile=90, max_hedge_rate=0.1, min_samples=10, max_workers=32):
+        """
+        @param (float) percentile: Percentile of the node's latencies after which a request is hedged.
+        @param (float) max_hedge_rate: Maximum fraction of the requests that may be hedged.
+        @param (int) min_samples: Number of latencies to observe for a node before its requests are hedged.
+        @param (int) max_workers: Maximum number of threads running hedged requests of blocking sessions.
+        """
+        self.__percentile = percentile
+        self.__max_hedge_rate = max_hedge_rate
+        self.__min_samples = min_samples
+        self.__lock = threading.Lock()
+        self.__latencies = {}
+        self.__statistics = {"requests": 0, "hedged": 0, "hedge_wins": 0, "hedge_losses": 0, "capped": 0}
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="HedgedRequest")
+
+    @property
+    def percentile(self):
+        return self.__percentile
+
+    @property
+    def max_hedge_rate(self):
+        return self.__max_hedge_rate
+
+    @property
+    def executor(self):
+        return self.__executor
+
+    @property
+    def statistics(self):
+        """Number of requests, of hedged requests, of hedges answering first or last, and of hedges skipped by the rate cap."""
+        with self.__lock:
+            return dict(self.__statistics)
+
+    def get_latency(self, host):
+        with self.__lock:
+            if host not in self.__latencies:
+                self.__latencies[host] = LatencyTracker(window=50)
+            return self.__latencies[host]
+
+    def get_hedge_delay(self, host):
+        """
+        Returns the time after which a request to the host is hedged.
+        @param (str) host: The node address.
+        @return (float): The delay in seconds, or None if not enough latencies of the host were observed yet.
+        """
+        with self.__lock:
+            self.__statistics["requests"] += 1
+        latency = self.get_latency(host)
+        if latency.sample_count < self.__min_samples:
+            return None
+        return latency.percentile(self.__percentile)
+
+    def acquire_hedge(self):
+        """Returns whether a slow request may be hedged, counting it as hedged if so."""
+        with self.__lock:
+            if self.__statistics["hedged"] + 1 > self.__statistics["requests"] * self.__max_hedge_rate:
+                self.__statistics["capped"] += 1
+                return False
+            self.__statistics["hedged"] += 1
+            return True
+
+    def record_outcome(self, hedge_won):
+        with self.__lock:
+            self.__statistics["hedge_wins" if hedge_won else "hedge_losses"] += 1
+
+    def reset_statistics(self):
+        with self.__lock:
+            for key in self.__statistics:
+                self.__statistics[key] = 0
+
+
+class HedgedTorSession(object):
+    """
+    Wraps a TorSession, duplicating a request over a second session (another circuit) when it takes longer than the hedge delay,
+    and returning whichever response arrives first.
+    """
+
+    def __init__(self, tor_session, hedge_session, request_hedger):
+        self.__tor_session = tor_session
+        self.__hedge_session = hedge_session
+        self.__request_hedger = request_hedger
+
+    @property
+    def tor_session(self):
+        return self.__tor_session
+
+    @property
+    def hedge_session(self):
+        return self.__hedge_session
+
+    def get_text_data(self, url):
+        return self.get_parsed_data(url, parse_text)
+
+    def get_json_data(self, url):
+        return self.get_parsed_data(url, parse_json)
+
+    def get_parsed_data(self, url, parse):
+        # Responses served by the cache are neither hedged nor counted as latencies of the node
+        cached_response = self.__tor_session.response_cache.get_fresh(url)
+        if cached_response is not None:
+            return cached_response.get_parsed_data(parse)
+        host = urlsplit(url).hostname
+        hedge_delay = self.__request_hedger.get_hedge_delay(host)
+        if hedge_delay is None:
+            return self.__get_timed_parsed_data(self.__tor_session, url, parse, host)
+        executor = self.__request_hedger.executor
+        requests = [executor.submit(self.__get_timed_parsed_data, self.__tor_session, url, parse, host)]
+        done, _ = wait(requests, timeout=hedge_delay)
+        if done or not self.__request_hedger.acquire_hedge():
+            return requests[0].result()
+        log.debug("Hedging request of {} after {:.2f}s".format(url, hedge_delay))
+        requests.append(executor.submit(self.__get_timed_parsed_data, self.__hedge_session, url, parse, host))
+        pending = set(requests)
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # A failed request only counts if the other one fails as well
+            succeeded = [x for x in done if x.exception() is None]
+            if succeeded or not pending:
+                winner = succeeded[0] if succeeded else done.pop()
+                break
+        # A request that is already running cannot be interrupted; its response still refreshes the cache
+        for request in pending:
+            request.cancel()
+        self.__request_hedger.record_outcome(winner is requests[1])
+        return winner.result()
+
+    def __get_timed_parsed_data(self, tor_session, url, parse, host):
+        request_start = time.monotonic()
+        data = tor_session.get_parsed_data(url, parse)
+        self.__request_hedger.get_latency(host).record(time.monotonic() - request_start)
+        return data
+
+
+class AsyncHedgedTorSession(object):
+    """Same as HedgedTorSession for an AsyncTorSession, where the losing request is actually cancelled."""
+
+    def __init__(self, async_tor_session, hedge_session, request_hedger):
+        self.__tor_session = async_tor_session
+        self.__hedge_session = hedge_session
+        self.__request_hedger = request_hedger
+
+    @property
+    def tor_session(self):
+        return self.__tor_session
+
+    @property
+    def hedge_session(self):
+        return self.__hedge_session
+
+    async def get_text_data(self, url):
+        return await self.get_parsed_data(url, parse_text)
+
+    async def get_json_data(self, url):
+        return await self.get_parsed_data(url, parse_json)
+
+    async def get_parsed_data(self, url, parse):
+        cached_response = self.__tor_session.response_cache.get_fresh(url)
+        if cached_response is not None:
+            return cached_response.get_parsed_data(parse)
+        host = urlsplit(url).hostname
+        hedge_delay = self.__request_hedger.get_hedge_delay(host)
+        if hedge_delay is None:
+            return await self.__get_timed_parsed_data(self.__tor_session, url, parse, host)
+        requests = [asyncio.ensure_future(self.__get_timed_parsed_data(self.__tor_session, url, parse, host))]
+        pending = set(requests)
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+            if done or not self.__request_hedger.acquire_hedge():
+                return await requests[0]
+            log.debug("Hedging request of {} after {:.2f}s".format(url, hedge_delay))
+            requests.append(asyncio.ensure_future(self.__get_timed_parsed_data(self.__hedge_session, url, parse, host)))
+            pending = set(requests)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [x for x in done if x.exception() is None]
+                if succeeded or not pending:
+                    winner = succeeded[0] if succeeded else done.pop()
+                    break
+            self.__request_hedger.record_outcome(winner is requests[1])
+            return winner.result()
+        finally:
+            for request in pending:
+                request.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def __get_timed_parsed_data(self, async_tor_session, url, parse, host):
+        request_start = time.monotonic()
+        data = await async_tor_session.get_parsed_data(url, parse)
+        self.__request_hedger.get_latency(host).record(time.monotonic() - request_start)
+        return data
@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class ResponseCache(object):
+    """
+    Caches the last response of each URL, so that repeated requests can be avoided or made conditional,
+    and unchanged responses are not parsed again.
+    """
+
+    MAX_AGE_PATTERN = re.compile(r"max-age\s*=\s*(\d+)")
+
+    def __init__(self, window=0, clock=time.monotonic):
+        """
+        @param (float) window: Seconds during which a response is reused without any request, e.g. for requests of the same poll cycle.
+        @param (callable) clock: Returns the current time in seconds.
+        """
+        self.__window = window or 0
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__entries = {}
+        self.__statistics = {"fresh": 0, "not_modified": 0, "unchanged": 0, "changed": 0}
+
+    @property
+    def window(self):
+        return self.__window
+
+    @property
+    def statistics(self):
+        """Number of responses served without a request, revalidated with a 304, received with an unchanged body and received changed."""
+        return dict(self.__statistics)
+
+    def get_fresh(self, url):
+        """Returns the cached response of the URL if it may be reused without a request, otherwise None."""
+        with self.__lock:
+            entry = self.__entries.get(url, None)
+            if entry is None or entry.expires_at < self.__clock():
+                return None
+            self.__statistics["fresh"] += 1
+            return entry
+
+    def get_request_headers(self, url):
+        """Returns the headers to make the request of the URL conditional on the cached response."""
+        headers = {}
+        with self.__lock:
+            entry = self.__entries.get(url, None)
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def store(self, url, status_code, headers, content):
+        """
+        Stores a response of the URL and returns the cache entry to read it from.
+        A 304 response or a body identical to the cached one keeps the cached entry, including what was already parsed from it.
+        """
+        now = self.__clock()
+        cache_control = (headers.get("cache-control", None) or "").lower()
+        if "no-store" in cache_control:
+            max_age = None
+        else:
+            match = self.MAX_AGE_PATTERN.search(cache_control)
+            max_age = max(self.__window, int(match.group(1)) if match and "no-cache" not in cache_control else 0)
+        with self.__lock:
+            entry = self.__entries.get(url, None)
+            if status_code == 304 and entry is not None:
+                self.__statistics["not_modified"] += 1
+            else:
+                content_hash = hashlib.sha1(content).digest()
+                if entry is not None and entry.content_hash == content_hash:
+                    self.__statistics["unchanged"] += 1
+                else:
+                    self.__statistics["changed"] += 1
+                    entry = CachedResponse(content, content_hash)
+                entry.etag = headers.get("etag", None)
+                entry.last_modified = headers.get("last-modified", None)
+            entry.expires_at = now + max_age if max_age is not None else now
+            if max_age is None:
+                self.__entries.pop(url, None)
+            else:
+                self.__entries[url] = entry
+        return entry
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+
+class CachedResponse(object):
+    """Represents the cached body of a response along with the data parsed from it."""
+
+    def __init__(self, content, content_hash):
+        self.content = content
+        self.content_hash = content_hash
+        self.etag = None
+        self.last_modified = None
+        self.expires_at = 0
+        self.__lock = threading.Lock()
+        self.__parsed_data = {}
+
+    def get_parsed_data(self, parse):
+        """Returns the data parsed from the body by the given function, parsing it only the first time."""
+        with self.__lock:
+            if parse not in self.__parsed_data:
+                self.__parsed_data[parse] = parse(self.content)
+            return self.__parsed_data[parse]
@@ -0,0 +1,180 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from src.model.exchange_rate_model import ExchangeRateModel
+from src.model.fee_rate_model import FeeRateModel
+from src.model.rollup_model import DayRollupModel, HourRollupModel, MinuteRollupModel
+
+log = logging.getLogger(__name__)
+
+# The tables pruned by the job, with the resolution whose retention applies to them and the column of their time
+TARGETS = ((ExchangeRateModel.__tablename__, "raw", "timestamp"),
+           (FeeRateModel.__tablename__, "raw", "timestamp"),
+           (MinuteRollupModel.__tablename__, "1m", "bucket"),
+           (HourRollupModel.__tablename__, "1h", "bucket"),
+           (DayRollupModel.__tablename__, "1d", "bucket"))
+
+RESOLUTIONS = ("raw", "1m", "1h", "1d")
+
+
+class RetentionJob(threading.Thread):
+    """
+    Periodically deletes the samples and rollups that are older than the retention of their resolution, from a background thread.
+    Samples and finer rollups are only deleted where the daily rollup of their node and currency exists, so that the history
+    remains available at a coarser resolution. Rows are deleted in small batches, each in a transaction of its own, so that the
+    storage writer is never locked out for long, and the freed pages are then returned to the file system by incremental vacuum.
+    """
+
+    def __init__(self, engine, retention_days, interval=3600, batch_size=5000, batch_pause=0.1, dry_run=False, reader_engine=None):
+        """
+        @param (sqlalchemy.engine.Engine) engine: The engine of the database.
+        @param (dict) retention_days: Number of days that each resolution (raw, 1m, 1h or 1d) is kept; kept forever if missing or None.
+        @param (float) interval: Time (in seconds) between the runs of the job.
+        @param (int) batch_size: Maximum number of rows deleted per transaction.
+        @param (float) batch_pause: Time (in seconds) to wait between two transactions, letting the storage writer in.
+        @param (bool) dry_run: Only report the number of rows and bytes that would be freed, without deleting anything.
+        @param (sqlalchemy.engine.Engine) reader_engine: The engine of the database used to count rows, so that the scans of the
+                                                         tables do not hold the connection of the writer; the engine if None.
+        """
+        super(RetentionJob, self).__init__(name="RetentionJob", daemon=True)
+        unknown = set(retention_days).difference(RESOLUTIONS)
+        if unknown:
+            raise ValueError("Unknown resolutions {}, expected {}".format(sorted(unknown), RESOLUTIONS))
+        self.__engine = engine
+        self.__reader_engine = engine if reader_engine is None else reader_engine
+        self.__retention_days = dict(retention_days)
+        self.__interval = interval
+        self.__batch_size = max(1, batch_size)
+        self.__batch_pause = batch_pause
+        self.__dry_run = dry_run
+        self.__stop_event = threading.Event()
+        self.__statistics = {"runs": 0, "deleted_rows": 0, "freed_bytes": 0, "last_run_seconds": 0}
+
+    @property
+    def retention_days(self):
+        return dict(self.__retention_days)
+
+    @property
+    def dry_run(self):
+        return self.__dry_run
+
+    @property
+    def statistics(self):
+        """Number of runs, of rows deleted and of bytes returned to the file system, and the duration of the last run."""
+        return dict(self.__statistics)
+
+    def stop(self):
+        """Stops the job, after the batch that is being deleted."""
+        self.__stop_event.set()
+
+    def run(self):
+        while not self.__stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                log.error("Failed to apply the retention of the database: {}".format(e))
+            self.__stop_event.wait(self.__interval)
+
+    def run_once(self, now=None):
+        """
+        Deletes the rows that are past their retention, or only counts them in a dry run.
+        @param (float) now: The current time, in seconds since the epoch.
+        @return (dict): The number of rows and the estimated number of bytes deleted (or that would be) of each table.
+        """
+        run_start = time.monotonic()
+        now = time.time() if now is None else now
+        row_sizes = self.__get_row_sizes()
+        report = {}
+        for table, resolution, column in TARGETS:
+            days = self.__retention_days.get(resolution, None)
+            if not days or self.__stop_event.is_set():
+                continue
+            condition = self.__get_condition(table, column)
+            parameters = {"cutoff": int(now - days * 86400)}
+            if self.__dry_run:
+                with self.__reader_engine.connect() as connection:
+                    rows = connection.execute(text("SELECT count(*) FROM {} WHERE {}".format(table, condition)), parameters).scalar()
+            else:
+                rows = self.__delete(table, condition, parameters)
+            row_size = row_sizes.get(table, None)
+            report[table] = {"rows": rows, "bytes": None if row_size is None else int(rows * row_size)}
+            if rows:
+                log.info("{} {} rows of {} older than {} days ({})".format("Would delete" if self.__dry_run else "Deleted", rows, table, days,
+                                                                           self.__format_bytes(report[table]["bytes"])))
+        if not self.__dry_run:
+            self.__statistics["deleted_rows"] += sum(x["rows"] for x in report.values())
+            if any(x["rows"] for x in report.values()):
+                self.__statistics["freed_bytes"] += self.__vacuum()
+        self.__statistics["runs"] += 1
+        self.__statistics["last_run_seconds"] = time.monotonic() - run_start
+        return report
+
+    @staticmethod
+    def __get_condition(table, column):
+        """Returns the condition of the rows of a table that are past the cutoff and covered by a daily rollup."""
+        condition = "{0}.{1} < :cutoff".format(table, column)
+        if table != DayRollupModel.__tablename__:
+            condition += " AND EXISTS (SELECT 1 FROM {2} WHERE {2}.currency_id = {0}.currency_id AND {2}.price_node_id = {0}.price_node_id " \
+                         "AND {2}.bucket = {0}.{1} - {0}.{1} % {3})".format(table, column, DayRollupModel.__tablename__,
+                                                                             DayRollupModel.RESOLUTION)
+        return condition
+
+    def __delete(self, table, condition, parameters):
+        # The rows are found in rowid order, which is about the order of their time, so every batch starts with the oldest rows
+        # and does not scan the rows that are kept
+        statement = text("DELETE FROM {0} WHERE rowid IN (SELECT rowid FROM {0} WHERE {1} LIMIT :limit)".format(table, condition))
+        deleted = 0
+        while not self.__stop_event.is_set():
+            with self.__engine.begin() as connection:
+                rows = connection.execute(statement, dict(parameters, limit=self.__batch_size)).rowcount
+            deleted += rows
+            if rows < self.__batch_size:
+                break
+            time.sleep(self.__batch_pause)
+        return deleted
+
+    def __vacuum(self):
+        """Returns the pages freed by the deletions to the file system, in small steps; returns the number of bytes returned."""
+        with self.__engine.connect() as connection:
+            if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+                log.info("The database was not created with incremental vacuum, so the freed space is reused but not returned")
+                return 0
+            page_size = connection.exec_driver_sql("PRAGMA page_size").scalar()
+            page_count = connection.exec_driver_sql("PRAGMA page_count").scalar()
+        freelist_count = 1
+        while freelist_count and not self.__stop_event.is_set():
+            raw_connection = self.__engine.raw_connection()
+            try:
+                # The pragma frees a page per step, while the execute of the sqlite3 module only steps a statement without
+                # result columns once; its executescript steps the statement to its end, in its own transaction
+                raw_connection.driver_connection.executescript("PRAGMA incremental_vacuum({})".format(self.__batch_size))
+                freelist_count = raw_connection.driver_connection.execute("PRAGMA freelist_count").fetchone()[0]
+            finally:
+                raw_connection.close()
+            time.sleep(self.__batch_pause)
+        with self.__engine.connect() as connection:
+            return (page_count - connection.exec_driver_sql("PRAGMA page_count").scalar()) * page_size
+
+    def __get_row_sizes(self):
+        """Returns the average number of bytes that a row of each table uses, including its indexes; empty if unknown."""
+        try:
+            with self.__reader_engine.connect() as connection:
+                sizes = dict(connection.exec_driver_sql("SELECT name, pgsize FROM dbstat WHERE aggregate = TRUE").all())
+                indexes = connection.exec_driver_sql("SELECT name, tbl_name FROM sqlite_schema WHERE type = 'index'").all()
+                row_sizes = {}
+                for table, _, _ in TARGETS:
+                    rows = connection.exec_driver_sql("SELECT count(*) FROM {}".format(table)).scalar()
+                    if rows:
+                        row_sizes[table] = float(sizes.get(table, 0) + sum(sizes.get(x, 0) for x, y in indexes if y == table)) / rows
+                return row_sizes
+        except OperationalError:
+            # SQLite was built without the dbstat table
+            return {}
+
+    @staticmethod
+    def __format_bytes(value):
+        return "size unknown" if value is None else "{:.1f} MiB".format(value / 2 ** 20)
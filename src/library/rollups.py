@@ -0,0 +1,204 @@
+import logging
+import math
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from src.model.currency_model import CurrencyModel
+from src.model.exchange_rate_model import ExchangeRateModel
+from src.model.fee_rate_model import FeeRateModel
+from src.model.price_node_model import PriceNodeModel
+from src.model.rollup_model import DayRollupModel, HourRollupModel, MinuteRollupModel
+
+log = logging.getLogger(__name__)
+
+# The rollup model of each resolution, finest first
+RESOLUTIONS = (("1m", MinuteRollupModel), ("1h", HourRollupModel), ("1d", DayRollupModel))
+
+REBUILD_CHUNK_SIZE = 100000
+
+
+def aggregate(samples, resolution):
+    """
+    Aggregates samples into the buckets of a resolution.
+    @param (iterable) samples: The (price node id, currency id, timestamp, price) of each sample, the price being None if the
+                               node did not report it.
+    @param (int) resolution: Length of a bucket, in seconds.
+    @return (list): The row of each (price node, currency, bucket), as a dict of the columns of a rollup table.
+    """
+    buckets = {}
+    for price_node_id, currency_id, timestamp, price in samples:
+        bucket = timestamp - timestamp % resolution
+        row = buckets.get((price_node_id, currency_id, bucket), None)
+        if row is None:
+            row = buckets[(price_node_id, currency_id, bucket)] = {
+                "price_node_id": price_node_id, "currency_id": currency_id, "bucket": bucket, "open": None, "high": None, "low": None,
+                "close": None, "mean": None, "count": 0, "cycles": 0, "open_timestamp": None, "close_timestamp": None}
+        row["cycles"] += 1
+        if price is None:
+            continue
+        if row["count"] == 0:
+            row.update(open=price, high=price, low=price, close=price, mean=price, open_timestamp=timestamp, close_timestamp=timestamp)
+        else:
+            if timestamp < row["open_timestamp"]:
+                row.update(open=price, open_timestamp=timestamp)
+            if timestamp >= row["close_timestamp"]:
+                row.update(close=price, close_timestamp=timestamp)
+            row["high"] = max(row["high"], price)
+            row["low"] = min(row["low"], price)
+            row["mean"] += (price - row["mean"]) / (row["count"] + 1)
+        row["count"] += 1
+    return list(buckets.values())
+
+
+def get_upsert(model):
+    """Returns the statement that adds aggregated rows to the rollup table of a model, merging them with the stored rows."""
+    table = model.__table__
+    statement = insert(table)
+    new = statement.excluded
+    total = table.c.count + new.count
+    return statement.on_conflict_do_update(index_elements=[table.c.currency_id, table.c.price_node_id, table.c.bucket], set_={
+        # An open or close without timestamp is missing, so the comparisons with NULL keep the stored one
+        "open": case((table.c.open_timestamp.is_(None) | (new.open_timestamp < table.c.open_timestamp), new.open), else_=table.c.open),
+        "open_timestamp": case((table.c.open_timestamp.is_(None) | (new.open_timestamp < table.c.open_timestamp), new.open_timestamp),
+                               else_=table.c.open_timestamp),
+        "close": case((table.c.close_timestamp.is_(None) | (new.close_timestamp >= table.c.close_timestamp), new.close),
+                      else_=table.c.close),
+        "close_timestamp": case((table.c.close_timestamp.is_(None) | (new.close_timestamp >= table.c.close_timestamp), new.close_timestamp),
+                                else_=table.c.close_timestamp),
+        # The scalar max and min of SQLite are NULL if any argument is
+        "high": func.max(func.coalesce(table.c.high, new.high), func.coalesce(new.high, table.c.high)),
+        "low": func.min(func.coalesce(table.c.low, new.low), func.coalesce(new.low, table.c.low)),
+        "mean": case((total > 0, (func.coalesce(table.c.mean, 0) * table.c.count + func.coalesce(new.mean, 0) * new.count) / total)),
+        "count": total,
+        "cycles": table.c.cycles + new.cycles})
+
+
+def update_rollups(connection, samples):
+    """
+    Adds samples to the rollups of every resolution; meant to be called in the transaction that stores the samples.
+    @param (sqlalchemy.engine.Connection) connection: A connection to the database.
+    @param (list) samples: The (price node id, currency id, timestamp, price) of each sample, the price being None if the
+                           node did not report it.
+    """
+    if not samples:
+        return
+    for _, model in RESOLUTIONS:
+        connection.execute(get_upsert(model), aggregate(samples, model.RESOLUTION))
+
+
+def get_uncovered_samples(connection, samples):
+    """
+    Returns the samples that the rollups do not cover yet, i.e. whose bucket is missing at the finest resolution that is still
+    kept at their timestamp, so that samples stored after the fact (e.g. imported from the CSV history) are not added to the
+    buckets that the live writer already aggregated them into.
+    @param (sqlalchemy.engine.Connection) connection: A connection to the database.
+    @param (list) samples: The (price node id, currency id, timestamp, price) of each sample.
+    @return (list): The samples that are not covered.
+    """
+    if not samples:
+        return []
+    currency_ids = set(x[1] for x in samples)
+    timestamps = [x[2] for x in samples]
+    resolutions = []
+    for _, model in RESOLUTIONS:
+        first_buckets = dict(((price_node_id, currency_id), bucket) for price_node_id, currency_id, bucket in connection.execute(
+            select(model.price_node_id, model.currency_id, func.min(model.bucket)).where(model.currency_id.in_(currency_ids))
+            .group_by(model.price_node_id, model.currency_id)))
+        buckets = set(tuple(x) for x in connection.execute(
+            select(model.price_node_id, model.currency_id, model.bucket).where(
+                model.currency_id.in_(currency_ids), model.bucket >= min(timestamps) - min(timestamps) % model.RESOLUTION,
+                model.bucket <= max(timestamps))))
+        resolutions.append((model.RESOLUTION, first_buckets, buckets))
+    uncovered = []
+    for sample in samples:
+        price_node_id, currency_id, timestamp, _ = sample
+        for resolution, first_buckets, buckets in resolutions:
+            bucket = timestamp - timestamp % resolution
+            first_bucket = first_buckets.get((price_node_id, currency_id), None)
+            # The finer resolutions are pruned first, so the first one that reaches back to the sample tells whether it is covered
+            if first_bucket is not None and first_bucket <= bucket:
+                if (price_node_id, currency_id, bucket) not in buckets:
+                    uncovered.append(sample)
+                break
+        else:
+            uncovered.append(sample)
+    return uncovered
+
+
+def rebuild_rollups(connection):
+    """
+    Recreates the rollups of every resolution from the stored exchange and fee rates, e.g. when the rollup tables are added
+    to an existing database. As only the prices that were reported are stored, the availability of the rebuilt buckets is 1.
+    @param (sqlalchemy.engine.Connection) connection: A connection to the database.
+    """
+    for _, model in RESOLUTIONS:
+        connection.execute(model.__table__.delete())
+    for rate_model in (ExchangeRateModel, FeeRateModel):
+        table = rate_model.__table__
+        result = connection.execution_options(yield_per=REBUILD_CHUNK_SIZE).execute(
+            select(table.c.price_node_id, table.c.currency_id, table.c.timestamp, table.c.price))
+        for samples in result.partitions():
+            update_rollups(connection, [tuple(x) for x in samples])
+
+
+class Rollups(object):
+    """Queries the rollups of the prices of a node and currency, at the resolution that suits the requested range."""
+
+    def __init__(self, engine):
+        """
+        @param (sqlalchemy.engine.Engine) engine: The engine of the database, preferably its read-only reader engine.
+        """
+        self.__engine = engine
+
+    @property
+    def resolutions(self):
+        return [name for name, _ in RESOLUTIONS]
+
+    def query(self, address, currency, start, end, max_points=500):
+        """
+        Returns the rollups of a node and currency over a time range, at the finest resolution that fits both the point budget
+        and the range, i.e. that has not been pruned after the start of the range; the coarsest that covers it otherwise.
+        @param (str) address: The address of the node.
+        @param (str) currency: The currency code, e.g. USD, or btc for the transaction fee.
+        @param (int) start: Start of the range, in seconds since the epoch.
+        @param (int) end: End of the range (excluded), in seconds since the epoch.
+        @param (int) max_points: Maximum number of buckets.
+        @return (dict): The resolution, and the bucket start, open, high, low, close, mean, count and availability of each bucket;
+                        the resolution is None if nothing is stored.
+        """
+        result = {"resolution": None, "timestamps": [], "open": [], "high": [], "low": [], "close": [], "mean": [], "count": [],
+                  "availability": []}
+        with self.__engine.connect() as connection:
+            price_node_id = connection.execute(select(PriceNodeModel.id).where(PriceNodeModel.address == address)).scalar()
+            currency_id = connection.execute(select(CurrencyModel.id).where(CurrencyModel.code == currency)).scalar()
+            if price_node_id is None or currency_id is None:
+                return result
+            model = self.__get_resolution(connection, price_node_id, currency_id, start, end, max_points)
+            if model is None:
+                return result
+            rows = connection.execute(select(model.bucket, model.open, model.high, model.low, model.close, model.mean, model.count,
+                                             model.cycles)
+                                      .where(model.currency_id == currency_id, model.price_node_id == price_node_id,
+                                             model.bucket >= start - start % model.RESOLUTION, model.bucket < end)
+                                      .order_by(model.bucket)).all()
+        result["resolution"] = next(name for name, x in RESOLUTIONS if x is model)
+        for index, key in enumerate(("timestamps", "open", "high", "low", "close", "mean", "count")):
+            result[key] = [x[index] for x in rows]
+        result["availability"] = [float(count) / cycles if cycles else None for *_, count, cycles in rows]
+        return result
+
+    @staticmethod
+    def __get_resolution(connection, price_node_id, currency_id, start, end, max_points):
+        first_buckets = [(model, connection.execute(select(func.min(model.bucket)).where(model.currency_id == currency_id,
+                                                                                          model.price_node_id == price_node_id)).scalar())
+                         for _, model in RESOLUTIONS]
+        covering = [model for model, first_bucket in first_buckets if first_bucket is not None and first_bucket <= start]
+        for model in covering:
+            if math.ceil(float(end - start) / model.RESOLUTION) <= max_points:
+                return model
+        if covering:
+            return covering[-1]
+        # No resolution reaches back to the start of the range, so the one that reaches back furthest is used
+        stored = [(first_bucket, -index, model) for index, (model, first_bucket) in enumerate(first_buckets) if first_bucket is not None]
+        return min(stored)[2] if stored else None
@@ -0,0 +1,109 @@
+import heapq
+import itertools
+import logging
+import math
+import random
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class PollScheduler(object):
+    """
+    Schedules polls on a fixed cadence that does not drift with the time spent polling.
+    Each scheduled key has its own next due time on the cadence grid; keys whose provider timestamp did not change
+    since their last poll are backed off to every 2nd, 4th, ... slot, up to max_backoff slots.
+    """
+
+    def __init__(self, poll_interval, jitter=0, max_backoff=1, clock=time.monotonic):
+        self.__poll_interval = poll_interval
+        self.__jitter = min(jitter, poll_interval / 2.0)
+        self.__max_backoff = max(1, max_backoff)
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__stop_event = threading.Event()
+        self.__queue = []
+        self.__sequence = itertools.count()
+        self.__due_times = {}
+        self.__backoffs = {}
+        self.__provider_timestamps = {}
+        self.__add_time = None
+
+    @property
+    def poll_interval(self):
+        return self.__poll_interval
+
+    @property
+    def is_stopped(self):
+        return self.__stop_event.is_set()
+
+    def get_backoff(self, key):
+        """Returns the number of cadence slots between two polls of the given key."""
+        return self.__backoffs.get(key, 1)
+
+    def add(self, key):
+        """
+        Schedules the given key to be polled right away. The keys added before the next due keys are returned share the time
+        of the first of them, so that they stay on the same cadence grid and are polled in the same cycles.
+        """
+        with self.__lock:
+            if self.__add_time is None:
+                self.__add_time = self.__clock()
+            self.__push(key, self.__add_time)
+
+    def reschedule(self, key, provider_timestamp=None):
+        """
+        Schedules the next poll of a key that has just been polled.
+        @param (object) key: The key returned by wait_for_due().
+        @param (object) provider_timestamp: Timestamp of the polled data, or None if unknown, which keeps the base cadence.
+        """
+        with self.__lock:
+            backoff = 1
+            if provider_timestamp is not None and provider_timestamp == self.__provider_timestamps.get(key):
+                backoff = min(self.__backoffs.get(key, 1) * 2, self.__max_backoff)
+            if backoff != self.__backoffs.get(key, 1):
+                log.debug("Polling {} every {} interval(s)".format(key, backoff))
+            self.__backoffs[key] = backoff
+            self.__provider_timestamps[key] = provider_timestamp
+            due_time = self.__due_times.get(key, self.__clock()) + backoff * self.__poll_interval
+            now = self.__clock()
+            if due_time <= now:
+                # Skip the slots missed while polling took longer than the interval, staying on the cadence grid
+                due_time += math.ceil((now - due_time) / self.__poll_interval) * self.__poll_interval
+            self.__push(key, due_time)
+
+    def wait_for_due(self):
+        """
+        Blocks until the earliest scheduled key is due, plus a random jitter.
+        @return (list): All keys that are due, or an empty list if the scheduler was stopped.
+        """
+        while not self.is_stopped:
+            with self.__lock:
+                next_due_time = self.__queue[0][0] if self.__queue else None
+            if next_due_time is None:
+                delay = self.__poll_interval
+            else:
+                delay = next_due_time - self.__clock()
+            if delay > 0:
+                if self.__stop_event.wait(delay + random.uniform(0, self.__jitter)):
+                    break
+                continue
+            with self.__lock:
+                due_keys = []
+                now = self.__clock()
+                while self.__queue and self.__queue[0][0] <= now:
+                    due_keys.append(heapq.heappop(self.__queue)[2])
+                if due_keys:
+                    self.__add_time = None
+            if due_keys:
+                return due_keys
+        return []
+
+    def stop(self):
+        """Stops the scheduler, waking up any thread blocked in wait_for_due()."""
+        self.__stop_event.set()
+
+    def __push(self, key, due_time):
+        self.__due_times[key] = due_time
+        heapq.heappush(self.__queue, (due_time, next(self.__sequence), key))
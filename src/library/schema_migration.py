@@ -0,0 +1,77 @@
+import logging
+
+from sqlalchemy import inspect
+
+from src.library.exceptions import ConfigurationError
+from src.library.rollups import rebuild_rollups
+from src.model.base_model import Base
+
+log = logging.getLogger(__name__)
+
+# Version of the schema, stored in the user_version of the database:
+# 1 - prices as strings, DateTime timestamps and node addresses as keys (databases created before versioning report 0)
+# 2 - numeric prices, integer epoch timestamps, interned node and currency ids, indexed by (currency, node, timestamp)
+# 3 - rollups of the prices at 1 minute, 1 hour and 1 day resolution
+SCHEMA_VERSION = 3
+
+LEGACY_TABLES = ("price_node", "exchange_rate", "fee_rate")
+
+MIGRATE_FROM_VERSION_1 = (
+    "INSERT OR IGNORE INTO price_node (address, operator) SELECT address, operator FROM price_node_v1 ORDER BY rowid",
+    "INSERT OR IGNORE INTO price_node (address) SELECT price_node_address FROM exchange_rate_v1 "
+    "UNION SELECT price_node_address FROM fee_rate_v1",
+    "INSERT OR IGNORE INTO currency (code) SELECT currency FROM exchange_rate_v1 UNION SELECT currency FROM fee_rate_v1",
+    "INSERT OR IGNORE INTO exchange_rate (price_node_id, currency_id, price, timestamp, provider_timestamp, provider) "
+    "SELECT price_node.id, currency.id, CAST(old.price AS REAL), CAST(strftime('%s', old.timestamp) AS INTEGER), NULL, old.provider "
+    "FROM exchange_rate_v1 AS old "
+    "JOIN price_node ON price_node.address = old.price_node_address JOIN currency ON currency.code = old.currency "
+    "ORDER BY old.id",
+    "INSERT OR IGNORE INTO fee_rate (price_node_id, currency_id, price, timestamp, provider_timestamp) "
+    "SELECT price_node.id, currency.id, CAST(old.price AS REAL), CAST(strftime('%s', old.timestamp) AS INTEGER), NULL "
+    "FROM fee_rate_v1 AS old "
+    "JOIN price_node ON price_node.address = old.price_node_address JOIN currency ON currency.code = old.currency "
+    "ORDER BY old.id",
+    "DROP TABLE exchange_rate_v1",
+    "DROP TABLE fee_rate_v1",
+    "DROP TABLE price_node_v1",
+)
+
+
+def get_schema_version(connection):
+    """
+    Returns the schema version of the database, 0 if it is empty.
+    @param (sqlalchemy.engine.Connection) connection: A connection to the database.
+    @return (int): The schema version.
+    """
+    version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+    if version == 0:
+        inspector = inspect(connection)
+        if inspector.has_table("exchange_rate") and \
+                "price_node_address" in [x['name'] for x in inspector.get_columns("exchange_rate")]:
+            return 1
+    return version
+
+
+def migrate_schema(engine):
+    """
+    Creates the tables of the database, migrating the data of a database created by a former version, all in one transaction.
+    @raise (ConfigurationError) if the database was created by a newer version.
+    @param (sqlalchemy.engine.Engine) engine: The engine of the database.
+    """
+    with engine.begin() as connection:
+        version = get_schema_version(connection)
+        if version > SCHEMA_VERSION:
+            raise ConfigurationError("Database schema version {} is newer than the supported version {}".format(version, SCHEMA_VERSION))
+        if version == 1:
+            log.info("Migrating the database from schema version 1 to {}".format(SCHEMA_VERSION))
+            for table in LEGACY_TABLES:
+                connection.exec_driver_sql("ALTER TABLE {0} RENAME TO {0}_v1".format(table))
+        Base.metadata.create_all(connection)
+        if version == 1:
+            for statement in MIGRATE_FROM_VERSION_1:
+                connection.exec_driver_sql(statement)
+        if 0 < version < 3:
+            log.info("Creating the rollups of the stored prices")
+            rebuild_rollups(connection)
+        if version != SCHEMA_VERSION:
+            connection.exec_driver_sql("PRAGMA user_version = {}".format(SCHEMA_VERSION))
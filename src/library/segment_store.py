@@ -0,0 +1,303 @@
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+
+import numpy
+
+log = logging.getLogger(__name__)
+
+RECORD_DTYPE = numpy.dtype([("timestamp", "<i8"), ("node", "<u4"), ("currency", "<u4"), ("price", "<f8")])
+
+
+class Segment(object):
+    """
+    A memory-mapped segment file of fixed-width records, in the order of their timestamps.
+    The file starts with a page holding the header and a sparse time index (the timestamp of every index_interval-th record),
+    followed by the records, preallocated to the capacity of the segment. The length in the header is only updated once the
+    records it covers are synced to disk, so after a crash the segment ends at the last committed record.
+    """
+
+    MAGIC = b"BQSEG001"
+    HEADER = struct.Struct("<8sIIQQQqq")     # magic, version, record size, capacity, length, index interval, first and last timestamp
+    INDEX_OFFSET = 64
+    DATA_OFFSET = mmap.PAGESIZE if mmap.PAGESIZE >= 4096 else 4096
+    INDEX_ENTRIES = (DATA_OFFSET - INDEX_OFFSET) // 8
+
+    def __init__(self, file_path, capacity=None, index_interval=None, writable=False):
+        """
+        @param (str) file_path: The path of the segment file.
+        @param (int) capacity: Number of records of a new segment; only used when the file does not exist.
+        @param (int) index_interval: Number of records per entry of the time index of a new segment.
+        @param (bool) writable: Whether records are appended to the segment; it is mapped read-only otherwise.
+        """
+        self.__file_path = file_path
+        self.__writable = writable
+        if writable and not os.path.isfile(file_path):
+            if capacity > self.INDEX_ENTRIES * index_interval:
+                raise ValueError("A segment of {} records needs an index interval of at least {}".format(capacity,
+                                                                                                       -(-capacity // self.INDEX_ENTRIES)))
+            with open(file_path, "wb") as file_stream:
+                file_stream.truncate(self.DATA_OFFSET + capacity * RECORD_DTYPE.itemsize)
+                file_stream.write(self.HEADER.pack(self.MAGIC, 1, RECORD_DTYPE.itemsize, capacity, 0, index_interval, 0, 0))
+                file_stream.flush()
+                os.fsync(file_stream.fileno())
+        with open(file_path, "r+b" if writable else "rb") as file_stream:
+            self.__mmap = mmap.mmap(file_stream.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        magic, _, record_size, self.__capacity, _, self.__index_interval, _, _ = self.HEADER.unpack_from(self.__mmap, 0)
+        if magic != self.MAGIC or record_size != RECORD_DTYPE.itemsize:
+            self.__mmap.close()
+            raise ValueError("{} is not a segment file".format(file_path))
+        self.__records = numpy.frombuffer(self.__mmap, dtype=RECORD_DTYPE, count=self.__capacity, offset=self.DATA_OFFSET)
+        self.__index = numpy.frombuffer(self.__mmap, dtype="<i8", count=self.INDEX_ENTRIES, offset=self.INDEX_OFFSET)
+
+    @property
+    def file_path(self):
+        return self.__file_path
+
+    @property
+    def capacity(self):
+        return self.__capacity
+
+    def __len__(self):
+        """Number of committed records; read from the header on every call, as another process may append to the segment."""
+        return self.HEADER.unpack_from(self.__mmap, 0)[4]
+
+    @property
+    def time_range(self):
+        """Timestamps of the first and of the last committed record; None if the segment is empty."""
+        _, _, _, _, length, _, first_timestamp, last_timestamp = self.HEADER.unpack_from(self.__mmap, 0)
+        return (first_timestamp, last_timestamp) if length else None
+
+    def append(self, records):
+        """
+        Appends records and commits them, syncing them to disk before the length that makes them visible.
+        @param (numpy.ndarray) records: The records, with RECORD_DTYPE, in the order of their timestamps and not before the last one.
+        @return (int): Number of records appended, fewer than given if the segment is full.
+        """
+        length = len(self)
+        count = min(len(records), self.__capacity - length)
+        if count <= 0:
+            return 0
+        self.__records[length:length + count] = records[:count]
+        start = self.DATA_OFFSET + length * RECORD_DTYPE.itemsize
+        aligned_start = start - start % mmap.PAGESIZE
+        self.__mmap.flush(aligned_start, start + count * RECORD_DTYPE.itemsize - aligned_start)
+        # The index holds the timestamp of every index_interval-th record
+        first_entry = -(-length // self.__index_interval)
+        for entry in range(first_entry, (length + count - 1) // self.__index_interval + 1):
+            self.__index[entry] = self.__records[entry * self.__index_interval]["timestamp"]
+        first_timestamp = int(self.__records[0]["timestamp"])
+        last_timestamp = int(self.__records[length + count - 1]["timestamp"])
+        self.HEADER.pack_into(self.__mmap, 0, self.MAGIC, 1, RECORD_DTYPE.itemsize, self.__capacity, length + count, self.__index_interval,
+                              first_timestamp, last_timestamp)
+        self.__mmap.flush(0, self.DATA_OFFSET)
+        return count
+
+    def get_records(self, start=None, end=None):
+        """
+        Returns the committed records with a timestamp in a range, as a read-only view of the mapped file.
+        @param (int) start: Start of the range, in seconds since the epoch; from the first record if None.
+        @param (int) end: End of the range (excluded), in seconds since the epoch; to the last record if None.
+        @return (numpy.ndarray): The records, with RECORD_DTYPE.
+        """
+        length = len(self)
+        first = 0 if start is None else self.__find(start, length)
+        last = length if end is None else self.__find(end, length)
+        records = self.__records[first:max(first, last)]
+        records.setflags(write=False)
+        return records
+
+    def __find(self, timestamp, length):
+        """Returns the position of the first committed record at or after a timestamp, only reading the interval it falls in."""
+        entries = -(-length // self.__index_interval)
+        entry = max(0, int(numpy.searchsorted(self.__index[:entries], timestamp, side="left")) - 1)
+        low = entry * self.__index_interval
+        high = min(length, low + 2 * self.__index_interval)
+        if high < length and self.__records[high - 1]["timestamp"] < timestamp:
+            # Equal timestamps may span intervals, so the search falls back on the remaining records
+            high = length
+        return low + int(numpy.searchsorted(self.__records[low:high]["timestamp"], timestamp, side="left"))
+
+    def close(self):
+        self.__records = self.__index = None
+        try:
+            self.__mmap.close()
+        except BufferError:
+            # Views handed out by get_records still use the mapping, which is released with them
+            pass
+
+
+class SegmentStore(object):
+    """
+    Stores the prices of the poll cycles as (timestamp, node id, currency id, price) records in memory-mapped, append-only
+    segment files, so that long histories are read as NumPy views of the files, without parsing nor copying. The node
+    addresses and currency codes of the ids are kept in a names file next to the segments.
+    A single process appends to the store; any number of processes may read it.
+    """
+
+    NAMES_FILENAME = "names.json"
+    SEGMENT_PATTERN = re.compile(r"^segment_(\d{6})\.bin$")
+
+    def __init__(self, directory, segment_capacity=2 ** 20, index_interval=4096, writable=False):
+        """
+        @param (str) directory: The directory of the segment files; created if writable.
+        @param (int) segment_capacity: Number of records per segment file.
+        @param (int) index_interval: Number of records per entry of the time index of a segment; raised if the index of a segment
+                                     could not hold the entries of its capacity.
+        @param (bool) writable: Whether the prices are appended to the store; it is only read otherwise.
+        """
+        self.__directory = directory
+        self.__segment_capacity = segment_capacity
+        self.__index_interval = max(index_interval, -(-segment_capacity // Segment.INDEX_ENTRIES))
+        self.__writable = writable
+        self.__lock = threading.Lock()
+        self.__segments = []
+        self.__nodes = []
+        self.__currencies = []
+        self.__node_ids = {}
+        self.__currency_ids = {}
+        if writable and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.__load_names()
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    @property
+    def nodes(self):
+        """The node address of each node id."""
+        self.__load_names()
+        return list(self.__nodes)
+
+    @property
+    def currencies(self):
+        """The currency code of each currency id."""
+        self.__load_names()
+        return list(self.__currencies)
+
+    def get_node_id(self, address):
+        self.__load_names()
+        return self.__node_ids.get(address, None)
+
+    def get_currency_id(self, currency):
+        self.__load_names()
+        return self.__currency_ids.get(currency, None)
+
+    def append_price_data(self, timestamp, price_data):
+        """
+        Appends the prices of a poll cycle; prices that are missing or timed out are left out.
+        @param (float) timestamp: Time of the poll cycle, in seconds since the epoch.
+        @param (list) price_data: The price data of each node.
+        @return (int): Number of records appended.
+        """
+        rows = [(data['nodeAddress'], value.currency, float(value.price))
+                for data in price_data for key, value in data.items()
+                if (key.endswith("MarketPrice") or key.endswith("TxFee")) and value and key not in data['timedOut']]
+        with self.__lock:
+            # New names get the ids that follow the existing ones, in sorted order within the cycle
+            if self.__add_names(sorted(set(x[0] for x in rows).difference(self.__node_ids)),
+                                sorted(set(x[1] for x in rows).difference(self.__currency_ids))):
+                self.__save_names()
+            records = numpy.empty(len(rows), dtype=RECORD_DTYPE)
+            records["timestamp"] = int(timestamp)
+            records["node"] = [self.__node_ids[x[0]] for x in rows]
+            records["currency"] = [self.__currency_ids[x[1]] for x in rows]
+            records["price"] = [x[2] for x in rows]
+            return self.append(records)
+
+    def append(self, records):
+        """
+        Appends records to the last segment, continuing in new segments once it is full.
+        @param (numpy.ndarray) records: The records, with RECORD_DTYPE, in the order of their timestamps and not before the last one.
+        @return (int): Number of records appended.
+        """
+        if not self.__writable:
+            raise ValueError("The segment store at {} is read-only".format(self.__directory))
+        self.__refresh_segments()
+        appended = 0
+        while appended < len(records):
+            if not self.__segments or len(self.__segments[-1]) >= self.__segments[-1].capacity:
+                file_path = os.path.join(self.__directory, "segment_{:06d}.bin".format(len(self.__segments) + 1))
+                self.__segments.append(Segment(file_path, self.__segment_capacity, self.__index_interval, writable=True))
+            appended += self.__segments[-1].append(records[appended:])
+        return appended
+
+    def get_records(self, start=None, end=None):
+        """
+        Returns the records with a timestamp in a range, as one read-only view of the mapped file per segment.
+        @param (int) start: Start of the range, in seconds since the epoch; from the first record if None.
+        @param (int) end: End of the range (excluded), in seconds since the epoch; to the last record if None.
+        @return (list): The records of each segment that has records in the range (numpy.ndarray with RECORD_DTYPE).
+        """
+        self.__refresh_segments()
+        views = []
+        for segment in self.__segments:
+            time_range = segment.time_range
+            if time_range is None or (start is not None and time_range[1] < start) or (end is not None and time_range[0] >= end):
+                continue
+            records = segment.get_records(start, end)
+            if len(records):
+                views.append(records)
+        return views
+
+    def get_prices(self, address, currency, start=None, end=None):
+        """
+        Returns the prices of a node and currency over a time range; unlike get_records, the result is a copy.
+        @return (tuple): The timestamps (numpy.ndarray) and the prices (numpy.ndarray).
+        """
+        node_id = self.get_node_id(address)
+        currency_id = self.get_currency_id(currency)
+        if node_id is None or currency_id is None:
+            return numpy.empty(0, dtype="<i8"), numpy.empty(0)
+        selected = [x[(x["node"] == node_id) & (x["currency"] == currency_id)] for x in self.get_records(start, end)]
+        records = numpy.concatenate(selected) if selected else numpy.empty(0, dtype=RECORD_DTYPE)
+        return records["timestamp"], records["price"]
+
+    def close(self):
+        with self.__lock:
+            for segment in self.__segments:
+                segment.close()
+            self.__segments = []
+
+    def __refresh_segments(self):
+        """Maps the segment files that were added since the last call, e.g. by the process that writes the store."""
+        if not os.path.isdir(self.__directory):
+            return
+        numbers = sorted(int(match.group(1)) for match in (self.SEGMENT_PATTERN.match(x) for x in os.listdir(self.__directory)) if match)
+        for number in numbers[len(self.__segments):]:
+            file_path = os.path.join(self.__directory, "segment_{:06d}.bin".format(number))
+            self.__segments.append(Segment(file_path, writable=self.__writable))
+
+    def __add_names(self, addresses, currencies):
+        """Adds names in the given order, each taking the next id; the order of the saved names is the order of their ids."""
+        for address in addresses:
+            self.__node_ids[address] = len(self.__nodes)
+            self.__nodes.append(address)
+        for currency in currencies:
+            self.__currency_ids[currency] = len(self.__currencies)
+            self.__currencies.append(currency)
+        return bool(addresses or currencies)
+
+    def __load_names(self):
+        """Loads the names that were added since the last call, e.g. by the process that writes the store."""
+        file_path = os.path.join(self.__directory, self.NAMES_FILENAME)
+        if self.__writable and self.__nodes or not os.path.isfile(file_path):
+            return
+        with open(file_path, "r") as file_stream:
+            names = json.load(file_stream)
+        self.__add_names(names['nodes'][len(self.__nodes):], names['currencies'][len(self.__currencies):])
+
+    def __save_names(self):
+        """Saves the names, atomically replacing the file; they are saved before the records that use them are committed."""
+        file_path = os.path.join(self.__directory, self.NAMES_FILENAME)
+        temporary_file_path = file_path + ".tmp"
+        with open(temporary_file_path, "w") as file_stream:
+            json.dump({"nodes": self.__nodes, "currencies": self.__currencies}, file_stream)
+            file_stream.flush()
+            os.fsync(file_stream.fileno())
+        os.replace(temporary_file_path, file_path)
@@ -0,0 +1,311 @@
+import os
+import struct
+
+import numpy
+
+# The delta-of-delta ranges of the timestamp encoding, with the prefix and the number of bits of each; larger ones take 64 bits
+DELTA_OF_DELTA_RANGES = ((63, 64, "10", 7), (255, 256, "110", 9), (2047, 2048, "1110", 12))
+
+
+class SeriesBlock(object):
+    """
+    A block of a compressed series: its timestamps, as delta of deltas, and its values, as the XOR with the previous value,
+    each encoded in a bit stream of its own (as in Facebook's Gorilla). The block keeps the first and last timestamp and the
+    first, last, minimum and maximum value of its points, so that ranges and summaries mostly do without decoding it.
+    """
+
+    __slots__ = ("count", "first_timestamp", "last_timestamp", "first", "last", "minimum", "maximum", "timestamp_bits", "value_bits")
+
+    HEADER = struct.Struct("<IIIqqdddd")     # count, size of both bit streams, first and last timestamp, first, last, minimum and maximum
+
+    def __init__(self, count, first_timestamp, last_timestamp, first, last, minimum, maximum, timestamp_bits, value_bits):
+        self.count = count
+        self.first_timestamp = first_timestamp
+        self.last_timestamp = last_timestamp
+        self.first = first
+        self.last = last
+        self.minimum = minimum
+        self.maximum = maximum
+        self.timestamp_bits = timestamp_bits
+        self.value_bits = value_bits
+
+    @property
+    def nbytes(self):
+        return self.HEADER.size + len(self.timestamp_bits) + len(self.value_bits)
+
+    @classmethod
+    def encode(cls, timestamps, values):
+        """
+        @param (list) timestamps: The timestamps of the points, in seconds since the epoch, in ascending order.
+        @param (list) values: The values of the points; missing values are NaN.
+        @return (SeriesBlock): The block of the points.
+        """
+        values = numpy.asarray(values, dtype="<f8")
+        if not len(values):
+            raise ValueError("A block needs at least one point")
+        with numpy.errstate(invalid="ignore"):
+            minimum = float(numpy.nanmin(values)) if not numpy.isnan(values).all() else float("nan")
+            maximum = float(numpy.nanmax(values)) if not numpy.isnan(values).all() else float("nan")
+        timestamps = [int(x) for x in timestamps]
+        return SeriesBlock(len(values), timestamps[0], timestamps[-1], float(values[0]), float(values[-1]), minimum, maximum,
+                           cls.__pack(cls.__encode_timestamps(timestamps)), cls.__pack(cls.__encode_values(values.view("<u8").tolist())))
+
+    def decode(self):
+        """
+        @return (tuple): The timestamps (numpy.ndarray of int64) and the values (numpy.ndarray of float64) of the block.
+        """
+        timestamps = numpy.empty(self.count, dtype="<i8")
+        values = numpy.empty(self.count, dtype="<u8")
+        bits = self.__unpack(self.timestamp_bits)
+        position = 0
+        timestamp = timestamps[0] = self.first_timestamp
+        delta = 0
+        for i in range(1, self.count):
+            if bits[position] == "0":
+                position += 1
+            else:
+                for _, _, prefix, size in DELTA_OF_DELTA_RANGES:
+                    if bits.startswith(prefix, position):
+                        position += len(prefix)
+                        delta += int(bits[position:position + size], 2) - (2 ** (size - 1) - 1)
+                        position += size
+                        break
+                else:
+                    delta_of_delta = int(bits[position + 4:position + 68], 2)
+                    delta += delta_of_delta - 2 ** 64 if delta_of_delta >= 2 ** 63 else delta_of_delta
+                    position += 68
+            timestamp += delta
+            timestamps[i] = timestamp
+        bits = self.__unpack(self.value_bits)
+        position = 0
+        value = values[0] = struct.unpack("<Q", struct.pack("<d", self.first))[0]
+        leading = trailing = 0
+        for i in range(1, self.count):
+            if bits[position] == "0":
+                position += 1
+            else:
+                if bits[position + 1] == "1":
+                    leading = int(bits[position + 2:position + 7], 2)
+                    trailing = 64 - leading - int(bits[position + 7:position + 13], 2) - 1
+                    position += 13
+                else:
+                    position += 2
+                size = 64 - leading - trailing
+                value ^= int(bits[position:position + size], 2) << trailing
+                position += size
+            values[i] = value
+        return timestamps, values.view("<f8")
+
+    def to_bytes(self):
+        return self.HEADER.pack(self.count, len(self.timestamp_bits), len(self.value_bits), self.first_timestamp, self.last_timestamp,
+                                self.first, self.last, self.minimum, self.maximum) + self.timestamp_bits + self.value_bits
+
+    @classmethod
+    def from_bytes(cls, buffer, offset=0):
+        """
+        @return (tuple): The block read at the offset of the buffer, and the offset that follows it.
+        """
+        count, timestamp_size, value_size, first_timestamp, last_timestamp, first, last, minimum, maximum = cls.HEADER.unpack_from(buffer, offset)
+        offset += cls.HEADER.size
+        timestamp_bits = bytes(buffer[offset:offset + timestamp_size])
+        value_bits = bytes(buffer[offset + timestamp_size:offset + timestamp_size + value_size])
+        if len(value_bits) != value_size:
+            raise ValueError("Truncated block at offset {}".format(offset - cls.HEADER.size))
+        block = SeriesBlock(count, first_timestamp, last_timestamp, first, last, minimum, maximum, timestamp_bits, value_bits)
+        return block, offset + timestamp_size + value_size
+
+    @staticmethod
+    def __encode_timestamps(timestamps):
+        bits = []
+        delta = 0
+        for previous, timestamp in zip(timestamps, timestamps[1:]):
+            delta_of_delta = timestamp - previous - delta
+            delta = timestamp - previous
+            if delta_of_delta == 0:
+                bits.append("0")
+                continue
+            for low, high, prefix, size in DELTA_OF_DELTA_RANGES:
+                if -low <= delta_of_delta <= high:
+                    bits.append(prefix + format(delta_of_delta + low, "0{}b".format(size)))
+                    break
+            else:
+                bits.append("1111" + format(delta_of_delta & (2 ** 64 - 1), "064b"))
+        return "".join(bits)
+
+    @staticmethod
+    def __encode_values(values):
+        """
+        Encodes the bits of the values; a value equal to the previous takes one bit, and a value whose XOR with the previous fits
+        in the meaningful bits of the previous XOR only takes these bits.
+        """
+        bits = []
+        leading = trailing = None
+        for previous, value in zip(values, values[1:]):
+            xor = previous ^ value
+            if xor == 0:
+                bits.append("0")
+                continue
+            xor_leading = min(31, 64 - xor.bit_length())
+            xor_trailing = (xor & -xor).bit_length() - 1
+            if leading is not None and xor_leading >= leading and xor_trailing >= trailing:
+                bits.append("10" + format(xor >> trailing, "0{}b".format(64 - leading - trailing)))
+            else:
+                leading, trailing = xor_leading, xor_trailing
+                size = 64 - leading - trailing
+                bits.append("11" + format(leading, "05b") + format(size - 1, "06b") + format(xor >> trailing, "0{}b".format(size)))
+        return "".join(bits)
+
+    @staticmethod
+    def __pack(bits):
+        if not bits:
+            return b""
+        bits += "0" * (-len(bits) % 8)
+        return int(bits, 2).to_bytes(len(bits) // 8, "big")
+
+    @staticmethod
+    def __unpack(data):
+        return format(int.from_bytes(data, "big"), "0{}b".format(len(data) * 8)) if data else ""
+
+
+class CompressedSeries(object):
+    """
+    A series of (timestamp, value) points kept in compressed blocks of a fixed number of points, e.g. the exchange rate of a
+    currency on a node. Points are appended in the order of their timestamps into an open block, which is compressed once full.
+    A range only decodes the blocks it overlaps, and a summary only decodes the blocks at its ends.
+    The series is saved to and loaded from an archive file, made of its blocks.
+    """
+
+    MAGIC = b"BQGOR001"
+    HEADER = struct.Struct("<8sII")     # magic, block size, number of blocks
+
+    def __init__(self, block_size=1024):
+        """
+        @param (int) block_size: Number of points per block.
+        """
+        self.__block_size = block_size
+        self.__blocks = []
+        self.__timestamps = []
+        self.__values = []
+
+    @property
+    def block_size(self):
+        return self.__block_size
+
+    @property
+    def blocks(self):
+        """The compressed blocks, without the open block."""
+        return list(self.__blocks)
+
+    @property
+    def nbytes(self):
+        """Number of bytes used by the points, counting 16 bytes per point of the open block."""
+        return sum(x.nbytes for x in self.__blocks) + 16 * len(self.__timestamps)
+
+    def __len__(self):
+        return sum(x.count for x in self.__blocks) + len(self.__timestamps)
+
+    def append(self, timestamp, value):
+        """
+        @param (int) timestamp: Time of the point, in seconds since the epoch; not before the last point.
+        @param (float) value: The value of the point; None or NaN if missing.
+        """
+        last_timestamp = self.__timestamps[-1] if self.__timestamps else self.__blocks[-1].last_timestamp if self.__blocks else None
+        if last_timestamp is not None and timestamp < last_timestamp:
+            raise ValueError("Point at {} appended after {}".format(timestamp, last_timestamp))
+        self.__timestamps.append(int(timestamp))
+        self.__values.append(float("nan") if value is None else float(value))
+        if len(self.__timestamps) >= self.__block_size:
+            self.flush()
+
+    def extend(self, timestamps, values):
+        for timestamp, value in zip(timestamps, values):
+            self.append(timestamp, value)
+
+    def flush(self):
+        """Compresses the open block, even if it is not full."""
+        if self.__timestamps:
+            self.__blocks.append(SeriesBlock.encode(self.__timestamps, self.__values))
+            self.__timestamps = []
+            self.__values = []
+
+    def get(self, start=None, end=None):
+        """
+        Returns the points with a timestamp in a range.
+        @param (int) start: Start of the range, in seconds since the epoch; from the first point if None.
+        @param (int) end: End of the range (excluded), in seconds since the epoch; to the last point if None.
+        @return (tuple): The timestamps (numpy.ndarray of int64) and the values (numpy.ndarray of float64).
+        """
+        parts = [x.decode() for x in self.__blocks if self.__overlaps(x.first_timestamp, x.last_timestamp, start, end)]
+        if self.__timestamps:
+            parts.append((numpy.array(self.__timestamps, dtype="<i8"), numpy.array(self.__values, dtype="<f8")))
+        timestamps = numpy.concatenate([x[0] for x in parts]) if parts else numpy.empty(0, dtype="<i8")
+        values = numpy.concatenate([x[1] for x in parts]) if parts else numpy.empty(0, dtype="<f8")
+        return self.__select((timestamps, values), start, end)
+
+    def summarize(self, start=None, end=None):
+        """
+        Returns the minimum and maximum of the values in a range; the blocks that the range covers entirely are not decoded.
+        @return (tuple): The minimum and the maximum, ignoring missing values; NaN if the range has no value.
+        """
+        minimums = []
+        maximums = []
+        for block in self.__blocks:
+            if not self.__overlaps(block.first_timestamp, block.last_timestamp, start, end):
+                continue
+            if (start is None or block.first_timestamp >= start) and (end is None or block.last_timestamp < end):
+                minimums.append(block.minimum)
+                maximums.append(block.maximum)
+            else:
+                _, values = self.__select(block.decode(), start, end)
+                minimums.extend(values)
+                maximums.extend(values)
+        _, values = self.__select((numpy.array(self.__timestamps, dtype="<i8"), numpy.array(self.__values, dtype="<f8")), start, end)
+        minimums.extend(values)
+        maximums.extend(values)
+        with numpy.errstate(invalid="ignore"):
+            if not minimums or numpy.isnan(minimums).all():
+                return float("nan"), float("nan")
+            return float(numpy.nanmin(minimums)), float(numpy.nanmax(maximums))
+
+    def to_bytes(self):
+        """Returns the archive of the series; the open block is compressed first."""
+        self.flush()
+        return self.HEADER.pack(self.MAGIC, self.__block_size, len(self.__blocks)) + b"".join(x.to_bytes() for x in self.__blocks)
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        magic, block_size, block_count = cls.HEADER.unpack_from(buffer, 0)
+        if magic != cls.MAGIC:
+            raise ValueError("Not a compressed series archive")
+        series = CompressedSeries(block_size)
+        offset = cls.HEADER.size
+        for _ in range(block_count):
+            block, offset = SeriesBlock.from_bytes(buffer, offset)
+            series.__blocks.append(block)
+        return series
+
+    def save(self, file_path):
+        """Saves the archive of the series, atomically replacing the file."""
+        temporary_file_path = file_path + ".tmp"
+        with open(temporary_file_path, "wb") as file_stream:
+            file_stream.write(self.to_bytes())
+        os.replace(temporary_file_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, "rb") as file_stream:
+            return cls.from_bytes(file_stream.read())
+
+    @staticmethod
+    def __overlaps(first_timestamp, last_timestamp, start, end):
+        return (start is None or last_timestamp >= start) and (end is None or first_timestamp < end)
+
+    @staticmethod
+    def __select(points, start, end):
+        timestamps, values = points
+        selected = numpy.ones(len(timestamps), dtype=bool)
+        if start is not None:
+            selected &= timestamps >= start
+        if end is not None:
+            selected &= timestamps < end
+        return timestamps[selected], values[selected]
@@ -0,0 +1,93 @@
+import threading
+
+import numpy
+
+
+class SnapshotBuffer(object):
+    """
+    Keeps the most recent poll cycles as a fixed-capacity ring buffer of timestamps × rows × columns prices, NaN where missing,
+    e.g. the price of each node (row) for the BTC transaction fee and each market (column).
+    Every snapshot is written twice, at its index and at its index plus the capacity, so that any window of recent snapshots is
+    a contiguous slice of the storage and can be handed out as a view without copying.
+    """
+
+    def __init__(self, capacity, rows, columns):
+        """
+        @param (int) capacity: Maximum number of snapshots kept; memory use is fixed by it.
+        @param (list) rows: The name of each row of a snapshot, e.g. the node addresses.
+        @param (list) columns: The name of each column of a snapshot, e.g. btcTxFee or usdMarketPrice.
+        """
+        self.__capacity = max(1, capacity)
+        self.__rows = list(rows)
+        self.__columns = list(columns)
+        self.__lock = threading.Lock()
+        self.__timestamps = numpy.full(2 * self.__capacity, numpy.nan)
+        self.__prices = numpy.full((2 * self.__capacity, len(self.__rows), len(self.__columns)), numpy.nan)
+        self.__next_index = 0
+        self.__count = 0
+
+    @property
+    def capacity(self):
+        return self.__capacity
+
+    @property
+    def rows(self):
+        return self.__rows
+
+    @property
+    def columns(self):
+        return self.__columns
+
+    @property
+    def nbytes(self):
+        return self.__timestamps.nbytes + self.__prices.nbytes
+
+    def __len__(self):
+        return self.__count
+
+    def append(self, timestamp, prices):
+        """
+        Adds the snapshot of a poll cycle, overwriting the oldest one once the buffer is full.
+        @param (float) timestamp: Time of the poll cycle, in seconds since the epoch.
+        @param (numpy.ndarray) prices: The rows × columns matrix of prices, e.g. PriceAnalysis.prices.
+        """
+        with self.__lock:
+            index = self.__next_index
+            for position in (index, index + self.__capacity):
+                self.__timestamps[position] = timestamp
+                self.__prices[position] = prices
+            self.__next_index = (index + 1) % self.__capacity
+            self.__count = min(self.__count + 1, self.__capacity)
+
+    def get_window(self, size=None, since=None):
+        """
+        Returns the most recent snapshots, oldest first, as read-only views of the buffer.
+        The views are not copies: snapshots are overwritten once capacity more snapshots have been appended, so callers that keep
+        a window around for long must copy it.
+        @param (int) size: Maximum number of snapshots; all that are kept if None.
+        @param (float) since: Only snapshots with a timestamp at or after it, in seconds since the epoch.
+        @return (tuple): The timestamps (numpy.ndarray) and the snapshots × rows × columns prices (numpy.ndarray).
+        """
+        with self.__lock:
+            size = self.__count if size is None else max(0, min(size, self.__count))
+            # The snapshots before the next index are the newest; in the doubled storage they always end contiguously at end
+            end = self.__next_index if self.__next_index >= size else self.__next_index + self.__capacity
+            timestamps = self.__timestamps[end - size:end]
+            prices = self.__prices[end - size:end]
+        if since is not None:
+            first = numpy.searchsorted(timestamps, since, side="left")
+            timestamps, prices = timestamps[first:], prices[first:]
+        timestamps = timestamps.view()
+        prices = prices.view()
+        timestamps.setflags(write=False)
+        prices.setflags(write=False)
+        return timestamps, prices
+
+    def get_column_window(self, column, size=None, since=None):
+        """Same as get_window, for the prices of a single column, as a snapshots × rows view."""
+        timestamps, prices = self.get_window(size, since)
+        return timestamps, prices[:, :, self.__columns.index(column)]
+
+    def __repr__(self):
+        return "<SnapshotBuffer of {}/{} snapshots of {} rows × {} columns>".format(self.__count, self.__capacity, len(self.__rows),
+                                                                                     len(self.__columns))
@@ -0,0 +1,200 @@
+import logging
+import queue
+import threading
+import time
+
+from sqlalchemy import select
+
+from src.library.rollups import get_uncovered_samples, update_rollups
+from src.model.currency_model import CurrencyModel
+from src.model.exchange_rate_model import ExchangeRateModel
+from src.model.fee_rate_model import FeeRateModel
+from src.model.price_node_model import PriceNodeModel
+
+log = logging.getLogger(__name__)
+
+
+class StorageWriter(threading.Thread):
+    """
+    Persists the price data of the poll cycles to the database from a background thread, so that the polling loop never waits
+    for the database. Rows are inserted in batches, with one executemany per table and one transaction per batch.
+    Node addresses and currency codes are stored as ids, which are cached once resolved. The rollups are updated in the
+    transaction of each batch, with every monitored price of a cycle, including the missing ones that count against availability.
+    With a change filter, only the prices whose provider sample changed (and their heartbeats) are inserted, while the rollups
+    still get every price.
+    """
+
+    def __init__(self, engine, batch_size=1000, flush_interval=5, max_queued_cycles=1000, change_filter=None):
+        """
+        @param (sqlalchemy.engine.Engine) engine: The engine of the database.
+        @param (int) batch_size: Number of rows after which a batch is written.
+        @param (float) flush_interval: Maximum time (in seconds) that rows wait before being written.
+        @param (int) max_queued_cycles: Maximum number of poll cycles waiting to be written; further cycles are dropped.
+        @param (ChangeFilter) change_filter: The filter of the unchanged samples; every sample is inserted if None.
+        """
+        super(StorageWriter, self).__init__(name="StorageWriter", daemon=True)
+        self.__engine = engine
+        self.__batch_size = max(1, batch_size)
+        self.__flush_interval = flush_interval
+        self.__queue = queue.Queue(maxsize=max_queued_cycles)
+        self.__price_node_ids = {}
+        self.__currency_ids = {}
+        self.__change_filter = change_filter
+        self.__statistics = {"cycles": 0, "rows": 0, "skipped_rows": 0, "batches": 0, "dropped_cycles": 0, "failed_batches": 0,
+                             "last_batch_seconds": 0}
+
+    @property
+    def engine(self):
+        return self.__engine
+
+    @property
+    def change_filter(self):
+        return self.__change_filter
+
+    @property
+    def statistics(self):
+        """
+        Number of cycles and rows written, of unchanged rows skipped, of batches written and failed, of cycles dropped, and the
+        duration of the last batch.
+        """
+        return dict(self.__statistics)
+
+    def submit(self, timestamp, price_data):
+        """
+        Queues the price data of a poll cycle to be written; returns immediately.
+        @param (float) timestamp: Time of the poll cycle, in seconds since the epoch.
+        @param (list) price_data: The price data of each node.
+        @return (bool): Whether the cycle was queued, i.e. False if the queue is full and the cycle was dropped.
+        """
+        try:
+            self.__queue.put_nowait((timestamp, price_data))
+            return True
+        except queue.Full:
+            self.__statistics["dropped_cycles"] += 1
+            log.warning("Dropped the price data of a poll cycle as {} cycles are waiting to be written".format(self.__queue.maxsize))
+            return False
+
+    def stop(self):
+        """Stops the writer once the queued cycles are written."""
+        self.__queue.put(None)
+
+    def run(self):
+        exchange_rates = []
+        fee_rates = []
+        samples = []
+        accepted_samples = {}
+        flush_time = None
+        is_running = True
+        while is_running:
+            timeout = None if flush_time is None else max(0, flush_time - time.monotonic())
+            try:
+                item = self.__queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                is_running = False
+            elif item:
+                self.__add_rows(exchange_rates, fee_rates, samples, accepted_samples, *item)
+                self.__statistics["cycles"] += 1
+                if flush_time is None:
+                    flush_time = time.monotonic() + self.__flush_interval
+            if samples:
+                if not is_running or len(exchange_rates) + len(fee_rates) >= self.__batch_size or time.monotonic() >= flush_time:
+                    self.__write_batch(exchange_rates, fee_rates, samples, accepted_samples)
+                    exchange_rates = []
+                    fee_rates = []
+                    samples = []
+                    accepted_samples = {}
+                    flush_time = None
+
+    def __add_rows(self, exchange_rates, fee_rates, samples, accepted_samples, timestamp, price_data):
+        """
+        Converts the price data of a poll cycle into rows; prices that are missing or timed out are left out of them, but not
+        out of the (address, currency, timestamp, price) samples of the rollups, where their price is None. Prices that the
+        change filter rejects are only left out of the rows; the samples it accepts are only recorded by the filter once their
+        batch is committed.
+        The rows hold the node address and the currency code, which are replaced by their ids when the batch is written.
+        """
+        poll_time = int(timestamp)
+        for data in price_data:
+            for key, value in data.items():
+                if key.endswith("MarketPrice"):
+                    currency = value.currency if value else key[:-len("MarketPrice")].upper()
+                elif key.endswith("TxFee"):
+                    currency = value.currency if value else key[:-len("TxFee")]
+                else:
+                    continue
+                if not value or key in data['timedOut']:
+                    samples.append((data['nodeAddress'], currency, poll_time, None))
+                    continue
+                samples.append((data['nodeAddress'], currency, poll_time, float(value.price)))
+                if self.__change_filter is not None and \
+                        not self.__change_filter.accept(data['nodeAddress'], currency, poll_time, int(value.timestamp), float(value.price),
+                                                       accepted_samples):
+                    self.__statistics["skipped_rows"] += 1
+                    continue
+                if key.endswith("MarketPrice"):
+                    exchange_rates.append({"price_node_id": data['nodeAddress'], "currency_id": value.currency, "price": float(value.price),
+                                           "timestamp": poll_time, "provider_timestamp": int(value.timestamp), "provider": value.provider})
+                elif key.endswith("TxFee"):
+                    fee_rates.append({"price_node_id": data['nodeAddress'], "currency_id": value.currency, "price": float(value.price),
+                                      "timestamp": poll_time, "provider_timestamp": int(value.timestamp)})
+
+    @staticmethod
+    def __get_ids(connection, ids, table, column, values):
+        """Adds the ids of the values that are not cached yet to the cache, inserting the values that are not stored yet."""
+        missing = set(values).difference(ids)
+        if not missing:
+            return
+        connection.execute(table.insert().prefix_with("OR IGNORE"), [{column.name: x} for x in missing])
+        ids.update((value, id_) for id_, value in connection.execute(select(table.c.id, column).where(column.in_(missing))))
+
+    def insert_rows(self, connection, exchange_rates, fee_rates, samples=None):
+        """
+        Inserts exchange and fee rates in bulk, resolving the ids of their node addresses and currency codes, and adds them to
+        the rollups. Rows that are already stored (the same node, currency and timestamp) are skipped, so inserting them again
+        does not change the database.
+        @param (sqlalchemy.engine.Connection) connection: A connection to the database, in a transaction.
+        @param (list) exchange_rates: The exchange rates, with the node address and the currency code in place of their ids.
+        @param (list) fee_rates: The fee rates, with the node address and the currency code in place of their ids.
+        @param (list) samples: The (address, currency, timestamp, price) samples of the rollups; the inserted rows that the
+                               rollups do not cover yet if None.
+        @return (int): Number of rows inserted.
+        """
+        rows = exchange_rates + fee_rates
+        addresses = [x['price_node_id'] for x in rows] if samples is None else [x[0] for x in samples]
+        currencies = [x['currency_id'] for x in rows] if samples is None else [x[1] for x in samples]
+        self.__get_ids(connection, self.__price_node_ids, PriceNodeModel.__table__, PriceNodeModel.__table__.c.address, addresses)
+        self.__get_ids(connection, self.__currency_ids, CurrencyModel.__table__, CurrencyModel.__table__.c.code, currencies)
+        rows = [dict(x, price_node_id=self.__price_node_ids[x['price_node_id']], currency_id=self.__currency_ids[x['currency_id']])
+                for x in rows]
+        inserted = []
+        # A node polled twice within the same second is stored once, rather than failing the whole batch
+        for table, table_rows in ((ExchangeRateModel.__table__, rows[:len(exchange_rates)]), (FeeRateModel.__table__, rows[len(exchange_rates):])):
+            if table_rows:
+                inserted.extend(connection.execute(table.insert().prefix_with("OR IGNORE").returning(
+                    table.c.price_node_id, table.c.currency_id, table.c.timestamp, table.c.price), table_rows).all())
+        if samples is None:
+            # Only the inserted rows are added, so that the rows that were already stored are not counted twice, and only where
+            # the rollups do not cover them yet, as the live writer adds the prices that the change filter did not store
+            update_rollups(connection, get_uncovered_samples(connection, [tuple(x) for x in inserted]))
+        else:
+            update_rollups(connection, [(self.__price_node_ids[address], self.__currency_ids[currency], timestamp, price)
+                                        for address, currency, timestamp, price in samples])
+        return len(inserted)
+
+    def __write_batch(self, exchange_rates, fee_rates, samples, accepted_samples):
+        batch_start = time.monotonic()
+        try:
+            with self.__engine.begin() as connection:
+                self.insert_rows(connection, exchange_rates, fee_rates, samples)
+            if self.__change_filter is not None:
+                self.__change_filter.commit(accepted_samples)
+        except Exception as e:
+            self.__statistics["failed_batches"] += 1
+            log.error("Failed to write {} rows to the database: {}".format(len(exchange_rates) + len(fee_rates), e))
+            return
+        self.__statistics["batches"] += 1
+        self.__statistics["rows"] += len(exchange_rates) + len(fee_rates)
+        self.__statistics["last_batch_seconds"] = time.monotonic() - batch_start
+        log.debug("Wrote {} rows to the database in {:.3f}s".format(len(exchange_rates) + len(fee_rates), self.__statistics["last_batch_seconds"]))
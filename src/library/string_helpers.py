@@ -14,7 +14,8 @@ class StringFormat(IntEnum):
     json = 6,  # JSON/dict format that can be parsed by json module
     string_list = 7,  # Comma delimited list, returns a list of strings
     url = 8,  # URL format, returns a string
-    ip_address = 9  # IP address, returns a string
+    ip_address = 9,  # IP address, returns a string
+    float = 10  # 0-9 with an optional decimal point, returns a float
 
 
 def parse_string(string_input, expected_format):
@@ -30,6 +31,11 @@ def parse_string(string_input, expected_format):
             return int(string_input)
         except ValueError:
             raise ParseException("String is not an integer '%s'" % string_input)
+    elif expected_format == StringFormat.float:
+        try:
+            return float(string_input)
+        except ValueError:
+            raise ParseException("String is not a float '%s'" % string_input)
     elif expected_format == StringFormat.alphabetic:
         if string_input.isalpha():
             return string_input
@@ -1,18 +1,35 @@
+import json
 import logging
+import secrets
+import threading
+import time
+from concurrent.futures import Future
 
 import requests
 from requests import HTTPError
 
+from src.library.latency_tracker import LatencyTracker
+from src.library.response_cache import ResponseCache
+
 log = logging.getLogger(__name__)
 
 
 class TorSession(object):
     """Represents a session for communicating on the TOR network."""
 
-    def __init__(self, socks5_host='127.0.0.1', socks5_port=9050):
+    def __init__(self, socks5_host='127.0.0.1', socks5_port=9050, connect_timeout=None, read_timeout=None, response_cache=None,
+                 socks5_username=None, socks5_password=None):
         self.__session = requests.session()
+        self.__response_cache = response_cache if response_cache is not None else ResponseCache()
+        self.__latency = LatencyTracker()
+        self.__socks5_username = socks5_username
+        self.__socks5_password = socks5_password
+        self.__in_flight_lock = threading.Lock()
+        self.__in_flight_requests = {}
         self.__socks5_host = socks5_host
         self.__socks5_port = socks5_port
+        self.__connect_timeout = connect_timeout
+        self.__read_timeout = read_timeout
         self.update_proxies()
 
     @property
@@ -35,32 +52,122 @@ class TorSession(object):
         self.__socks5_port = value
         self.update_proxies()
 
+    @property
+    def connect_timeout(self):
+        return self.__connect_timeout
+
+    @connect_timeout.setter
+    def connect_timeout(self, value):
+        self.__connect_timeout = value
+
+    @property
+    def read_timeout(self):
+        return self.__read_timeout
+
+    @read_timeout.setter
+    def read_timeout(self, value):
+        self.__read_timeout = value
+
+    @property
+    def socks5_username(self):
+        return self.__socks5_username
+
+    @property
+    def socks5_password(self):
+        return self.__socks5_password
+
+    @property
+    def response_cache(self):
+        return self.__response_cache
+
+    @property
+    def latency(self):
+        """Latencies of the recent successful requests, i.e. of the circuit(s) this session uses."""
+        return self.__latency
+
+    def set_socks5_credentials(self, username, password):
+        """Sets the SOCKS5 credentials; TOR puts requests with different credentials on different circuits (IsolateSOCKSAuth)."""
+        self.__socks5_username = username
+        self.__socks5_password = password
+        self.update_proxies()
+
+    def renew_circuit(self):
+        """Switches to new random SOCKS5 credentials, so that TOR builds a new circuit for the following requests."""
+        old_session = self.__session
+        self.__session = requests.session()
+        self.set_socks5_credentials(secrets.token_hex(8), secrets.token_hex(8))
+        self.__latency.clear()
+        old_session.close()
+
     def update_proxies(self):
+        credentials = ""
+        if self.__socks5_username is not None:
+            credentials = "{0}:{1}@".format(self.__socks5_username, self.__socks5_password or "")
         self.__session.proxies = {
-            "http": "socks5h://{0}:{1}".format(self.__socks5_host, self.__socks5_port),
-            "https": "socks5h://{0}:{1}".format(self.__socks5_host, self.__socks5_port)
+            "http": "socks5h://{0}{1}:{2}".format(credentials, self.__socks5_host, self.__socks5_port),
+            "https": "socks5h://{0}{1}:{2}".format(credentials, self.__socks5_host, self.__socks5_port)
         }
 
-    def get_response(self, url):
+    def get_response(self, url, headers=None):
+        request_start = time.monotonic()
         try:
-            response = self.__session.get(url)
+            response = self.__session.get(url, headers=headers, timeout=(self.__connect_timeout, self.__read_timeout))
         except Exception as ex:
             raise ConnectionError(ex)
-        if response.status_code != 200:
+        self.__latency.record(time.monotonic() - request_start)
+        if response.status_code != 200 and not (headers and response.status_code == 304):
             raise HTTPError("{0} returned HTTP error {1}".format(url, response.status_code))
         return response
 
     def get_text_data(self, url):
-        response = self.get_response(url)
-        return response.text
+        return self.get_parsed_data(url, parse_text)
 
     def get_json_data(self, url):
-        response = self.get_response(url)
+        return self.get_parsed_data(url, parse_json)
+
+    def get_parsed_data(self, url, parse):
+        """
+        Returns the data parsed from the response of the URL, going through the response cache.
+        Concurrent requests of the same URL are coalesced into one, and a response that is unchanged is not parsed again.
+        @param (str) url: The URL to request.
+        @param (callable) parse: Function parsing the response body (bytes); must be the same object on every call to benefit from the cache.
+        @return (object): The parsed data, shared with other callers and so not to be modified.
+        """
+        cached_response = self.__response_cache.get_fresh(url)
+        if cached_response is None:
+            cached_response = self.__get_response_coalesced(url)
+        return cached_response.get_parsed_data(parse)
+
+    def __get_response_coalesced(self, url):
+        with self.__in_flight_lock:
+            in_flight_request = self.__in_flight_requests.get(url, None)
+            is_leader = in_flight_request is None
+            if is_leader:
+                in_flight_request = self.__in_flight_requests[url] = Future()
+        if not is_leader:
+            return in_flight_request.result()
         try:
-            json_data = response.json()
-        except ValueError:
-            raise IncorrectResponseData("Response not in JSON format: {}".format(response))
-        return json_data
+            response = self.get_response(url, self.__response_cache.get_request_headers(url))
+            cached_response = self.__response_cache.store(url, response.status_code, response.headers, response.content)
+            in_flight_request.set_result(cached_response)
+            return cached_response
+        except Exception as ex:
+            in_flight_request.set_exception(ex)
+            raise
+        finally:
+            with self.__in_flight_lock:
+                del self.__in_flight_requests[url]
+
+
+def parse_text(content):
+    return content.decode("utf-8", errors="replace")
+
+
+def parse_json(content):
+    try:
+        return json.loads(content)
+    except ValueError:
+        raise IncorrectResponseData("Response not in JSON format: {}".format(content[:100]))
 
 
 class IncorrectResponseData(Exception):
@@ -0,0 +1,87 @@
+import itertools
+import logging
+import secrets
+import statistics
+import threading
+import zlib
+
+log = logging.getLogger(__name__)
+
+
+class TorSessionPool(object):
+    """
+    Holds several TOR sessions, each on its own circuit (through distinct SOCKS5 credentials),
+    so that requests to different nodes do not queue behind a single slow circuit.
+    """
+
+    STRATEGIES = ("per_node", "round_robin", "least_latency")
+
+    def __init__(self, session_factory, size, strategy="per_node", rotation_factor=3):
+        """
+        @param (callable) session_factory: Creates a TorSession or AsyncTorSession, given the SOCKS5 username and password.
+        @param (int) size: Number of sessions (circuits) in the pool.
+        @param (str) strategy: How a session is picked for a node; per_node (sticky), round_robin or least_latency.
+        @param (float) rotation_factor: A circuit whose median latency exceeds this factor times the pool median is renewed.
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError("Unknown circuit strategy: {}".format(strategy))
+        self.__sessions = [session_factory(secrets.token_hex(8), secrets.token_hex(8)) for _ in range(max(1, size))]
+        self.__strategy = strategy
+        self.__rotation_factor = rotation_factor
+        self.__lock = threading.Lock()
+        self.__round_robin = itertools.cycle(range(len(self.__sessions)))
+
+    @property
+    def sessions(self):
+        return list(self.__sessions)
+
+    @property
+    def strategy(self):
+        return self.__strategy
+
+    @property
+    def rotation_factor(self):
+        return self.__rotation_factor
+
+    def __len__(self):
+        return len(self.__sessions)
+
+    def get_session(self, key):
+        """
+        Returns the session to send the requests of the given key (a node address) through.
+        @param (str) key: The node address.
+        @return (TorSession|AsyncTorSession): The session.
+        """
+        if self.__strategy == "per_node":
+            return self.__sessions[zlib.crc32(key.encode("utf-8")) % len(self.__sessions)]
+        with self.__lock:
+            offset = next(self.__round_robin)
+        sessions = self.__sessions[offset:] + self.__sessions[:offset]
+        if self.__strategy == "round_robin":
+            return sessions[0]
+        # Sessions without any latency sample yet are tried first; ties are broken in round robin order
+        return min(sessions, key=lambda session: (session.latency.median is not None, session.latency.median or 0))
+
+    def get_alternate_session(self, tor_session):
+        """Returns the session following the given one in the pool, i.e. one on another circuit, or None if the pool has a single session."""
+        if len(self.__sessions) < 2:
+            return None
+        return self.__sessions[(self.__sessions.index(tor_session) + 1) % len(self.__sessions)]
+
+    def rotate_slow_circuits(self):
+        """
+        Renews the circuits whose median latency is well above the median of the pool.
+        @return (int): The number of renewed circuits.
+        """
+        medians = [(session, session.latency.median) for session in self.__sessions]
+        medians = [(session, median) for session, median in medians if median is not None]
+        if len(medians) < 2:
+            return 0
+        pool_median = statistics.median(median for _, median in medians)
+        rotated = 0
+        for session, median in medians:
+            if median > pool_median * self.__rotation_factor:
+                log.info("Renewing TOR circuit with median latency {:.2f}s (pool median {:.2f}s)".format(median, pool_median))
+                session.renew_circuit()
+                rotated += 1
+        return rotated
@@ -2,8 +2,18 @@ import argparse
 import logging
 import os
 
+from src.library.async_tor_session import AsyncTorSession
+from src.library.change_filter import ChangeFilter
 from src.library.configuration import Configuration, load_config_from_file
+from src.library.history_sink import HistorySink
+from src.library.request_hedger import RequestHedger
+from src.library.response_cache import ResponseCache
+from src.library.retention_job import RetentionJob
+from src.library.rollups import Rollups
+from src.library.segment_store import SegmentStore
+from src.library.storage_writer import StorageWriter
 from src.library.tor_session import TorSession
+from src.library.tor_session_pool import TorSessionPool
 from src.library.bisq.price_node import PriceNode
 from src.price_node_monitor import PriceNodeMonitor
 from src.web_app import WebApp
@@ -24,9 +34,25 @@ def main():
     if args.config_file and os.path.isfile(args.config_file):
         load_config_from_file(args.config_file)
 
-    tor_session = TorSession()
-    tor_session.socks5_host = Configuration.socks5_host
-    tor_session.socks5_port = Configuration.socks5_port
+    response_cache = ResponseCache(Configuration.response_cache_window)
+    tor_session_class = AsyncTorSession if Configuration.poll_engine == "asyncio" else TorSession
+
+    def create_tor_session(socks5_username=None, socks5_password=None):
+        return tor_session_class(Configuration.socks5_host, Configuration.socks5_port, Configuration.connect_timeout,
+                                 Configuration.read_timeout, response_cache, socks5_username, socks5_password)
+
+    if Configuration.tor_circuits > 1:
+        tor_session = TorSessionPool(create_tor_session, Configuration.tor_circuits, Configuration.tor_circuit_strategy,
+                                     Configuration.tor_circuit_rotation_factor)
+    else:
+        tor_session = create_tor_session()
+
+    request_hedger = None
+    if Configuration.request_hedging:
+        if Configuration.tor_circuits > 1:
+            request_hedger = RequestHedger(Configuration.request_hedging_percentile, Configuration.request_hedging_max_rate)
+        else:
+            log.warning("Request hedging requires more than one TOR circuit; it is disabled")
 
     resource_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir, "resources")
     if not os.path.isdir(resource_path):
@@ -40,15 +66,54 @@ def main():
     for monitored_market in Configuration.monitored_markets:
         monitored_markets.append(monitored_market)
 
+    change_filter = ChangeFilter(Configuration.database_heartbeat_interval) if Configuration.database_change_only else None
+    storage_writer = StorageWriter(Configuration.database.engine, Configuration.database_batch_size, Configuration.database_flush_interval,
+                                   change_filter=change_filter)
+    storage_writer.start()
+
+    retention_job = RetentionJob(Configuration.database.engine, {"raw": Configuration.retention_raw_days, "1m": Configuration.retention_1m_days,
+                                                                 "1h": Configuration.retention_1h_days, "1d": Configuration.retention_1d_days},
+                                 Configuration.retention_interval, dry_run=Configuration.retention_dry_run,
+                                 reader_engine=Configuration.database.reader_engine)
+    retention_job.start()
+
+    history_sink = HistorySink(resource_path, Configuration.csv_flush_interval, Configuration.csv_fsync,
+                               int(Configuration.csv_rotation_size * 2 ** 20), Configuration.csv_rotation_daily, Configuration.csv_compression)
+
+    segment_store = None
+    if Configuration.segment_store:
+        segment_store = SegmentStore(os.path.join(resource_path, "segments"), Configuration.segment_capacity, writable=True)
+
     log.info("Starting price node monitor")
     log.info("Price nodes: {}".format(price_nodes))
     log.info("Monitored markets: {}".format(monitored_markets))
-    price_node_monitor = PriceNodeMonitor(tor_session, price_nodes, monitored_markets, Configuration.poll_interval, resource_path)
+    price_node_monitor = PriceNodeMonitor(tor_session, price_nodes, monitored_markets, Configuration.poll_interval, resource_path,
+                                          poll_concurrency=Configuration.poll_concurrency, poll_engine=Configuration.poll_engine,
+                                          poll_deadline=Configuration.poll_deadline,
+                                          circuit_breaker_threshold=Configuration.circuit_breaker_threshold,
+                                          circuit_breaker_cooldown=Configuration.circuit_breaker_cooldown,
+                                          circuit_breaker_max_cooldown=Configuration.circuit_breaker_max_cooldown,
+                                          poll_jitter=Configuration.poll_jitter, poll_max_backoff=Configuration.poll_max_backoff,
+                                          request_hedger=request_hedger, history_capacity=Configuration.history_capacity,
+                                          drift_alpha=Configuration.drift_alpha, drift_threshold=Configuration.drift_threshold,
+                                          drift_warmup=Configuration.drift_warmup, storage_writer=storage_writer,
+                                          history_sink=history_sink, segment_store=segment_store)
     price_node_monitor.start()
 
-    log.info("Starting web application")
-    web_app = WebApp(Configuration.web_host, Configuration.web_port)
-    web_app.run()
+    try:
+        log.info("Starting web application")
+        web_app = WebApp(Configuration.web_host, Configuration.web_port, price_node_monitor.history, price_node_monitor.consensus,
+                         Rollups(Configuration.database.reader_engine), Configuration.database, change_filter)
+        web_app.run()
+    finally:
+        # The monitor is stopped first so that its last cycle is queued, then the writer writes the queued cycles before stopping
+        log.info("Stopping price node monitor")
+        price_node_monitor.stop()
+        price_node_monitor.join()
+        storage_writer.stop()
+        retention_job.stop()
+        storage_writer.join()
+        retention_job.join()
 
 
 if __name__ == "__main__":
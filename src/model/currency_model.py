@@ -0,0 +1,34 @@
+import json
+
+from sqlalchemy import Column
+from sqlalchemy.types import Integer, String
+
+from src.model.base_model import Base
+
+
+class CurrencyModel(Base):
+    __tablename__ = 'currency'
+
+    id = Column(Integer, primary_key=True)
+    code = Column(String, nullable=False, unique=True)
+
+    def __init__(self, code):
+        self.code = code
+
+    def to_dict(self):
+        return {"id": self.id, "code": self.code}
+
+    @staticmethod
+    def parse(**kwargs):
+        return CurrencyModel(kwargs['code'])
+
+    def __str__(self):
+        return json.dumps(self.to_dict())
+
+    def __repr__(self):
+        return json.dumps(self.to_dict())
+
+    def __eq__(self, other):
+        if isinstance(other, CurrencyModel):
+            return self.code == other.code
+        return False
@@ -1,44 +1,45 @@
-import datetime
 import json
 
-from sqlalchemy import Column, ForeignKey
-from sqlalchemy.types import BigInteger, Integer, String, DateTime
+from sqlalchemy import Column, ForeignKey, Index
+from sqlalchemy.types import BigInteger, Float, Integer
 
-from src.library.bisq.price_node import PriceNode
 from src.model.base_model import Base
 
 
 class FeeRateModel(Base):
     __tablename__ = 'fee_rate'
+    __table_args__ = (Index('ix_fee_rate_currency_node_timestamp', 'currency_id', 'price_node_id', 'timestamp', unique=True),)
 
     id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
-    price_node_address = Column(String, ForeignKey("price_node.address"), nullable=False)
-    currency = Column(String, nullable=False)
-    price = Column(String, nullable=False)
-    timestamp = Column(DateTime(timezone=False), nullable=False)
-
-    def __init__(self, price_node, currency, price, timestamp):
-        if not isinstance(price_node, PriceNode):
-            raise TypeError("'price_node' in fee_rate must be an instance of PriceNode")
-        if not isinstance(timestamp, datetime.datetime):
-            raise TypeError("'timestamp' in fee_rate must be an instance of datetime")
-        self.price_node = price_node
-        self.currency = currency
+    price_node_id = Column(Integer, ForeignKey("price_node.id"), nullable=False)
+    currency_id = Column(Integer, ForeignKey("currency.id"), nullable=False)
+    price = Column(Float, nullable=False)
+    timestamp = Column(Integer, nullable=False)     # seconds since the epoch at which the node was polled
+    provider_timestamp = Column(Integer)            # seconds since the epoch at which the fee was estimated
+
+    def __init__(self, price_node_id, currency_id, price, timestamp, provider_timestamp=None):
+        if not isinstance(timestamp, int):
+            raise TypeError("'timestamp' in fee_rate must be an integer number of seconds since the epoch")
+        self.price_node_id = price_node_id
+        self.currency_id = currency_id
         self.price = price
         self.timestamp = timestamp
+        self.provider_timestamp = provider_timestamp
 
     def to_dict(self):
-        return {"price_node": self.price_node,
-                "currency": self.currency,
+        return {"price_node_id": self.price_node_id,
+                "currency_id": self.currency_id,
                 "price": self.price,
-                "timestamp": self.timestamp}
+                "timestamp": self.timestamp,
+                "provider_timestamp": self.provider_timestamp}
 
     @staticmethod
     def parse(**kwargs):
-        return FeeRateModel(kwargs['price_node'],
-                            kwargs['currency'],
+        return FeeRateModel(kwargs['price_node_id'],
+                            kwargs['currency_id'],
                             kwargs['price'],
-                            kwargs['timestamp'])
+                            kwargs['timestamp'],
+                            kwargs.get('provider_timestamp', None))
 
     def __str__(self):
         return json.dumps(self.to_dict())
@@ -48,8 +49,8 @@ class FeeRateModel(Base):
 
     def __eq__(self, other):
         if isinstance(other, FeeRateModel):
-            if self.price_node == other.price_node and \
-                    self.currency == other.currency and \
+            if self.price_node_id == other.price_node_id and \
+                    self.currency_id == other.currency_id and \
                     self.price == other.price and \
                     self.timestamp == other.timestamp:
                 return True
@@ -1,6 +1,8 @@
 import json
+import threading
 
 from sqlalchemy import Column
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.types import Integer, String
 
 from src.model.base_model import Base
@@ -9,15 +11,20 @@ from src.model.base_model import Base
 class PriceNodeModel(Base):
     __tablename__ = 'price_node'
 
-    address = Column(String, primary_key=True)
+    id = Column(Integer, primary_key=True)
+    address = Column(String, nullable=False, unique=True)
     operator = Column(String)
 
+    # In-process cache of the registered nodes by address, so that they are looked up without a round trip to the database
+    __cache = {}
+    __cache_lock = threading.Lock()
+
     def __init__(self, address, operator=""):
         self.address = address
         self.operator = operator
 
     def to_dict(self):
-        return {"address": self.address, "operator": self.operator}
+        return {"id": self.id, "address": self.address, "operator": self.operator}
 
     @staticmethod
     def parse(**kwargs):
@@ -36,13 +43,38 @@ class PriceNodeModel(Base):
             return self.address == other.address
         return False
 
+    @classmethod
+    def upsert(cls, connection, price_nodes):
+        """
+        Registers price nodes with a single statement, inserting the new ones and updating the operator of the existing ones,
+        and caches them by address.
+        @param (sqlalchemy.engine.Connection) connection: A connection to the database, in a transaction.
+        @param (list) price_nodes: The PriceNode (or PriceNodeModel) objects to register.
+        @return (dict): The id of each registered address.
+        """
+        values = dict((x.address, x.operator) for x in price_nodes)
+        if not values:
+            return {}
+        statement = insert(cls.__table__).values([{"address": address, "operator": operator} for address, operator in values.items()])
+        statement = statement.on_conflict_do_update(index_elements=[cls.__table__.c.address],
+                                                    set_={"operator": statement.excluded.operator})
+        rows = connection.execute(statement.returning(cls.__table__.c.id, cls.__table__.c.address, cls.__table__.c.operator)).all()
+        with cls.__cache_lock:
+            for id_, address, operator in rows:
+                price_node = PriceNodeModel(address, operator)
+                price_node.id = id_
+                cls.__cache[address] = price_node
+        return dict((address, id_) for id_, address, _ in rows)
+
+    @classmethod
+    def get_cached(cls, address):
+        """Returns the registered node of an address, None if it is not registered."""
+        return cls.__cache.get(address, None)
+
     @staticmethod
     def factory(address, operator=None):
-        if operator:
-            price_node = PriceNodeModel.query.filter_by(address=address, operator=operator).first()
-        else:
-            price_node = PriceNodeModel.query.filter_by(address=address).first()
-        if price_node:
+        price_node = PriceNodeModel.get_cached(address)
+        if price_node and (not operator or price_node.operator == operator):
             return price_node
         else:
             return PriceNodeModel(address, operator)
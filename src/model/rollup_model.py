@@ -0,0 +1,81 @@
+import json
+
+from sqlalchemy import Column, ForeignKey, PrimaryKeyConstraint
+from sqlalchemy.orm import declared_attr
+from sqlalchemy.types import Float, Integer
+
+from src.model.base_model import Base
+
+
+class RollupMixin(object):
+    """
+    Columns of a rollup table, which aggregates the prices of a node and currency (btc for the transaction fee) per time bucket.
+    Cycles counts the poll cycles of the bucket and count the ones in which the node reported a price, so that their ratio is
+    the availability of the node.
+    """
+    RESOLUTION = None   # length of a bucket, in seconds
+
+    @declared_attr
+    def __table_args__(cls):
+        return (PrimaryKeyConstraint('currency_id', 'price_node_id', 'bucket'),)
+
+    @declared_attr
+    def price_node_id(cls):
+        return Column(Integer, ForeignKey("price_node.id"), nullable=False)
+
+    @declared_attr
+    def currency_id(cls):
+        return Column(Integer, ForeignKey("currency.id"), nullable=False)
+
+    bucket = Column(Integer, nullable=False)            # seconds since the epoch at which the bucket starts
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    mean = Column(Float)
+    count = Column(Integer, nullable=False)
+    cycles = Column(Integer, nullable=False)
+    open_timestamp = Column(Integer)                    # seconds since the epoch of the open price
+    close_timestamp = Column(Integer)                   # seconds since the epoch of the close price
+
+    @property
+    def availability(self):
+        return float(self.count) / self.cycles if self.cycles else None
+
+    def to_dict(self):
+        return {"price_node_id": self.price_node_id,
+                "currency_id": self.currency_id,
+                "bucket": self.bucket,
+                "open": self.open,
+                "high": self.high,
+                "low": self.low,
+                "close": self.close,
+                "mean": self.mean,
+                "count": self.count,
+                "cycles": self.cycles}
+
+    def __str__(self):
+        return json.dumps(self.to_dict())
+
+    def __repr__(self):
+        return json.dumps(self.to_dict())
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.to_dict() == other.to_dict()
+        return False
+
+
+class MinuteRollupModel(RollupMixin, Base):
+    __tablename__ = 'rollup_1m'
+    RESOLUTION = 60
+
+
+class HourRollupModel(RollupMixin, Base):
+    __tablename__ = 'rollup_1h'
+    RESOLUTION = 3600
+
+
+class DayRollupModel(RollupMixin, Base):
+    __tablename__ = 'rollup_1d'
+    RESOLUTION = 86400
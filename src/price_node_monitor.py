@@ -1,14 +1,27 @@
+import asyncio
 import csv
+import functools
 import logging
 import os
 import threading
 import time
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
 
 import numpy
 
 from src.library.bisq.price_node import PriceNode
+from src.library.circuit_breaker import CircuitBreaker, CircuitState
 from src.library.configuration import Configuration
+from src.library.drift_detector import DriftDetector
+from src.library.exceptions import CircuitBreakerOpen, PollDeadlineExceeded
+from src.library.history_sink import HistorySink
+from src.library.price_analysis import PriceAnalysis
+from src.library.request_hedger import AsyncHedgedTorSession, HedgedTorSession
+from src.library.scheduler import PollScheduler
+from src.library.snapshot_buffer import SnapshotBuffer
+from src.library.tor_session_pool import TorSessionPool
 from src.model.price_node_model import PriceNodeModel
 
 log = logging.getLogger(__name__)
@@ -19,20 +32,43 @@ class PriceNodeMonitor(threading.Thread):
 
     MAX_MARKET_PRICE_DEVIATION_PERCENTAGE = 2
     MAX_TX_FEE_DEVIATION_PERCENTAGE = 10
+    TIMED_OUT_VALUE = "timeout"
+    ENDPOINTS = ("version", "fees", "marketPrices")
+    DRIFT_STATE_FILENAME = "drift_state.npz"
 
-    def __init__(self, tor_session, price_nodes, monitored_markets, poll_interval, resource_path):
+    def __init__(self, tor_session, price_nodes, monitored_markets, poll_interval, resource_path, poll_concurrency=1, poll_engine="threads",
+                 poll_deadline=None, circuit_breaker_threshold=3, circuit_breaker_cooldown=240, circuit_breaker_max_cooldown=7680,
+                 poll_jitter=0, poll_max_backoff=1, request_hedger=None,
+                 history_capacity=720, drift_alpha=0.1, drift_threshold=4.0, drift_warmup=10,
+                 storage_writer=None, history_sink=None, segment_store=None):
         super(PriceNodeMonitor, self).__init__(name="PriceNodeMonitor")
         self.__tor_session = tor_session
         self.__price_nodes = price_nodes
         self.__monitored_markets = monitored_markets
         self.__poll_interval = poll_interval
         self.__resource_path = resource_path
-        self.__historical_fee_rates = []
-        self.__historical_market_prices = []
+        self.__poll_concurrency = max(1, poll_concurrency)
+        self.__poll_engine = poll_engine
+        self.__poll_deadline = poll_deadline
+        self.__last_cycle_partial = False
+        self.__circuit_breakers = dict((x.address, CircuitBreaker(x.address, circuit_breaker_threshold, circuit_breaker_cooldown,
+                                                                  circuit_breaker_max_cooldown))
+                                       for x in price_nodes)
+        self.__scheduler = PollScheduler(poll_interval, poll_jitter, poll_max_backoff)
+        self.__request_hedger = request_hedger
+        self.__storage_writer = storage_writer
+        self.__history_sink = HistorySink(resource_path) if history_sink is None else history_sink
+        self.__segment_store = segment_store
+        self.__last_results = {}
+        self.__history = SnapshotBuffer(history_capacity, [x.address for x in price_nodes],
+                                        ["btcTxFee"] + [x.lower() + "MarketPrice" for x in monitored_markets])
+        self.__consensus = SnapshotBuffer(history_capacity, PriceAnalysis.CONSENSUS_STATISTICS, self.__history.columns)
+        self.__drift_detector = DriftDetector(self.__history.rows, self.__history.columns, drift_alpha, drift_threshold, drift_warmup)
+        if self.__drift_detector.load(os.path.join(resource_path, self.DRIFT_STATE_FILENAME)):
+            log.info("Resumed the drift statistics from {}".format(self.DRIFT_STATE_FILENAME))
         self.is_running = False
-        for price_node in price_nodes:
-            Configuration.database.session.add(PriceNodeModel(price_node.address, price_node.operator))
-        Configuration.database.session.commit()
+        with Configuration.database.engine.begin() as connection:
+            PriceNodeModel.upsert(connection, price_nodes)
 
     @property
     def tor_session(self):
@@ -54,105 +90,415 @@ class PriceNodeMonitor(threading.Thread):
     def resource_path(self):
         return self.__resource_path
 
+    @property
+    def poll_concurrency(self):
+        return self.__poll_concurrency
+
+    @property
+    def poll_engine(self):
+        return self.__poll_engine
+
+    @property
+    def poll_deadline(self):
+        return self.__poll_deadline
+
+    @property
+    def last_cycle_partial(self):
+        return self.__last_cycle_partial
+
+    @property
+    def circuit_breakers(self):
+        """The circuit breaker of each price node, keyed by node address."""
+        return self.__circuit_breakers
+
+    @property
+    def scheduler(self):
+        return self.__scheduler
+
+    @property
+    def request_hedger(self):
+        return self.__request_hedger
+
+    @property
+    def storage_writer(self):
+        return self.__storage_writer
+
+    @property
+    def history_sink(self):
+        return self.__history_sink
+
+    @property
+    def segment_store(self):
+        return self.__segment_store
+
+    @property
+    def history(self):
+        """The prices of the most recent poll cycles, shared with the web API."""
+        return self.__history
+
+    @property
+    def consensus(self):
+        """The consensus of the nodes (median, trimmed mean, spread and number of reporting nodes) of the most recent poll cycles."""
+        return self.__consensus
+
+    @property
+    def drift_detector(self):
+        return self.__drift_detector
+
     def run(self):
         self.is_running = True
+        for price_node in self.price_nodes:
+            for endpoint in self.ENDPOINTS:
+                self.scheduler.add((price_node.address, endpoint))
         while self.is_running:
+            due_requests = self.scheduler.wait_for_due()
+            if not due_requests:
+                break
             try:
-                price_data = self.fetch_price_data()
-                self.analyze_price_data(price_data)
-                self.write_price_data_to_csv(self.resource_path, "current_price_data.csv", price_data)
-                self.write_fee_rates_to_csv(self.resource_path, "historical_fee_rates.csv", price_data)
-                self.write_exchange_rates_to_csv(self.resource_path, "historical_exchange_rates.csv", price_data)
+                price_data = self.fetch_price_data(due_requests)
+                analysis = self.analyze_price_data(price_data)
+                cycle_timestamp = time.time()
+                self.history.append(cycle_timestamp, analysis.prices)
+                self.consensus.append(cycle_timestamp, analysis.consensus)
+                if self.storage_writer is not None:
+                    self.storage_writer.submit(cycle_timestamp, price_data)
+                if self.segment_store is not None:
+                    self.segment_store.append_price_data(cycle_timestamp, price_data)
+                self.detect_drift(analysis)
+                self.write_price_data_to_csv("current_price_data.csv", price_data)
+                self.write_fee_rates_to_csv("historical_fee_rates.csv", cycle_timestamp, price_data)
+                self.write_exchange_rates_to_csv("historical_exchange_rates.csv", cycle_timestamp, price_data)
+                self.write_consensus_to_csv("historical_consensus.csv", cycle_timestamp, analysis)
             except Exception as e:
                 log.error(e)
-            time.sleep(self.poll_interval)
+            for address, endpoint in due_requests:
+                self.scheduler.reschedule((address, endpoint), self.__get_provider_timestamp(address, endpoint))
+            if isinstance(self.tor_session, TorSessionPool):
+                self.tor_session.rotate_slow_circuits()
+            if self.request_hedger is not None:
+                log.debug("Request hedging statistics: {}".format(self.request_hedger.statistics))
+        self.history_sink.close()
+        if self.segment_store is not None:
+            self.segment_store.close()
 
     def stop(self):
         self.is_running = False
+        self.scheduler.stop()
 
-    def fetch_price_data(self):
+    def fetch_price_data(self, due_requests=None):
+        """
+        Polls the price nodes.
+        @param (list) due_requests: (node address, endpoint) pairs to request; other endpoints reuse their last result. All if None.
+        @return (list): The price data of each node.
+        """
+        cycle_start = time.monotonic()
+        if due_requests is None:
+            due_endpoints = dict((x.address, set(self.ENDPOINTS)) for x in self.price_nodes)
+        else:
+            due_endpoints = dict((x.address, set()) for x in self.price_nodes)
+            for address, endpoint in due_requests:
+                due_endpoints[address].add(endpoint)
+        if self.poll_engine == "asyncio":
+            price_data = asyncio.run(self.__fetch_price_data_asynchronously(cycle_start, due_endpoints))
+        elif self.poll_concurrency > 1:
+            price_data = self.__fetch_price_data_concurrently(cycle_start, due_endpoints)
+        else:
+            price_data = self.__fetch_price_data_sequentially(cycle_start, due_endpoints)
+        self.__last_cycle_partial = any(x['timedOut'] for x in price_data)
+        if self.__last_cycle_partial:
+            log.warning("Poll cycle exceeded its deadline of {}s; partial data for {}".format(
+                self.poll_deadline, [x['nodeAddress'] for x in price_data if x['timedOut']]))
+        return price_data
+
+    def __get_provider_timestamp(self, address, endpoint):
+        """Returns the latest provider timestamp of the last successful request to an endpoint, or None if it has none."""
+        result = self.__last_results.get((address, endpoint), None)
+        if not isinstance(result, Mapping) or not result:
+            return None
+        if endpoint == "marketPrices":
+            # Avoids decoding the exchange rates of the markets that are not monitored
+            timestamps = [result[x.upper()].timestamp for x in self.monitored_markets if x.upper() in result]
+            return max(timestamps) if timestamps else None
+        return max(x.timestamp for x in result.values())
+
+    def __get_tor_session(self, price_node):
+        """
+        Returns the session to poll a node through, i.e. its circuit if the monitor uses a TorSessionPool.
+        With a request hedger, slow requests are duplicated over the next circuit of the pool.
+        """
+        if not isinstance(self.tor_session, TorSessionPool):
+            return self.tor_session
+        tor_session = self.tor_session.get_session(price_node.address)
+        hedge_session = self.tor_session.get_alternate_session(tor_session)
+        if self.request_hedger is None or hedge_session is None:
+            return tor_session
+        if self.poll_engine == "asyncio":
+            return AsyncHedgedTorSession(tor_session, hedge_session, self.request_hedger)
+        return HedgedTorSession(tor_session, hedge_session, self.request_hedger)
+
+    def __get_remaining_cycle_time(self, cycle_start):
+        if not self.poll_deadline:
+            return None
+        return max(0, self.poll_deadline - (time.monotonic() - cycle_start))
+
+    def __fetch_price_data_sequentially(self, cycle_start, due_endpoints):
         price_data = []
         for price_node in self.price_nodes:
-            if price_node.is_online(self.tor_session):
-                node_version = price_node.get_version(self.tor_session)
-                fees = price_node.get_current_fees(self.tor_session)
-                all_market_prices = price_node.get_current_market_prices(self.tor_session)
+            requests = self.__get_node_requests(price_node, due_endpoints[price_node.address])
+            tor_session = self.__get_tor_session(price_node)
+            if self.__get_remaining_cycle_time(cycle_start) == 0:
+                results = [PollDeadlineExceeded()] * 3
+            elif isinstance(requests[0], CircuitBreakerOpen):
+                results = requests
             else:
-                log.warning("Offline node: {}".format(price_node))
-                node_version = None
-                fees = {}
-                all_market_prices = {}
-            data = {
-                'nodeAddress': price_node.address,
-                'nodeVersion': node_version,
-                'btcTxFee': fees.get('btc', None)}
-            for market in self.monitored_markets:
-                data[market.lower() + "MarketPrice"] = all_market_prices.get(market.upper(), None)
-            price_data.append(data)
+                is_online = self.__call_request(price_node.is_online, tor_session)
+                if isinstance(is_online, Exception):
+                    results = [is_online] + [CircuitBreakerOpen()] * 2
+                elif not is_online:
+                    results = [ConnectionError("{} did not respond".format(price_node))] + [CircuitBreakerOpen()] * 2
+                else:
+                    results = [self.__call_request(x, tor_session) if callable(x) else x for x in requests]
+            price_data.append(self.__create_price_data_entry_from_results(price_node, *results))
         return price_data
 
+    @staticmethod
+    def __call_request(request, tor_session):
+        """Calls a request, returning its exception rather than raising it, as the concurrent engines do with their results."""
+        try:
+            return request(tor_session)
+        except Exception as e:
+            return e
+
+    def __get_node_requests(self, price_node, endpoints, asynchronous=False):
+        """
+        Returns the requests to poll a node with, according to the state of its circuit breaker and the endpoints that are due.
+        Requests that must be skipped are given as a CircuitBreakerOpen exception instead, and requests that are not due as None.
+        """
+        circuit_state = self.circuit_breakers[price_node.address].allow_request()
+        # Only the exchange rates of the monitored markets are decoded from the market prices
+        currencies = [x.upper() for x in self.monitored_markets]
+        if asynchronous:
+            requests = [price_node.get_version_async, price_node.get_current_fees_async,
+                        functools.partial(price_node.get_current_market_prices_async, currencies=currencies)]
+        else:
+            requests = [price_node.get_version, price_node.get_current_fees,
+                        functools.partial(price_node.get_current_market_prices, currencies=currencies)]
+        if circuit_state == CircuitState.open:
+            return [CircuitBreakerOpen()] * 3
+        if circuit_state == CircuitState.half_open:
+            return requests[:1] + [CircuitBreakerOpen()] * 2
+        return [request if endpoint in endpoints else None for endpoint, request in zip(self.ENDPOINTS, requests)]
+
+    def __fetch_price_data_concurrently(self, cycle_start, due_endpoints):
+        """Fans out every endpoint request of every node over a bounded worker pool, so a cycle takes as long as the slowest node."""
+        pending_requests = []
+        executor = ThreadPoolExecutor(max_workers=self.poll_concurrency, thread_name_prefix="PriceNodeFetch")
+        try:
+            for price_node in self.price_nodes:
+                tor_session = self.__get_tor_session(price_node)
+                pending_requests.append((price_node, [executor.submit(x, tor_session) if callable(x) else x
+                                                      for x in self.__get_node_requests(price_node, due_endpoints[price_node.address])]))
+            wait([x for _, requests in pending_requests for x in requests if isinstance(x, Future)],
+                 timeout=self.__get_remaining_cycle_time(cycle_start))
+        finally:
+            # Requests that are still queued are cancelled; running ones are bounded by the session timeouts and their results are dropped
+            executor.shutdown(wait=False, cancel_futures=True)
+        return [self.__create_price_data_entry_from_results(price_node, *[self.__get_request_result(x) for x in requests])
+                for price_node, requests in pending_requests]
+
+    async def __fetch_price_data_asynchronously(self, cycle_start, due_endpoints):
+        """Same fan out as __fetch_price_data_concurrently, but on a single event loop using the AsyncTorSession."""
+        semaphore = asyncio.Semaphore(self.poll_concurrency)
+
+        async def limit_concurrency(coroutine):
+            async with semaphore:
+                return await coroutine
+
+        node_tasks = []
+        for price_node in self.price_nodes:
+            tor_session = self.__get_tor_session(price_node)
+            node_tasks.append((price_node, [asyncio.ensure_future(limit_concurrency(x(tor_session))) if callable(x) else x
+                                            for x in self.__get_node_requests(price_node, due_endpoints[price_node.address], asynchronous=True)]))
+        tasks = [x for _, node_requests in node_tasks for x in node_requests if isinstance(x, asyncio.Future)]
+        if tasks:
+            _, pending_tasks = await asyncio.wait(tasks, timeout=self.__get_remaining_cycle_time(cycle_start))
+            for task in pending_tasks:
+                task.cancel()
+            await asyncio.gather(*pending_tasks, return_exceptions=True)
+        return [self.__create_price_data_entry_from_results(price_node, *[self.__get_task_result(x) for x in node_requests])
+                for price_node, node_requests in node_tasks]
+
+    @staticmethod
+    def __get_request_result(request):
+        if not isinstance(request, Future):
+            return request
+        if not request.done() or request.cancelled():
+            return PollDeadlineExceeded()
+        try:
+            return request.result()
+        except Exception as e:
+            return e
+
+    @staticmethod
+    def __get_task_result(task):
+        if not isinstance(task, asyncio.Future):
+            return task
+        if task.cancelled():
+            return PollDeadlineExceeded()
+        if task.exception():
+            return task.exception()
+        return task.result()
+
+    def __create_price_data_entry_from_results(self, price_node, node_version, fees, all_market_prices):
+        """
+        Creates the price data of a node from request results, where a failed request is given as its exception.
+        Requests that did not complete before the cycle deadline are listed in 'timedOut'.
+        The outcome of the version request, which is also the probe of a half-open circuit, is recorded by the node's circuit breaker.
+        Requests that were not due are given as None and resolved to the last successful result of the endpoint.
+        """
+        version_requested = node_version is not None
+        node_version, fees, all_market_prices = self.__resolve_cached_results(price_node, [node_version, fees, all_market_prices])
+        circuit_breaker = self.circuit_breakers[price_node.address]
+        if isinstance(node_version, CircuitBreakerOpen):
+            log.info("Skipping node {}; circuit breaker is open, next probe in {:.0f}s".format(price_node, circuit_breaker.retry_in))
+            return self.__create_price_data_entry(price_node, None, {}, {})
+        if isinstance(node_version, ConnectionError):
+            log.debug(node_version)
+            log.warning("Offline node: {}".format(price_node))
+            circuit_breaker.record_failure(str(node_version))
+            return self.__create_price_data_entry(price_node, None, {}, {})
+        timed_out = []
+        if isinstance(node_version, PollDeadlineExceeded):
+            circuit_breaker.record_failure("no response within the poll deadline")
+            timed_out.append('nodeVersion')
+            node_version = None
+        elif isinstance(node_version, Exception):
+            # The node answered, but not with its version, which does not count as a successful probe
+            log.error("Failed to fetch version from {}: {}".format(price_node, node_version))
+            circuit_breaker.record_failure(str(node_version))
+            node_version = None
+        elif version_requested:
+            circuit_breaker.record_success()
+        if isinstance(fees, CircuitBreakerOpen):
+            fees = {}
+        elif isinstance(fees, PollDeadlineExceeded):
+            timed_out.append('btcTxFee')
+            fees = {}
+        elif isinstance(fees, Exception):
+            log.error("Failed to fetch fees from {}: {}".format(price_node, fees))
+            fees = {}
+        if isinstance(all_market_prices, CircuitBreakerOpen):
+            all_market_prices = {}
+        elif isinstance(all_market_prices, PollDeadlineExceeded):
+            timed_out.extend([x.lower() + "MarketPrice" for x in self.monitored_markets])
+            all_market_prices = {}
+        elif isinstance(all_market_prices, Exception):
+            log.error("Failed to fetch market prices from {}: {}".format(price_node, all_market_prices))
+            all_market_prices = {}
+        return self.__create_price_data_entry(price_node, node_version, fees, all_market_prices, timed_out)
+
+    def __resolve_cached_results(self, price_node, results):
+        resolved_results = []
+        for endpoint, result in zip(self.ENDPOINTS, results):
+            key = (price_node.address, endpoint)
+            if result is None:
+                result = self.__last_results.get(key, {})
+            elif isinstance(result, Exception):
+                self.__last_results.pop(key, None)
+            else:
+                self.__last_results[key] = result
+            resolved_results.append(result)
+        return resolved_results
+
+    def __create_price_data_entry(self, price_node, node_version, fees, all_market_prices, timed_out=()):
+        data = {
+            'nodeAddress': price_node.address,
+            'nodeVersion': node_version,
+            'btcTxFee': fees.get('btc', None),
+            'timedOut': list(timed_out),
+            'circuitState': self.circuit_breakers[price_node.address].state.name}
+        for market in self.monitored_markets:
+            data[market.lower() + "MarketPrice"] = all_market_prices.get(market.upper(), None)
+        return data
+
     def analyze_price_data(self, price_data):
-        btc_tx_fees = [x['btcTxFee'].price if 'btcTxFee' in x and x['btcTxFee'] else -1 for x in price_data]
-        if len(set(btc_tx_fees)) > 1:
-            min_fee = numpy.amin(btc_tx_fees)
-            max_fee = numpy.amax(btc_tx_fees)
-            deviation = ((float(max_fee) - min_fee) / min_fee) * 100
-            if deviation > self.MAX_TX_FEE_DEVIATION_PERCENTAGE:
-                nodes_with_fees = [(x['nodeAddress'], x.get('btcTxFee', None)) for x in price_data]
-                log.warning("BTC transaction fee deviates between nodes by more than {}% ({:.2f}%); {}".format(self.MAX_TX_FEE_DEVIATION_PERCENTAGE, deviation,
-                                                                                                               nodes_with_fees))
+        """
+        Warns about the BTC transaction fee and monitored market prices that deviate between the nodes by more than allowed.
+        Nodes without a price, because they are offline or timed out, are left out.
+        @param (list) price_data: The price data of each node.
+        @return (PriceAnalysis): The analysis of the price data.
+        """
         monitored_market_keys = [x.lower() + "MarketPrice" for x in self.monitored_markets]
-        for market in monitored_market_keys:
-            market_prices = [x[market].price if market in x and x[market] else -1 for x in price_data]
-            if len(set(market_prices)) > 1:
-                min_price = numpy.amin(market_prices)
-                max_price = numpy.amax(market_prices)
-                deviation = ((float(max_price) - min_price) / min_price) * 100
-                if deviation > self.MAX_MARKET_PRICE_DEVIATION_PERCENTAGE:
-                    nodes_with_market_price = [(x['nodeAddress'], x.get(market, None)) for x in price_data]
-                    log.warning(
-                        "Market price deviates between nodes by more than {}% ({:.2f}%) for {}; {}".format(self.MAX_MARKET_PRICE_DEVIATION_PERCENTAGE,
-                                                                                                           deviation, market,
-                                                                                                           nodes_with_market_price))
-
-    def write_price_data_to_csv(self, resource_path, filename, price_data):
-        with open(os.path.join(resource_path, filename), "w", newline="") as csv_file:
-            writer = csv.writer(csv_file)
-            monitored_market_keys = [x.lower() + "MarketPrice" for x in self.monitored_markets]
-            writer.writerow(["nodeAddress", "nodeVersion", "btcTxFee"] + monitored_market_keys)
-            for data in price_data:
-                writer.writerow([data['nodeAddress'], data['nodeVersion'], data['btcTxFee']] + [data[x] for x in monitored_market_keys])
-
-    def write_fee_rates_to_csv(self, resource_path, filename, price_data):
+        analysis = PriceAnalysis.from_price_data(price_data, ["btcTxFee"] + monitored_market_keys)
+        max_deviations = self.__get_max_deviation_percentages()
+        for index in analysis.get_deviating_columns(max_deviations):
+            column = analysis.columns[index]
+            nodes_with_prices = [(x['nodeAddress'], x.get(column, None)) for x in price_data]
+            if column == "btcTxFee":
+                log.warning("BTC transaction fee deviates between nodes by more than {}% ({:.2f}%); {}".format(
+                    self.MAX_TX_FEE_DEVIATION_PERCENTAGE, analysis.deviation[index], nodes_with_prices))
+            else:
+                log.warning("Market price deviates between nodes by more than {}% ({:.2f}%) for {}; {}".format(
+                    self.MAX_MARKET_PRICE_DEVIATION_PERCENTAGE, analysis.deviation[index], column, nodes_with_prices))
+        return analysis
+
+    def detect_drift(self, analysis):
+        """
+        Warns about the nodes whose prices drift from their own history or from the consensus of the nodes, and saves the
+        rolling statistics so that a restart resumes them.
+        @param (PriceAnalysis) analysis: The analysis of the price data of the poll cycle.
+        """
+        for address, column, reason in self.drift_detector.update(analysis.prices, self.__get_max_deviation_percentages()):
+            log.warning("{} of {} drifts: {}".format(column, address, reason))
+        self.drift_detector.save(os.path.join(self.resource_path, self.DRIFT_STATE_FILENAME))
+
+    def __get_max_deviation_percentages(self):
+        """Returns the maximum deviation between nodes of the BTC transaction fee and of each monitored market, in percent."""
+        return [self.MAX_TX_FEE_DEVIATION_PERCENTAGE] + [self.MAX_MARKET_PRICE_DEVIATION_PERCENTAGE] * len(self.monitored_markets)
+
+    def write_price_data_to_csv(self, filename, price_data):
+        """Replaces the file of the current price data of each node, atomically."""
+        monitored_market_keys = [x.lower() + "MarketPrice" for x in self.monitored_markets]
+        self.history_sink.replace(filename, ["nodeAddress", "nodeVersion", "btcTxFee"] + monitored_market_keys + ["circuitState"],
+                                  [[data['nodeAddress']] + [self.TIMED_OUT_VALUE if x in data['timedOut'] else data[x]
+                                                            for x in ["nodeVersion", "btcTxFee"] + monitored_market_keys] + [data['circuitState']]
+                                   for data in price_data])
+
+    def write_fee_rates_to_csv(self, filename, timestamp, price_data):
+        """Appends the fee rate of each node to the history file of each fee currency."""
+        header = ["timestamp"] + [x['nodeAddress'] for x in price_data]
+        formatted_timestamp = self.__format_timestamp(timestamp)
         for currency in ['btc']:
-            fee_rate_filename = os.path.join(resource_path, "{}_{}".format(currency.lower(), filename))
-            if not os.path.isfile(fee_rate_filename):
-                with open(fee_rate_filename, "w", newline="") as csv_file:
-                    writer = csv.writer(csv_file)
-                    addresses = [x['nodeAddress'] for x in price_data]
-                    writer.writerow(["timestamp"] + addresses)
-            with open(fee_rate_filename, "a", newline="") as csv_file:
-                writer = csv.writer(csv_file)
-                fee_rates = [datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S') + " UTC"] + [str(x[currency.lower() + 'TxFee'].price)
-                                                                                          if currency.lower() + 'TxFee' in x
-                                                                                             and x[currency.lower() + 'TxFee']
-                                                                                          else -1
-                                                                                          for x in price_data]
-                writer.writerow(fee_rates)
-
-    def write_exchange_rates_to_csv(self, resource_path, filename, price_data):
+            key = currency.lower() + 'TxFee'
+            self.history_sink.write("{}_{}".format(currency.lower(), filename), timestamp, header,
+                                    [formatted_timestamp] + [str(x[key].price) if key in x and x[key]
+                                                             else self.TIMED_OUT_VALUE if key in x['timedOut']
+                                                             else -1
+                                                             for x in price_data])
+
+    def write_exchange_rates_to_csv(self, filename, timestamp, price_data):
+        """Appends the exchange rate of each node to the history file of each monitored market."""
+        header = ["timestamp"] + [x['nodeAddress'] for x in price_data]
+        formatted_timestamp = self.__format_timestamp(timestamp)
         for market in self.monitored_markets:
-            market_filename = os.path.join(resource_path, "{}_{}".format(market.lower(), filename))
-            if not os.path.isfile(market_filename):
-                with open(market_filename, "w", newline="") as csv_file:
-                    writer = csv.writer(csv_file)
-                    addresses = [x['nodeAddress'] for x in price_data]
-                    writer.writerow(["timestamp"] + addresses)
-            with open(market_filename, "a", newline="") as csv_file:
-                writer = csv.writer(csv_file)
-                exchange_rates = [datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S') + " UTC"] + [x[market.lower() + 'MarketPrice'].price
-                                                                                               if market.lower() + 'MarketPrice' in x
-                                                                                                  and x[market.lower() + 'MarketPrice']
-                                                                                               else -1
-                                                                                               for x in price_data]
-                writer.writerow(exchange_rates)
+            key = market.lower() + 'MarketPrice'
+            self.history_sink.write("{}_{}".format(market.lower(), filename), timestamp, header,
+                                    [formatted_timestamp] + [x[key].price if key in x and x[key]
+                                                             else self.TIMED_OUT_VALUE if key in x['timedOut']
+                                                             else -1
+                                                             for x in price_data])
+
+    def write_consensus_to_csv(self, filename, timestamp, analysis):
+        """Appends the consensus of the nodes for the BTC transaction fee and each monitored market to their own file."""
+        statistics = analysis.consensus
+        header = ["timestamp"] + list(PriceAnalysis.CONSENSUS_STATISTICS)
+        formatted_timestamp = self.__format_timestamp(timestamp)
+        for index, column in enumerate(analysis.columns):
+            name = "btc_fee" if column == "btcTxFee" else column[:-len("MarketPrice")]
+            self.history_sink.write("{}_{}".format(name, filename), timestamp, header,
+                                    [formatted_timestamp] + ["" if numpy.isnan(x) else int(x) if statistic == "nodes" else x
+                                                             for statistic, x in zip(PriceAnalysis.CONSENSUS_STATISTICS, statistics[:, index])])
+
+    @staticmethod
+    def __format_timestamp(timestamp):
+        return datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S') + " UTC"
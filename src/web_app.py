@@ -3,12 +3,15 @@ from flask_restful import Api
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 from src.api.chart import Chart
+from src.api.history import History
+from src.api.rollup import Rollup
+from src.api.staleness import Staleness
 from src.views.index import Index
 
 
 class WebApp(object):
 
-    def __init__(self, host, port):
+    def __init__(self, host, port, history=None, consensus=None, rollups=None, database=None, change_filter=None):
         self.host = host
         self.port = port
         self.app = Flask(__name__)
@@ -16,8 +19,19 @@ class WebApp(object):
 
         api = Api(self.app)
         api.add_resource(Chart, '/chart')
+        if history is not None:
+            api.add_resource(History, '/history', resource_class_kwargs={'history': history})
+        if consensus is not None:
+            api.add_resource(History, '/consensus', endpoint='consensus', resource_class_kwargs={'history': consensus, 'row_name': 'statistics'})
+        if rollups is not None:
+            api.add_resource(Rollup, '/rollup', resource_class_kwargs={'rollups': rollups})
+        if change_filter is not None:
+            api.add_resource(Staleness, '/staleness', resource_class_kwargs={'change_filter': change_filter})
 
         self.app.add_url_rule('/', view_func=Index.as_view('index'))
+        if database is not None:
+            # Requests are served from a pool of threads, so the sessions of a request must not outlive it
+            self.app.teardown_appcontext(lambda exception: database.remove_sessions())
 
     def run(self):
         self.app.run(host=self.host, port=self.port)
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import struct
+import unittest
+
+from src.library.async_tor_session import AsyncTorSession
+from src.library.tor_session import IncorrectResponseData
+
+
+class Socks5StandIn(object):
+    """A local SOCKS5 proxy that serves a fixed HTTP response for each host name, standing in for TOR and the price nodes."""
+
+    REFUSED_HOST = "refused.onion"
+
+    def __init__(self, bodies):
+        """
+        @param (dict) bodies: The body of the response of each host name.
+        """
+        self.__bodies = bodies
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.__handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def __handle(self, reader, writer):
+        try:
+            _, method_count = struct.unpack("BB", await reader.readexactly(2))
+            await reader.readexactly(method_count)
+            writer.write(struct.pack("BB", 5, 0))
+            _, _, _, _, host_length = struct.unpack("BBBBB", await reader.readexactly(5))
+            host = (await reader.readexactly(host_length)).decode()
+            await reader.readexactly(2)
+            if host == self.REFUSED_HOST:
+                # Reply 5: connection refused
+                writer.write(struct.pack("BBBB", 5, 5, 0, 1) + bytes(6))
+                return
+            writer.write(struct.pack("BBBB", 5, 0, 0, 1) + bytes(6))
+            await reader.readuntil(b"\r\n\r\n")
+            body = self.__bodies[host]
+            writer.write("HTTP/1.1 200 OK\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(len(body)).encode() + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+class AsyncTorSessionTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.stand_in = Socks5StandIn({"ok.onion": json.dumps({"price": 1.5}).encode(), "garbage.onion": b"<html>not json</html>"})
+        port = await self.stand_in.start()
+        self.session = AsyncTorSession("127.0.0.1", port, connect_timeout=5, read_timeout=5)
+
+    async def asyncTearDown(self):
+        await self.stand_in.stop()
+
+    async def test_get_json_data(self):
+        self.assertEqual(await self.session.get_json_data("http://ok.onion/getAllMarketPrices"), {"price": 1.5})
+        self.assertEqual(self.session.latency.sample_count, 1)
+
+    async def test_refused_connection_raises_connection_error(self):
+        with self.assertRaises(ConnectionError):
+            await self.session.get_json_data("http://{}/getFees".format(Socks5StandIn.REFUSED_HOST))
+
+    async def test_unreachable_proxy_raises_connection_error(self):
+        await self.stand_in.stop()
+        with self.assertRaises(ConnectionError):
+            await self.session.get_json_data("http://ok.onion/getFees")
+
+    async def test_invalid_json_raises_incorrect_response_data(self):
+        with self.assertRaises(IncorrectResponseData):
+            await self.session.get_json_data("http://garbage.onion/getFees")
+
+
+if __name__ == "__main__":
+    unittest.main()
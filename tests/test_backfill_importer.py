@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from sqlalchemy import func, select, text
+
+from src.library.backfill_importer import BackfillImporter
+from src.library.database import Database
+from src.library.storage_writer import StorageWriter
+from src.model.rollup_model import HourRollupModel
+
+HEADER = "timestamp,a.onion,b.onion\n"
+
+
+def write_rows(file_path, start, count):
+    """Writes a CSV history file of the given number of rows, polled every 120s from the given poll."""
+    with open(file_path, "w") as file_stream:
+        file_stream.write(HEADER)
+        for poll in range(start, start + count):
+            timestamp = time.strftime(BackfillImporter.TIMESTAMP_FORMAT, time.gmtime(1600000000 + poll * 120))
+            file_stream.write("{},{},{}\n".format(timestamp, 100.0 + poll, 200.0 + poll))
+
+
+class BackfillImporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="backfill_importer")
+        self.database = Database(os.path.join(self.directory, "db.sqlite"))
+
+    def tearDown(self):
+        self.database.engine.dispose()
+        self.database.reader_engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def import_directory(self):
+        importer = BackfillImporter(StorageWriter(self.database.engine), self.database.engine,
+                                    os.path.join(self.directory, "backfill_state.json"), chunk_size=7)
+        return importer.import_directory(self.directory)
+
+    def count_rows(self):
+        with self.database.engine.connect() as connection:
+            return connection.execute(text("SELECT count(*) FROM exchange_rate")).scalar()
+
+    def test_rotated_active_file_is_imported_from_its_start(self):
+        active_file_path = os.path.join(self.directory, "usd_historical_exchange_rates.csv")
+        write_rows(active_file_path, 0, 30)
+        self.import_directory()
+        self.assertEqual(self.count_rows(), 60)
+
+        os.rename(active_file_path, os.path.join(self.directory, "usd_historical_exchange_rates.2020-09-13.csv"))
+        write_rows(active_file_path, 30, 48)
+        statistics = self.import_directory()
+        self.assertEqual(self.count_rows(), 60 + 2 * 48)
+        self.assertEqual(statistics["inserted_rows"], 2 * 48)
+
+    def test_import_resumes_from_the_saved_offset(self):
+        active_file_path = os.path.join(self.directory, "usd_historical_exchange_rates.csv")
+        write_rows(active_file_path, 0, 30)
+        self.import_directory()
+        with open(active_file_path, "a") as file_stream:
+            file_stream.write(time.strftime(BackfillImporter.TIMESTAMP_FORMAT, time.gmtime(1600000000 + 30 * 120)) + ",1.0,2.0\n")
+        statistics = self.import_directory()
+        self.assertEqual(statistics["lines"], 1)
+        self.assertEqual(self.count_rows(), 62)
+
+    def test_rollups_covered_by_the_live_writer_are_not_counted_twice(self):
+        # The live writer stores the first poll only, as its sample did not change, but adds the 30 polls to the rollups
+        timestamps = [1600000000 + poll * 120 for poll in range(30)]
+        with self.database.engine.begin() as connection:
+            StorageWriter(self.database.engine).insert_rows(connection, [
+                {"price_node_id": "a.onion", "currency_id": "USD", "price": 100.0, "timestamp": timestamps[0],
+                 "provider_timestamp": None, "provider": "live"}], [], [("a.onion", "USD", x, 100.0) for x in timestamps])
+        with self.database.engine.connect() as connection:
+            expected = connection.execute(select(func.sum(HourRollupModel.count))).scalar()
+
+        write_rows(os.path.join(self.directory, "usd_historical_exchange_rates.csv"), 0, 30)
+        self.import_directory()
+        with self.database.engine.connect() as connection:
+            # The node b.onion was not monitored live, so its imported polls are added to the rollups
+            self.assertEqual(connection.execute(select(func.sum(HourRollupModel.count))).scalar(), expected + 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+
+import numpy
+
+from src.library.drift_detector import DriftDetector
+
+
+class DriftDetectorTest(unittest.TestCase):
+
+    def test_zero_consensus_leaves_the_consensus_deviation_unchanged(self):
+        detector = DriftDetector(["a.onion", "b.onion", "c.onion"], ["btcTxFee"], warmup=2)
+        for _ in range(5):
+            detector.update([[10.0], [10.0], [11.0]], [50])
+        deviation = detector.consensus_deviation.copy()
+        # Most nodes report a fee of zero, so the deviation of the third one from the consensus is undefined
+        self.assertEqual(detector.update([[0.0], [0.0], [11.0]], [50]), [])
+        self.assertTrue(numpy.all(numpy.isfinite(detector.consensus_deviation)))
+        numpy.testing.assert_array_equal(detector.consensus_deviation, deviation)
+        self.assertEqual(detector.update([[10.0], [10.0], [11.0]], [50]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from src.library.history_sink import HistorySink
+
+DAY = 1700000000 - 1700000000 % 86400
+HEADER = ["timestamp", "a.onion"]
+
+
+def get_row(timestamp):
+    return [time.strftime(HistorySink.TIMESTAMP_FORMAT, time.gmtime(timestamp)), 1.0]
+
+
+class HistorySinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="history_sink")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_existing_file_is_rotated_after_the_day_of_its_first_row(self):
+        sink = HistorySink(self.directory)
+        sink.write("history.csv", DAY + 3600, HEADER, get_row(DAY + 3600))
+        sink.close()
+        # The file was last modified on the next day, e.g. by a copy, while its rows are of the day before
+        os.utime(os.path.join(self.directory, "history.csv"), (DAY + 86400 + 3600, DAY + 86400 + 3600))
+
+        sink = HistorySink(self.directory)
+        sink.write("history.csv", DAY + 86400 + 7200, HEADER, get_row(DAY + 86400 + 7200))
+        sink.close()
+        with open(os.path.join(self.directory, "history.{}.csv".format(time.strftime("%Y-%m-%d", time.gmtime(DAY))))) as csv_file:
+            self.assertEqual(len(csv_file.readlines()), 2)
+        with open(os.path.join(self.directory, "history.csv")) as csv_file:
+            self.assertEqual(len(csv_file.readlines()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src.library.database import Database
+from src.library.retention_job import RetentionJob
+from src.library.storage_writer import StorageWriter
+
+
+class RetentionJobTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="retention_job")
+        self.database = Database(os.path.join(self.directory, "db.sqlite"))
+
+    def tearDown(self):
+        self.database.engine.dispose()
+        self.database.reader_engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def get_pragma(self, name):
+        with self.database.engine.connect() as connection:
+            return connection.exec_driver_sql("PRAGMA {}".format(name)).scalar()
+
+    def test_freed_pages_are_returned_by_the_first_vacuum_step(self):
+        rows = [{"price_node_id": "{}.onion".format(x % 10), "currency_id": "USD", "price": 100.0 + x, "timestamp": 1600000000 + x * 120,
+                 "provider_timestamp": None, "provider": "test"} for x in range(20000)]
+        with self.database.engine.begin() as connection:
+            StorageWriter(self.database.engine).insert_rows(connection, rows, [])
+        page_count = self.get_pragma("page_count")
+
+        job = RetentionJob(self.database.engine, {"raw": 1}, batch_size=100000, batch_pause=0)
+        # The job stops at its first pause, i.e. after the first step of the vacuum
+        with mock.patch("src.library.retention_job.time.sleep", side_effect=lambda _: job.stop()):
+            report = job.run_once(now=1700000000)
+        self.assertEqual(report["exchange_rate"]["rows"], 20000)
+        self.assertEqual(self.get_pragma("freelist_count"), 0)
+        self.assertLess(self.get_pragma("page_count"), page_count)
+        self.assertGreater(job.statistics["freed_bytes"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
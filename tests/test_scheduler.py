@@ -0,0 +1,41 @@
+import time
+import unittest
+
+from src.library.scheduler import PollScheduler
+
+
+class SteppingClock(object):
+    """The monotonic clock, moved forward by a step each time it is read, as time passes between the reads of a busy thread."""
+
+    def __init__(self, step=0.001):
+        self.__step = step
+        self.__offset = 0
+
+    def __call__(self):
+        self.__offset += self.__step
+        return time.monotonic() + self.__offset
+
+
+class PollSchedulerTest(unittest.TestCase):
+
+    def test_keys_added_together_are_polled_in_the_same_cycles(self):
+        scheduler = PollScheduler(0.2, clock=SteppingClock())
+        keys = [("{}.onion".format(x), endpoint) for x in range(5) for endpoint in ("getAllMarketPrices", "getFees")]
+        for key in keys:
+            scheduler.add(key)
+        for _ in range(3):
+            self.assertEqual(scheduler.wait_for_due(), keys)
+            for key in keys:
+                scheduler.reschedule(key)
+
+    def test_key_added_later_is_polled_right_away(self):
+        scheduler = PollScheduler(60, clock=SteppingClock())
+        scheduler.add("a.onion")
+        self.assertEqual(scheduler.wait_for_due(), ["a.onion"])
+        scheduler.reschedule("a.onion")
+        scheduler.add("b.onion")
+        self.assertEqual(scheduler.wait_for_due(), ["b.onion"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import shutil
+import tempfile
+import unittest
+
+from src.library.segment_store import SegmentStore
+
+
+class Rate(object):
+
+    def __init__(self, currency, price):
+        self.currency = currency
+        self.price = price
+
+
+def price_data(prices):
+    """Returns the price data of a cycle from the USD price of each node address."""
+    return [{'nodeAddress': address, 'usdMarketPrice': Rate("USD", price), 'timedOut': []} for address, price in prices.items()]
+
+
+class SegmentStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="segment_store")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ids_are_kept_when_reopened_after_names_added_later(self):
+        store = SegmentStore(self.directory, segment_capacity=1000, index_interval=16, writable=True)
+        store.append_price_data(1000, price_data({"b.onion": 2.0, "c.onion": 3.0}))
+        store.append_price_data(1120, price_data({"a.onion": 1.0, "b.onion": 2.0, "c.onion": 3.0}))
+        store.close()
+
+        reader = SegmentStore(self.directory)
+        self.assertEqual(reader.nodes, ["b.onion", "c.onion", "a.onion"])
+        self.assertEqual(reader.get_prices("a.onion", "USD")[1].tolist(), [1.0])
+        self.assertEqual(reader.get_prices("b.onion", "USD")[1].tolist(), [2.0, 2.0])
+
+        writer = SegmentStore(self.directory, segment_capacity=1000, index_interval=16, writable=True)
+        writer.append_price_data(1240, price_data({"a.onion": 1.5, "d.onion": 4.0}))
+        writer.close()
+        self.assertEqual(reader.get_prices("a.onion", "USD")[1].tolist(), [1.0, 1.5])
+        self.assertEqual(reader.get_prices("d.onion", "USD")[1].tolist(), [4.0])
+        self.assertEqual(reader.get_prices("c.onion", "USD")[1].tolist(), [3.0, 3.0])
+        reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()